@@ -9,6 +9,7 @@
 # granted therein are reserved by Autodesk, Inc.
 
 import os
+import time
 
 import sgtk
 from tank.platform import Engine
@@ -31,6 +32,25 @@ class SketchBookEngine(Engine):
         """
 
         self._file_save_app = None
+        self._tk_sketchbook = None
+        self._thumbnail_cache = None
+        self._publish_index = None
+        self._publish_details = None
+        self._work_manifest = None
+        self._validation_cache = None
+        self._write_behind = None
+        self._staging_cache = None
+        self._read_ahead = None
+        self._prescale_cache = None
+        self._async_file_logging = None
+        self._stall_watchdog = None
+        self._command_profiler = None
+        self._metrics_exporter = None
+        self._apps_load_start_time = None
+
+        # The publishes of the work area, prefetched when the publisher is
+        # opened. See the pre publish hook.
+        self.published_file_cache = None
 
         # SketchBook's palette differs from Toolkit, so the engine will let SketchBook
         # use the QApplication palette and will maintain its own style sheet and palette
@@ -72,6 +92,16 @@ class SketchBookEngine(Engine):
         self.logger.debug("%s: Fetching host info...", self)
         return sketchbook_api.host_info()
 
+    @property
+    def headless(self):
+        """
+        Whether the engine is running outside of the SketchBook UI, e.g. for
+        batch publishing. Set through the ``SGTK_SKETCHBOOK_HEADLESS``
+        environment variable.
+        """
+
+        return bool(os.environ.get("SGTK_SKETCHBOOK_HEADLESS"))
+
     @property
     def context_change_allowed(self):
         """
@@ -116,6 +146,346 @@ class SketchBookEngine(Engine):
 
         return self._file_save_app
 
+    @property
+    def thumbnail_cache(self):
+        """
+        Return the :class:`tk_sketchbook.ThumbnailCache` used to generate document
+        thumbnails.
+        """
+
+        if self._thumbnail_cache is None:
+            self._thumbnail_cache = self._tk_sketchbook.ThumbnailCache(
+                os.path.join(self.cache_location, "thumbnails"),
+                self.get_setting("thumbnail_cache_size_mb", 256) * 1024 * 1024,
+            )
+
+        return self._thumbnail_cache
+
+    @property
+    def publish_index(self):
+        """
+        Return the :class:`tk_sketchbook.PublishIndex` mapping the content of
+        published documents to their Shotgun entities.
+        """
+
+        if self._publish_index is None:
+            self._publish_index = self._tk_sketchbook.PublishIndex(
+                os.path.join(self.cache_location, "publish_index.db")
+            )
+
+        return self._publish_index
+
+    @property
+    def publish_details(self):
+        """
+        Return the :class:`tk_sketchbook.PublishDetails` describing published
+        documents in the actions of the Loader and Shotgun Panel.
+        """
+
+        if self._publish_details is None:
+            self._publish_details = self._tk_sketchbook.PublishDetails(
+                self.publish_index
+            )
+
+        return self._publish_details
+
+    @property
+    def work_manifest(self):
+        """
+        Return the :class:`tk_sketchbook.WorkManifest` recording the state of
+        work files when they were last published.
+        """
+
+        if self._work_manifest is None:
+            self._work_manifest = self._tk_sketchbook.WorkManifest(
+                os.path.join(self.cache_location, "work_manifest.json")
+            )
+
+        return self._work_manifest
+
+    @property
+    def validation_cache(self):
+        """
+        Return the :class:`tk_sketchbook.ValidationCache` running the publish
+        validation checks in the background when the document is saved.
+        """
+
+        if self._validation_cache is None:
+            self._validation_cache = self._tk_sketchbook.ValidationCache()
+            self._tk_sketchbook.prevalidation.register_publish_checks(
+                self._validation_cache, self
+            )
+
+        return self._validation_cache
+
+    @property
+    def staging_cache(self):
+        """
+        Return the :class:`tk_sketchbook.StagingCache` of local copies of the
+        published files opened or imported from network storage.
+        """
+
+        if self._staging_cache is None:
+            self._staging_cache = self._tk_sketchbook.StagingCache(
+                os.path.join(self.cache_location, "staging"),
+                self.get_setting("staging_cache_size_mb", 2048) * 1024 * 1024,
+            )
+
+        return self._staging_cache
+
+    @property
+    def prescale_cache(self):
+        """
+        Return the :class:`tk_sketchbook.PrescaleCache` of downscaled copies of
+        the images too large to import to the canvas.
+        """
+
+        if self._prescale_cache is None:
+            self._prescale_cache = self._tk_sketchbook.PrescaleCache(
+                os.path.join(self.cache_location, "prescaled"),
+                self.get_setting("prescale_cache_size_mb", 1024) * 1024 * 1024,
+            )
+
+        return self._prescale_cache
+
+    @property
+    def write_behind(self):
+        """
+        Return the :class:`tk_sketchbook.WriteBehindCache` documents are saved
+        through, or None if saves are written directly to the work area.
+        """
+
+        if self._write_behind is None and self.get_setting("write_behind_saves", False):
+            mirror_root = self.get_setting("write_behind_location") or os.path.join(
+                self.cache_location, "work_mirror"
+            )
+            self._write_behind = self._tk_sketchbook.WriteBehindCache(
+                os.path.expanduser(os.path.expandvars(mirror_root)),
+                on_flushed=self.validation_cache.schedule,
+            )
+
+        return self._write_behind
+
+    @property
+    def command_profiler(self):
+        """
+        Return the :class:`tk_sketchbook.CommandProfiler` the menu profiles
+        commands with, or None if the command_profiler setting is off.
+        """
+
+        mode = self.get_setting("command_profiler", "off")
+        if self._command_profiler is None and mode != "off":
+            self._command_profiler = self._tk_sketchbook.CommandProfiler(
+                sgtk.LogManager().log_folder, mode
+            )
+        return self._command_profiler
+
+    @property
+    def tk_sketchbook(self):
+        """
+        Return the engine's tk_sketchbook module, for use by the engine's hooks.
+        """
+
+        return self._tk_sketchbook
+
+    def materialize_publish(self, path):
+        """
+        Return a path SketchBook can read the given published file from.
+        Published files stored as deltas are reconstructed into the engine's
+        cache, as are compressed published files. See
+        :mod:`tk_sketchbook.publish_storage`.
+
+        :param str path: The published file path.
+        """
+
+        return self._tk_sketchbook.publish_storage.materialize(
+            path,
+            os.path.join(self.cache_location, "publishes"),
+            self.get_setting("stored_publish_cache_size_mb", 1024) * 1024 * 1024,
+        )
+
+    def stage_publish(self, path, publish_id=None):
+        """
+        Return a local path SketchBook can read the given published file from.
+        Stored published files are materialized, see :meth:`materialize_publish`,
+        others are copied to the staging cache, see :attr:`staging_cache`.
+
+        :param str path: The published file path.
+        :param int publish_id: The id of the PublishedFile. The file is read
+            from its published path if not supplied.
+        """
+
+        try:
+            if not self._tk_sketchbook.publish_storage.is_stored(path):
+                if publish_id is None or not self.get_setting(
+                    "staging_cache_size_mb", 2048
+                ):
+                    return path
+                return self.staging_cache.stage(publish_id, path)
+        except (IOError, OSError) as e:
+            self.logger.warning("Unable to copy %s locally: %s" % (path, e))
+            return path
+
+        # the errors of stored files are raised, as the published path can't
+        # be read instead, e.g. when the base of a delta was deleted
+        return self.materialize_publish(path)
+
+    def read_ahead_publish(self, publish_id, get_path):
+        """
+        Start staging a published file in the background, as it's likely to
+        be opened or imported next. See :class:`tk_sketchbook.ReadAhead`.
+
+        :param int publish_id: The id of the PublishedFile.
+        :param get_path: Function returning the published file path, called
+            from a background thread.
+        """
+
+        max_bytes = self.get_setting("read_ahead_max_mb", 512) * 1024 * 1024
+        if not max_bytes or not self.get_setting("staging_cache_size_mb", 2048):
+            return
+
+        if self._read_ahead is None:
+            self._read_ahead = self._tk_sketchbook.ReadAhead(
+                self.stage_publish, max_bytes
+            )
+        self._read_ahead.request(publish_id, get_path)
+
+    def get_image_import_size(self):
+        """
+        Return the maximum width or height of the images imported to the
+        canvas, or None if images are imported at their full size. See the
+        ``add_image_max_canvas_ratio`` setting.
+
+        Must be called from the main thread.
+        """
+
+        ratio = self.get_setting("add_image_max_canvas_ratio", 0.0)
+        if not ratio:
+            return None
+
+        get_canvas_size = getattr(sketchbook_api, "get_canvas_size", None)
+        if get_canvas_size:
+            canvas_size = get_canvas_size()
+        else:
+            # the canvas size is the size of the saved document
+            path = sketchbook_api.get_current_path()
+            canvas_size = None
+            if path and os.path.exists(path):
+                canvas_size = self._tk_sketchbook.image_utils.read_image_size(path)
+
+        if not canvas_size:
+            return None
+        return int(max(canvas_size) * ratio)
+
+    def prescale_image(self, path, max_size):
+        """
+        Return the path of the image to import to the canvas, downscaled to
+        fit within max_size x max_size pixels if it's larger. See
+        :attr:`prescale_cache`. Safe to call from worker threads.
+
+        :param str path: The image path.
+        :param int max_size: The maximum width or height of the imported
+            image, see :meth:`get_image_import_size`. The image is not scaled
+            if None.
+        """
+
+        if not max_size:
+            return path
+
+        try:
+            return self.prescale_cache.get_scaled(path, max_size)
+        except (IOError, OSError, RuntimeError) as e:
+            self.logger.warning("Unable to scale %s: %s" % (path, e))
+            return path
+
+    def canonical_path(self, path):
+        """
+        Return the work area path of a document, for documents saved to the
+        local mirror of the write behind cache.
+
+        :param str path: The document path.
+        """
+
+        if self.write_behind is None:
+            return path
+        return self.write_behind.canonical_path(path)
+
+    def get_current_path(self):
+        """
+        Return the work area path of the current document, or None if it was
+        never saved.
+        """
+
+        return self.canonical_path(sketchbook_api.get_current_path())
+
+    def save_file(self):
+        """
+        Save the current document. With write behind saves, the document is
+        saved to its local mirror and written to the work area in the
+        background.
+        """
+
+        path = sketchbook_api.get_current_path()
+        if self.write_behind is None or not path:
+            sketchbook_api.save_file()
+            return
+
+        if self.write_behind.is_mirror(path):
+            sketchbook_api.save_file()
+        else:
+            sketchbook_api.save_file_as(self.write_behind.prepare(path))
+        self.write_behind.schedule(path)
+
+    def save_file_as(self, path):
+        """
+        Save the current document to the given work area path. With write
+        behind saves, the document is saved to the path's local mirror and
+        written to the work area in the background.
+
+        :param str path: The work area path.
+        """
+
+        if self.write_behind is None:
+            sketchbook_api.save_file_as(path)
+            return
+
+        sketchbook_api.save_file_as(self.write_behind.prepare(path))
+        self.write_behind.schedule(path)
+
+    def wait_for_saves(self, path=None, timeout=None):
+        """
+        Wait for write behind saves to reach the work area.
+
+        :param str path: The document to wait for, all documents if None.
+        :param float timeout: The maximum time to wait, in seconds.
+
+        :returns: An error message if a save couldn't be written to the work
+            area, else None.
+        """
+
+        if self._write_behind is None:
+            return None
+        return self._write_behind.wait(path, timeout)
+
+    def get_content_hash(self, path):
+        """
+        Return the content hash of a saved document, as computed in the
+        background when it was saved, see :class:`tk_sketchbook.ValidationCache`.
+        The document isn't read by this call.
+
+        :param str path: The work area path of the document.
+
+        :returns: The content hash, or None if it isn't known for the current
+            content of the document, e.g. while a write behind save of it is
+            still being written to the work area.
+        """
+
+        if self._write_behind is not None and self._write_behind.is_pending(path):
+            return None
+
+        found, content_hash = self.validation_cache.lookup("content_hash", path)
+        return content_hash if found else None
+
     @staticmethod
     def get_current_engine():
         """
@@ -145,6 +515,32 @@ class SketchBookEngine(Engine):
         for dialog in dialogs_still_opened:
             dialog.close()
 
+        if self._stall_watchdog is not None:
+            self._stall_watchdog.stop()
+            self._stall_watchdog = None
+
+        # don't lose the saves still being written to the work area
+        error = self.wait_for_saves()
+        if error:
+            self.logger.error(error)
+
+        # write the queued log records
+        if self._async_file_logging is not None:
+            self.logger.debug(
+                "Log latency: %s", self._async_file_logging.latency.summary()
+            )
+            self._async_file_logging.stop()
+            self._async_file_logging = None
+
+        # write the remaining spans of the session trace
+        self._tk_sketchbook.tracing.disable()
+
+        # export the metrics a last time
+        if self._metrics_exporter is not None:
+            self._metrics_exporter.stop()
+            self._metrics_exporter = None
+        self._tk_sketchbook.metrics.disable()
+
     def pre_app_init(self):
         """
         Sets up the engine into an operational state. This method called before
@@ -154,14 +550,30 @@ class SketchBookEngine(Engine):
 
         self.logger.debug("%s: Pre app init..." % (self,))
 
-        # unicode characters returned by the shotgun api need to be converted
-        # to display correctly in all of the app windows tell QT to interpret C
-        # strings as utf-8
-        utf8 = QtCore.QTextCodec.codecForName("utf-8")
-        QtCore.QTextCodec.setCodecForCStrings(utf8)
-        self.logger.debug("set utf-8 codec for widget text")
+        # import python/tk_sketchbook module
+        self._tk_sketchbook = self.import_module("tk_sketchbook")
+
+        # trace the session from here on
+        if self.get_setting("trace_sessions", False):
+            self._start_tracing()
+
+        # record the performance metrics from here on
+        if self.get_setting("metrics_file") or self.get_setting("metrics_port"):
+            self._start_metrics()
 
-        self._init_qt_style()
+        with self._tk_sketchbook.tracing.span("engine.pre_app_init"):
+            # unicode characters returned by the shotgun api need to be converted
+            # to display correctly in all of the app windows tell QT to interpret C
+            # strings as utf-8
+            utf8 = QtCore.QTextCodec.codecForName("utf-8")
+            QtCore.QTextCodec.setCodecForCStrings(utf8)
+            self.logger.debug("set utf-8 codec for widget text")
+
+            # there are no widgets to style when running headless
+            if not self.headless:
+                self._init_qt_style()
+
+        self._apps_load_start_time = time.time()
 
     def post_app_init(self):
         """
@@ -170,13 +582,30 @@ class SketchBookEngine(Engine):
 
         self.logger.debug("%s: Post app init...", self)
 
+        # the apps are loaded between the pre and post app init
+        tracing = self._tk_sketchbook.tracing
+        tracing.add_span("engine.load_apps", self._apps_load_start_time, time.time())
+
+        with tracing.span("engine.post_app_init"):
+            self._post_app_init()
+
+    def _post_app_init(self):
+        """
+        Initialize the engine once its apps are loaded.
+        """
+
         self.logger.debug("%s: Initializing QtApp", self)
         from sgtk.platform.qt import QtGui
 
         self._qt_app = QtGui.QApplication.instance()
 
-        # import python/tk_sketchbook module
-        self._tk_sketchbook = self.import_module("tk_sketchbook")
+        # write the log file from a background thread
+        if self.get_setting("async_file_logging", False):
+            self._async_file_logging = self._tk_sketchbook.AsyncFileLogging(
+                self.get_setting("debug_rate_limit", 50)
+            )
+            if self._async_file_logging.start():
+                self.logger.debug("Writing the log file in the background")
 
         # init menu
         self.menu = self._tk_sketchbook.SketchBookMenu(engine=self)
@@ -185,6 +614,23 @@ class SketchBookEngine(Engine):
 
         self.logger.debug("Installed commands are %s.", self.commands)
 
+        # nothing to open or show when running headless
+        if self.headless:
+            return
+
+        # log the stacks of the UI thread when it stalls
+        watchdog_mode = self.get_setting("stall_watchdog", "off")
+        if watchdog_mode != "off":
+            self._stall_watchdog = self._tk_sketchbook.StallWatchdog(
+                self.get_setting("stall_threshold_ms", 500) / 1000.0, watchdog_mode
+            )
+            self._stall_watchdog.start()
+            self.logger.debug("Watching for UI stalls (%s)", watchdog_mode)
+
+        # finish writing the saves interrupted when SketchBook last exited
+        if self.write_behind is not None:
+            self.write_behind.recover()
+
         path = os.environ.get("SGTK_FILE_TO_OPEN", None)
         if path:
             self.operations.open_file(path)
@@ -227,34 +673,101 @@ class SketchBookEngine(Engine):
         Refresh the Shotgun context.
         """
 
-        logger.debug("Refreshing the context")
+        tracing = self._tk_sketchbook.tracing
+        timer = self._tk_sketchbook.metrics.timer(
+            "sketchbook_refresh_context_duration_seconds"
+        )
+        with tracing.span("engine.refresh_context") as span, timer:
+            logger.debug("Refreshing the context")
+
+            # Get the path of the current open SketchBook file.
+            current_path = sketchbook_api.current_file_path()
+            if (
+                current_path
+                and self.write_behind is not None
+                and self.write_behind.is_mirror(current_path)
+            ):
+                # saved to its mirror, e.g. from SketchBook's own menu, write
+                # it to the work area
+                self.write_behind.schedule(current_path)
+            new_path = self.canonical_path(current_path)
+
+            if new_path is None:
+                # This is a File->New call, so we just leave the engine in the
+                # current context and move on.
+                logger.debug("New file call, aborting the refresh of the engine.")
+                return
+
+            span.set(path=new_path)
+
+            # get the publish checks of the saved document ready
+            self.validation_cache.schedule(new_path)
+
+            # this file could be in another project altogether, so create a new API
+            # instance.
+            try:
+                tk = sgtk.sgtk_from_path(new_path)
+                logger.debug(
+                    "Extracted sgtk instance: '%r' from path: '%r'", tk, new_path
+                )
+
+            except sgtk.TankError as e:
+                logger.exception("Could not execute sgtk_from_path('%s')" % e)
+                return
 
-        # Get the path of the current open SketchBook file.
-        new_path = sketchbook_api.current_file_path()
+            # Construct a new context for this path:
+            ctx = tk.context_from_path(new_path, self.context)
+            logger.debug("Context for path %s is %r", new_path, ctx)
 
-        if new_path is None:
-            # This is a File->New call, so we just leave the engine in the
-            # current context and move on.
-            logger.debug("New file call, aborting the refresh of the engine.")
-            return
+            if ctx != self.context:
+                logger.debug("Changing the context to '%r", ctx)
+                self.change_context(ctx)
 
-        # this file could be in another project altogether, so create a new API
-        # instance.
-        try:
-            tk = sgtk.sgtk_from_path(new_path)
-            logger.debug("Extracted sgtk instance: '%r' from path: '%r'", tk, new_path)
+    def _start_tracing(self):
+        """
+        Write the spans of the session to a Chrome trace file in the log
+        folder. See :mod:`tk_sketchbook.tracing`.
+        """
 
-        except sgtk.TankError as e:
-            logger.exception("Could not execute sgtk_from_path('%s')" % e)
+        path = os.path.join(
+            sgtk.LogManager().log_folder,
+            "tk-sketchbook-trace-%s-%d.json"
+            % (time.strftime("%Y%m%d-%H%M%S"), os.getpid()),
+        )
+        try:
+            self._tk_sketchbook.tracing.enable(path)
+        except (IOError, OSError) as e:
+            self.logger.warning("Unable to trace the session to %s: %s", path, e)
             return
+        self.logger.debug("Tracing the session to %s", path)
+
+    def _start_metrics(self):
+        """
+        Record the engine's performance metrics and export them to the
+        metrics file and/or port. See :mod:`tk_sketchbook.metrics`.
+        """
+
+        metrics = self._tk_sketchbook.metrics
+        path = self.get_setting("metrics_file")
+        if path:
+            path = os.path.expanduser(os.path.expandvars(path))
 
-        # Construct a new context for this path:
-        ctx = tk.context_from_path(new_path, self.context)
-        logger.debug("Context for path %s is %r", new_path, ctx)
+        self._metrics_exporter = metrics.MetricsExporter(
+            metrics.enable(),
+            path=path or None,
+            port=self.get_setting("metrics_port") or None,
+            interval=self.get_setting("metrics_interval_s", 15),
+        )
+        try:
+            self._metrics_exporter.start()
+        except (IOError, OSError) as e:
+            self.logger.warning("Unable to export the metrics: %s", e)
+            self._metrics_exporter = None
+            metrics.disable()
+            return
 
-        if ctx != self.context:
-            logger.debug("Changing the context to '%r", ctx)
-            self.change_context(ctx)
+        metrics.count_calls(sketchbook_api, "sketchbook_host_api_calls")
+        self.logger.debug("Exporting the metrics")
 
     def do_log(self, message):
         """
@@ -625,6 +1138,19 @@ class SketchBookEngine(Engine):
 
         return processed_style_sheet
 
+    def show_dialog(self, title, bundle, widget_class, *args, **kwargs):
+        """
+        Override the :class:`sgtk.platform.Engine` :meth:`show_dialog` to
+        record the time it takes to show the dialog.
+        """
+
+        with self._tk_sketchbook.metrics.timer(
+            "sketchbook_dialog_show_duration_seconds", title=title
+        ):
+            return super(SketchBookEngine, self).show_dialog(
+                title, bundle, widget_class, *args, **kwargs
+            )
+
     def _create_dialog(self, title, bundle, widget, parent):
         """
         Override the :class:`sgtk.platform.Engine` :meth:`_create_dialog`.
@@ -640,9 +1166,10 @@ class SketchBookEngine(Engine):
         """
         from sgtk.platform.qt import QtGui
 
-        dialog = super(SketchBookEngine, self)._create_dialog(
-            title, bundle, widget, parent
-        )
+        with self._tk_sketchbook.tracing.span("engine.create_dialog", title=title):
+            dialog = super(SketchBookEngine, self)._create_dialog(
+                title, bundle, widget, parent
+            )
 
         dialog.setProperty("Shotgun", True)
 
@@ -690,8 +1217,7 @@ class SketchBookEngine(Engine):
             self.logger.warning(
                 "Engine falling back to SketchBook to perform file save."
             )
-            path = sketchbook_api.get_current_path()
-            sketchbook_api.save_file_as(path)
+            self.save_file_as(self.get_current_path())
 
         except Exception as error:
             raise sgtk.TankError(
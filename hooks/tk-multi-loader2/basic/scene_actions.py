@@ -13,9 +13,6 @@ Hook that loads defines all the available actions, broken down by publish type.
 """
 
 import sgtk
-from sgtk.platform.qt import QtGui
-
-import sketchbook_api
 
 HookBaseClass = sgtk.get_hook_baseclass()
 
@@ -59,9 +56,12 @@ class SketchBookActions(HookBaseClass):
         :returns List of dictionaries, each with keys name, params, caption and description
         """
         app = self.parent
-        app.log_debug(
-            "Generate actions called for UI element %s. "
-            "Actions: %s. Publish Data: %s" % (ui_area, actions, sg_publish_data)
+        # formatted only if written to the log
+        app.logger.debug(
+            "Generate actions called for UI element %s. Actions: %s. Publish Data: %s",
+            ui_area,
+            actions,
+            sg_publish_data,
         )
 
         action_instances = []
@@ -74,13 +74,30 @@ class SketchBookActions(HookBaseClass):
             # base class doesn't have the method, so ignore and continue
             pass
 
+        # the path is resolved in the background, along with the look ups
+        def get_path():
+            return self.get_publish_path(sg_publish_data)
+
+        # describe the file from its publish sidecar, once it has been looked
+        # up in the background
+        description = app.engine.publish_details.describe(
+            sg_publish_data["id"], get_path
+        )
+        details = " (%s)" % (description,) if description else ""
+
+        # the file is likely to be opened or imported next, start reading it in
+        # the background
+        if "open_file" in actions or "add_image" in actions:
+            app.engine.read_ahead_publish(sg_publish_data["id"], get_path)
+
         if "open_file" in actions:
             action_instances.append(
                 {
                     "name": "open_file",
                     "params": None,
                     "caption": "Open File",
-                    "description": "Open an image file to start working with.",
+                    "description": "Open an image file to start working with."
+                    + details,
                 }
             )
 
@@ -90,7 +107,8 @@ class SketchBookActions(HookBaseClass):
                     "name": "add_image",
                     "params": None,
                     "caption": "Add Image...",
-                    "description": "This will import the selected image file to the canvas.",
+                    "description": "This will import the selected image file to the canvas."
+                    + details,
                 }
             )
 
@@ -106,27 +124,22 @@ class SketchBookActions(HookBaseClass):
         :param sg_publish_data: Shotgun data dictionary with all the standard publish fields.
         :returns: No return value expected.
         """
-        app = self.parent
 
-        app.log_debug(
-            "Execute action called for action %s. "
-            "Parameters: %s. Publish Data: %s" % (name, params, sg_publish_data)
-        )
-
-        # resolve path
-        path = self.get_publish_path(sg_publish_data)
-
-        if name == "open_file":
-            return sketchbook_api.open_file(path)
-        elif name == "add_image":
-            return sketchbook_api.add_image(path)
+        report = self._get_executor().execute([(name, params, sg_publish_data)])
+        result = report.results[0]
+        if result["error"] is not None:
+            raise result["error"]
+        return result["message"]
 
     def execute_multiple_actions(self, actions):
         """
         Executes the specified action on a list of items.
 
-        The default implementation dispatches each item from ``actions`` to
-        the ``execute_action`` method.
+        The actions are run by the engine's
+        :class:`tk_sketchbook.ActionExecutor`: the same action on the same
+        file only runs once, the files of all the items are read ahead
+        concurrently, and each item is loaded in SketchBook, in order, as soon
+        as its file is ready.
 
         The ``actions`` is a list of dictionaries holding all the actions to execute.
         Each entry will have the following values:
@@ -136,59 +149,33 @@ class SketchBookActions(HookBaseClass):
             params: Parameters passed down from the generate_actions hook.
 
         .. note::
-            This is the default entry point for the hook. It reuses the ``execute_action``
-            method for backward compatibility with hooks written for the previous
+            This is the default entry point for the hook. ``execute_action`` is
+            kept for backward compatibility with hooks written for the previous
             version of the loader.
 
         .. note::
-            The hook will stop applying the actions on the selection if an error
-            is raised midway through.
+            An error doesn't stop the remaining actions. The errors are
+            reported together once all the actions have run.
 
         :param list actions: Action dictionaries.
         """
-        messages = {}
-
-        for single_action in actions:
-            name = single_action["name"]
-
-            sg_publish_data = single_action["sg_publish_data"]
-            params = single_action["params"]
-            message = self.execute_action(name, params, sg_publish_data)
 
-            if not isinstance(message, dict):
-                continue
-
-            message_type = message.get("message_type")
-            message_code = message.get("message_code")
-            publish_path = message.get("publish_path")
-            is_error = message.get("is_error")
-
-            if message_type not in messages:
-                messages[message_type] = {}
-
-            if message_code not in messages[message_type]:
-                messages[message_type][message_code] = dict(is_error=is_error, paths=[])
-
-            messages[message_type][message_code]["paths"].append(publish_path)
-
-        active_window = QtGui.QApplication.activeWindow()
-        for message_type, message_type_details in messages.items():
-            content = ""
-            for message_code, message_code_details in message_type_details.items():
-                if content:
-                    content += "\n\n"
-
-                is_error = message_code_details.get("is_error")
-                paths = message_code_details.get("paths")
+        report = self._get_executor().execute(
+            [
+                (
+                    single_action["name"],
+                    single_action["params"],
+                    single_action["sg_publish_data"],
+                )
+                for single_action in actions
+            ]
+        )
+        report.show()
 
-                if is_error:
-                    content += "{}: {}".format(message_code, ", ".join(paths))
-                else:
-                    if len(paths) == 1:
-                        content += "{}: {}".format(message_code, paths[0])
-                    else:
-                        content += "{} ({})".format(message_code, len(paths))
+    def _get_executor(self):
+        """
+        Return an action executor running the actions of this hook.
+        """
 
-            getattr(QtGui.QMessageBox, message_type)(
-                active_window, message_type.title(), content
-            )
+        engine = self.parent.engine
+        return engine.tk_sketchbook.ActionExecutor(engine, self.get_publish_path)
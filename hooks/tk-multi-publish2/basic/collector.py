@@ -11,8 +11,6 @@
 import os
 import sgtk
 
-import sketchbook_api
-
 HookBaseClass = sgtk.get_hook_baseclass()
 
 
@@ -48,6 +46,13 @@ class SketchBookSessionCollector(HookBaseClass):
                 "to publish plugins via the collected item's "
                 "properties. ",
             },
+            "Collect Changed Work Files": {
+                "type": "bool",
+                "default": False,
+                "description": "Also collect the files next to the current "
+                "document, of the same type, that are new or changed since "
+                "they were last published.",
+            },
         }
 
         # update the base settings with these settings
@@ -64,8 +69,9 @@ class SketchBookSessionCollector(HookBaseClass):
         """
 
         publisher = self.parent
+        tracing = publisher.engine.tk_sketchbook.tracing
 
-        path = sketchbook_api.get_current_path()
+        path = publisher.engine.get_current_path()
 
         if path:
             file_info = publisher.util.get_file_path_components(path)
@@ -81,9 +87,13 @@ class SketchBookSessionCollector(HookBaseClass):
         icon_path = os.path.join(self.disk_location, "../icons", "SketchBook.png")
 
         session_item.set_icon_from_path(icon_path)
-        session_item.thumbnail_enabled = False
+        session_item.thumbnail_enabled = True
         session_item.properties["path"] = path
 
+        if path:
+            with tracing.span("publish2.collect_thumbnail", path=path):
+                self._collect_thumbnail(session_item, path)
+
         # if a work template is defined, add it to the item properties so
         # that it can be used by attached publish plugins
         work_template_setting = settings.get("Work Template")
@@ -102,4 +112,68 @@ class SketchBookSessionCollector(HookBaseClass):
 
         self.logger.info("Collected current SketchBook session")
 
+        if path and settings.get("Collect Changed Work Files").value:
+            with tracing.span("publish2.collect_changed_work_files"):
+                self._collect_changed_work_files(settings, parent_item, path)
+
         return session_item
+
+    def _collect_changed_work_files(self, settings, parent_item, path):
+        """
+        Collect the files next to the current document that are new or have
+        changed since they were last published. See
+        :class:`tk_sketchbook.WorkManifest`.
+
+        :param dict settings: Configured settings for this collector
+        :param parent_item: Root item instance
+        :param str path: The path of the current document.
+        """
+
+        work_manifest = self.parent.engine.work_manifest
+        extension = os.path.splitext(path)[1].lower()
+
+        changed_files = work_manifest.find_changed_files(
+            os.path.dirname(path), [extension]
+        )
+        collected_count = 0
+        for file_path, content_hash in changed_files:
+            if os.path.normcase(file_path) == os.path.normcase(path):
+                # already collected as the session
+                continue
+
+            # the manifest is updated with the hash once the files are
+            # published, see the post_phase hook
+            file_item = super(SketchBookSessionCollector, self).process_file(
+                settings, parent_item, file_path
+            )
+            if file_item:
+                file_item.properties["work_file_hash"] = content_hash
+                collected_count += 1
+
+        self.logger.info(
+            "Collected %d changed work files next to the current document."
+            % (collected_count,)
+        )
+
+    def _collect_thumbnail(self, item, path):
+        """
+        Generate a thumbnail of the saved document in the background and use
+        it as the item thumbnail once it is ready. Collection doesn't wait for
+        it, the publish plugins also pick it up from the item properties.
+
+        :param item: The session item.
+        :param str path: The path of the saved document.
+        """
+
+        engine = self.parent.engine
+
+        def set_thumbnail(thumbnail_path):
+            # called from the thumbnail worker thread, the item thumbnail is
+            # shown in the publisher so it is set from the main thread
+            engine.async_execute_in_main_thread(
+                item.set_thumbnail_from_path, thumbnail_path
+            )
+
+        item.properties["thumbnail_request"] = engine.thumbnail_cache.request_thumbnail(
+            path, callback=set_thumbnail
+        )
@@ -0,0 +1,52 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import os
+
+import sgtk
+
+HookBaseClass = sgtk.get_hook_baseclass()
+
+
+class SketchBookPostPhaseHook(HookBaseClass):
+    """
+    Hook run by the publisher after each publish phase.
+
+    This hook should inherit from the publish2 app's post phase hook in the
+    configuration. The hook setting should look something like this::
+
+        post_phase: "{self}/post_phase.py:{engine}/tk-multi-publish2/basic/post_phase.py"
+
+    """
+
+    def post_finalize(self, publish_tree):
+        """
+        Record the work files that were published in the engine's work
+        manifest, so that the collector only collects them again once they
+        change. See the collector's "Collect Changed Work Files" setting.
+
+        :param publish_tree: The :class:`PublishTree` that was published.
+        """
+
+        super(SketchBookPostPhaseHook, self).post_finalize(publish_tree)
+
+        engine = self.parent.engine
+        with engine.tk_sketchbook.tracing.span("publish2.record_published_work"):
+            for item in publish_tree:
+                path = item.properties.get("path")
+                if not item.properties.get("sg_publish_data") or not path:
+                    continue
+                if not os.path.isfile(path):
+                    continue
+
+                # the hash of modified work files is known from collection, the
+                # hash of new ones is computed here
+                engine.work_manifest.record(path, item.properties.get("work_file_hash"))
+                self.logger.debug("Recorded published work file %s" % (path,))
@@ -56,4 +56,30 @@ class SketchBookPrePublishHook(HookBaseClass):
                 )
                 result = False
 
+        if result:
+            self._prefetch_publishes()
+
         return result
+
+    def _prefetch_publishes(self):
+        """
+        Start fetching the existing publishes of the work area in a single
+        query, in the background so the dialog opens without waiting for it,
+        for the publish plugins to look up previous publishes from while the
+        dialog is open.
+        """
+
+        engine = self.parent.engine
+        engine.published_file_cache = None
+
+        # without an entity, the query would return the publishes of the
+        # whole project
+        context = engine.context
+        if not context.project or not context.entity:
+            return
+
+        engine.published_file_cache = (
+            engine.tk_sketchbook.PublishedFileCache.prefetch_in_background(
+                lambda: engine.shotgun, context
+            )
+        )
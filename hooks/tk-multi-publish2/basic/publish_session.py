@@ -9,6 +9,7 @@
 # not expressly granted therein are reserved by Autodesk, Inc.
 
 import os
+import traceback
 
 import sgtk
 
@@ -17,6 +18,10 @@ import sketchbook_api
 HookBaseClass = sgtk.get_hook_baseclass()
 
 
+# measures the plugin phases, see tk_sketchbook.publish_profile.profiled
+_profiled = sgtk.platform.current_engine().tk_sketchbook.publish_profile.profiled
+
+
 class SketchBookSessionPublishPlugin(HookBaseClass):
     """
     Plugin for publishing an open SketchBook session.
@@ -31,6 +36,19 @@ class SketchBookSessionPublishPlugin(HookBaseClass):
 
     # NOTE: The plugin icon and name are defined by the base file plugin.
 
+    @property
+    def parent(self):
+        """
+        The publisher app. While the base class validates, a proxy of it
+        answering the look ups of conflicting publishes from the prefetched
+        publishes, see :class:`_PrefetchedPublisher`.
+        """
+
+        prefetched_publisher = getattr(self, "_prefetched_publisher", None)
+        if prefetched_publisher is not None:
+            return prefetched_publisher
+        return super(SketchBookSessionPublishPlugin, self).parent
+
     @property
     def description(self):
         """
@@ -119,7 +137,25 @@ class SketchBookSessionPublishPlugin(HookBaseClass):
                 "description": "Template path for published work files. Should"
                 "correspond to a template defined in "
                 "templates.yml.",
-            }
+            },
+            "Delta Storage": {
+                "type": "bool",
+                "default": False,
+                "description": "Store published copies as deltas against a "
+                "previous publish of the same file, rather than full copies. "
+                "Deltas are registered with the 'SketchBook Stored Document' "
+                "published file type and depend on the full publish they were "
+                "stored against, which must be kept. Requires a publish "
+                "template.",
+            },
+            "Compress Published File": {
+                "type": "bool",
+                "default": False,
+                "description": "Store published copies losslessly compressed. "
+                "Compressed copies are registered with the 'SketchBook Stored "
+                "Document' published file type. Requires a publish template, "
+                "and doesn't apply to files stored as deltas.",
+            },
         }
 
         # update the base settings
@@ -138,6 +174,7 @@ class SketchBookSessionPublishPlugin(HookBaseClass):
         """
         return ["sketchbook.session"]
 
+    @_profiled
     def accept(self, settings, item):
         """
         Method called by the publisher to determine if an item is of any
@@ -180,9 +217,10 @@ class SketchBookSessionPublishPlugin(HookBaseClass):
             # the session has not been saved before (no path determined).
             # provide a save button. the session will need to be saved before
             # validation will succeed.
+            save_ledger = self.parent.engine.tk_sketchbook.save_ledger
             self.logger.warn(
                 "The SketchBook session has not been saved. Please save your file.",
-                extra=_get_save_as_action(),
+                extra=save_ledger.get_save_as_action(),
             )
 
         self.logger.info(
@@ -191,6 +229,7 @@ class SketchBookSessionPublishPlugin(HookBaseClass):
 
         return acceptance
 
+    @_profiled
     def validate(self, settings, item):
         """
         Validates the given item to check that it is ok to publish. Returns a
@@ -204,8 +243,12 @@ class SketchBookSessionPublishPlugin(HookBaseClass):
         """
 
         publisher = self.parent
+        save_ledger = publisher.engine.tk_sketchbook.save_ledger
         path = _session_path()
 
+        # start a new save ledger for this publish
+        item.properties["save_ledger"] = None
+
         # ---- ensure the session has been saved
 
         if not path:
@@ -214,7 +257,7 @@ class SketchBookSessionPublishPlugin(HookBaseClass):
             error_msg = (
                 "The SketchBook session has not been saved. Please save your file."
             )
-            self.logger.error(error_msg, extra=_get_save_as_action())
+            self.logger.error(error_msg, extra=save_ledger.get_save_as_action())
             raise Exception(error_msg)
 
         # ---- check the session against any attached work template
@@ -229,7 +272,13 @@ class SketchBookSessionPublishPlugin(HookBaseClass):
         # a different path
         work_template = item.properties.get("work_template")
         if work_template:
-            if not work_template.validate(path):
+            matches = _get_prevalidated("work_template", path, work_template)
+            if matches is None:
+                matches = work_template.validate(path)
+            else:
+                matches = matches["matches"]
+
+            if not matches:
                 self.logger.warning(
                     "The current session does not match the configured work "
                     "file template.",
@@ -239,7 +288,7 @@ class SketchBookSessionPublishPlugin(HookBaseClass):
                             "tooltip": "Save the current SketchBook session to a "
                             "different file name",
                             # will launch wf2 if configured
-                            "callback": _get_save_as_action(),
+                            "callback": save_ledger.get_save_as_action(),
                         }
                     },
                 )
@@ -253,16 +302,26 @@ class SketchBookSessionPublishPlugin(HookBaseClass):
         # check to see if the next version of the work file already exists on
         # disk. if so, warn the user and provide the ability to jump to save
         # to that version now
-        (next_version_path, version) = self._get_next_version_info(path, item)
-        if next_version_path and os.path.exists(next_version_path):
-
-            # determine the next available version_number. just keep asking for
-            # the next one until we get one that doesn't exist.
-            while os.path.exists(next_version_path):
-                (next_version_path, version) = self._get_next_version_info(
-                    next_version_path, item
-                )
+        next_version = _get_prevalidated("next_version", path, work_template)
+        if next_version is None:
+            (next_version_path, version) = self._get_next_version_info(path, item)
+            next_version_exists = bool(
+                next_version_path and os.path.exists(next_version_path)
+            )
+            if next_version_exists:
+                # determine the next available version_number. just keep asking
+                # for the next one until we get one that doesn't exist.
+                while os.path.exists(next_version_path):
+                    (next_version_path, version) = self._get_next_version_info(
+                        next_version_path, item
+                    )
+        else:
+            # checked in the background when the document was saved
+            next_version_exists = next_version["exists"]
+            next_version_path = next_version["path"]
+            version = next_version["version"]
 
+        if next_version_exists:
             error_msg = "The next version of this file already exists on disk."
             self.logger.error(
                 error_msg,
@@ -271,7 +330,7 @@ class SketchBookSessionPublishPlugin(HookBaseClass):
                         "label": "Save to v%s" % (version,),
                         "tooltip": "Save to the next available version number, "
                         "v%s" % (version,),
-                        "callback": lambda: sketchbook_api.save_file_as(
+                        "callback": lambda: publisher.engine.save_file_as(
                             next_version_path
                         ),
                     }
@@ -279,6 +338,10 @@ class SketchBookSessionPublishPlugin(HookBaseClass):
             )
             raise Exception(error_msg)
 
+        # ---- warn if this content has already been published
+
+        self._warn_if_already_published(path)
+
         # ---- populate the necessary properties and call base class validation
 
         # populate the publish template on the item if found
@@ -293,9 +356,18 @@ class SketchBookSessionPublishPlugin(HookBaseClass):
         # step. NOTE: this path could change prior to the publish phase.
         item.properties["path"] = path
 
-        # run the base class validation
-        return super(SketchBookSessionPublishPlugin, self).validate(settings, item)
-
+        # run the base class validation, looking up the previous publishes of
+        # the path from the publishes prefetched when the dialog was opened.
+        # only this plugin sees them, the publisher's util is left alone.
+        cache = publisher.engine.published_file_cache
+        if cache is not None:
+            self._prefetched_publisher = _PrefetchedPublisher(publisher, cache)
+        try:
+            return super(SketchBookSessionPublishPlugin, self).validate(settings, item)
+        finally:
+            self._prefetched_publisher = None
+
+    @_profiled
     def publish(self, settings, item):
         """
         Executes the publish logic for the given item and settings.
@@ -310,15 +382,33 @@ class SketchBookSessionPublishPlugin(HookBaseClass):
         # are appropriate for current os, no double separators, etc.
         path = sgtk.util.ShotgunPath.normalize(_session_path())
 
-        # ensure the session is saved
-        sketchbook_api.save_file()
+        # ensure the session is saved, and has reached the work area if it's
+        # written in the background
+        self.parent.engine.tk_sketchbook.save_ledger.get_save_ledger(item).save()
+        error = self.parent.engine.wait_for_saves(path)
+        if error:
+            raise Exception(error)
 
         # update the item with the saved session path
         item.properties["path"] = path
 
+        # a stored publish is written before it is registered, so that it is
+        # registered with its own type and the base it depends on
+        item.properties["publish_copy"] = None
+        if settings["Delta Storage"].value or settings["Compress Published File"].value:
+            self._store_work_to_publish(settings, item)
+
         # let the base class register the publish
         super(SketchBookSessionPublishPlugin, self).publish(settings, item)
 
+        # the prefetched publishes no longer include all the publishes of the
+        # work area
+        self.parent.engine.published_file_cache = None
+
+        # describe the published document for the loader
+        self._write_sidecar(item)
+
+    @_profiled
     def finalize(self, settings, item):
         """
         Execute the finalization pass. This pass executes once all the publish
@@ -333,10 +423,328 @@ class SketchBookSessionPublishPlugin(HookBaseClass):
         # do the base class finalization
         super(SketchBookSessionPublishPlugin, self).finalize(settings, item)
 
+        # remember the publish this content was registered as
+        path = item.properties["path"]
+        publish_data = item.properties.get("sg_publish_data")
+        if publish_data:
+            engine = self.parent.engine
+            engine.publish_index.record(
+                engine.tk_sketchbook.hashing.hash_file(path),
+                path,
+                published_file=publish_data,
+            )
+
         # bump the session file to the next version
-        self._save_to_next_version(
-            item.properties["path"], item, sketchbook_api.save_file_as
+        ledger = self.parent.engine.tk_sketchbook.save_ledger.get_save_ledger(item)
+        self._save_to_next_version(item.properties["path"], item, ledger.save_as)
+
+        self.logger.info(
+            "The document was saved %d times during publish." % (ledger.write_count,),
+            extra={
+                "action_show_more_info": {
+                    "label": "Save Details",
+                    "tooltip": "Show the saves requested during publish",
+                    "text": "<pre>%s</pre>" % (ledger.summary(),),
+                }
+            },
         )
+        item.properties["save_ledger"] = None
+
+    def get_publish_type(self, settings, item):
+        """
+        Get a publish type for the supplied settings and item. Publishes stored
+        as deltas or compressed have their own type, see
+        :mod:`tk_sketchbook.publish_storage`.
+
+        :param settings: This plugin instance's configured settings
+        :param item: The item to determine the publish type for
+
+        :return: A publish type or None if one could not be found.
+        """
+
+        if _is_stored(item):
+            publish_storage = self.parent.engine.tk_sketchbook.publish_storage
+            return publish_storage.PUBLISHED_FILE_TYPE
+
+        return super(SketchBookSessionPublishPlugin, self).get_publish_type(
+            settings, item
+        )
+
+    def get_publish_dependencies(self, settings, item):
+        """
+        Get publish dependencies for the supplied settings and item. A publish
+        stored as a delta depends on the publish it was stored against.
+
+        :param settings: This plugin instance's configured settings
+        :param item: The item to determine the publish dependencies for
+
+        :return: A list of file paths representing the dependencies to store in
+            SG for this publish
+        """
+
+        dependencies = super(
+            SketchBookSessionPublishPlugin, self
+        ).get_publish_dependencies(settings, item)
+
+        publish_copy = item.properties.get("publish_copy")
+        if _is_stored(item) and publish_copy.get("base"):
+            dependencies = list(dependencies or []) + [publish_copy["base"]]
+        return dependencies
+
+    def _get_publish_file(self, settings, item):
+        """
+        Return the publish template location of the saved session.
+
+        :param settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+
+        :returns: The publish file path, or None if the session isn't copied
+            to a publish location.
+        """
+
+        work_template = item.properties.get("work_template")
+        if not work_template:
+            self.logger.debug(
+                "No work template set on the item. "
+                "Skipping copy file to publish location."
+            )
+            return None
+
+        publish_template = self.get_publish_template(settings, item)
+        if not publish_template:
+            self.logger.debug(
+                "No publish template set on the item. "
+                "Skipping copying file to publish location."
+            )
+            return None
+
+        work_file = item.properties["path"]
+        if not work_template.validate(work_file):
+            self.logger.warning(
+                "Work file '%s' did not match work template '%s'. "
+                "Publishing in place." % (work_file, work_template)
+            )
+            return None
+
+        work_fields = work_template.get_fields(work_file)
+        missing_keys = publish_template.missing_keys(work_fields)
+        if missing_keys:
+            self.logger.warning(
+                "Work file '%s' missing keys required for the publish "
+                "template: %s" % (work_file, missing_keys)
+            )
+            return None
+
+        return publish_template.apply_fields(work_fields)
+
+    def _copy_work_to_publish(self, settings, item):
+        """
+        Copy the saved session to the publish template location, using the
+        engine's file copy engine rather than the base class byte copy. On
+        file systems that support it, the publish file is a copy on write
+        clone of the work file.
+
+        The copy method and throughput are stored on the item in the
+        ``publish_copy`` property.
+
+        :param settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        """
+
+        if settings["Delta Storage"].value or settings["Compress Published File"].value:
+            # stored before the publish is registered, see _store_work_to_publish
+            return
+
+        publish_file = self._get_publish_file(settings, item)
+        if not publish_file:
+            return
+
+        work_file = item.properties["path"]
+        engine = self.parent.engine
+        try:
+            sgtk.util.filesystem.ensure_folder_exists(os.path.dirname(publish_file))
+            publish_copy = engine.tk_sketchbook.file_copy.copy_file(
+                work_file, publish_file
+            )
+        except Exception:
+            raise Exception(
+                "Failed to copy work file from '%s' to '%s'.\n%s"
+                % (work_file, publish_file, traceback.format_exc())
+            )
+
+        item.properties["publish_copy"] = publish_copy
+        self.logger.debug(
+            "Copied work file '%s' to publish file '%s' (%s, %.1f MB/s)."
+            % (
+                work_file,
+                publish_file,
+                publish_copy["method"],
+                publish_copy["throughput"] / (1024.0 * 1024.0),
+            )
+        )
+
+    def _store_work_to_publish(self, settings, item):
+        """
+        Store the saved session at the publish template location as a delta
+        or compressed, as configured. See :mod:`tk_sketchbook.publish_storage`.
+
+        The stored file is described on the item in the ``publish_copy``
+        property.
+
+        :param settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        """
+
+        publish_file = self._get_publish_file(settings, item)
+        if not publish_file:
+            return
+
+        work_file = item.properties["path"]
+        try:
+            sgtk.util.filesystem.ensure_folder_exists(os.path.dirname(publish_file))
+            if settings["Delta Storage"].value:
+                publish_copy = self._store_work_as_delta(
+                    settings, item, work_file, publish_file
+                )
+            else:
+                publish_copy = self._store_work_compressed(work_file, publish_file)
+        except Exception:
+            raise Exception(
+                "Failed to store work file '%s' at '%s'.\n%s"
+                % (work_file, publish_file, traceback.format_exc())
+            )
+
+        item.properties["publish_copy"] = publish_copy
+
+    def _store_work_as_delta(self, settings, item, work_file, publish_file):
+        """
+        Store the work file at the publish location as a delta against the
+        previous full publish of the same file. See
+        :mod:`tk_sketchbook.publish_storage`.
+
+        :returns: A dictionary describing the stored file.
+        """
+
+        publish_storage = self.parent.engine.tk_sketchbook.publish_storage
+        result = publish_storage.store_delta(
+            work_file, publish_file, self.get_publish_name(settings, item)
+        )
+
+        if result["mode"] == "delta":
+            self.logger.info(
+                "Stored the published file as a delta of %.1f MB (%.1f MB in full)."
+                % (
+                    result["bytes"] / (1024.0 * 1024.0),
+                    result["source_bytes"] / (1024.0 * 1024.0),
+                )
+            )
+        else:
+            self.logger.debug(
+                "Stored '%s' in full as the base for later publishes." % (publish_file,)
+            )
+        return result
+
+    def _store_work_compressed(self, work_file, publish_file):
+        """
+        Store the work file at the publish location, losslessly compressed.
+        See :mod:`tk_sketchbook.publish_storage`.
+
+        :returns: A dictionary describing the stored file.
+        """
+
+        publish_storage = self.parent.engine.tk_sketchbook.publish_storage
+        result = publish_storage.store_compressed(work_file, publish_file)
+
+        self.logger.info(
+            "Compressed the published file from %.1f MB to %.1f MB in %.2fs "
+            "(checked in %.2fs)."
+            % (
+                result["source_bytes"] / (1024.0 * 1024.0),
+                result["bytes"] / (1024.0 * 1024.0),
+                result["seconds"],
+                result["validation_seconds"],
+            )
+        )
+        return result
+
+    def _write_sidecar(self, item):
+        """
+        Write the metadata sidecar of the published document and record it in
+        the local publish index. See :mod:`tk_sketchbook.sidecar`.
+
+        :param item: Item to process
+        """
+
+        publish_data = item.properties.get("sg_publish_data")
+        publish_path = item.properties.get("publish_path")
+        if not publish_data or not publish_path:
+            return
+
+        # use the background generated thumbnail if it is ready
+        thumbnail_path = None
+        thumbnail_request = item.properties.get("thumbnail_request")
+        if (
+            thumbnail_request
+            and thumbnail_request.ready()
+            and thumbnail_request.successful()
+        ):
+            thumbnail_path = thumbnail_request.get()
+
+        engine = self.parent.engine
+        sidecar = engine.tk_sketchbook.sidecar
+
+        # read the metadata from the saved document, the published copy may be
+        # stored as a delta or compressed
+        metadata = sidecar.read_metadata(item.properties["path"], thumbnail_path)
+        try:
+            sidecar_path = sidecar.write_sidecar(publish_path, metadata)
+        except (IOError, OSError) as e:
+            self.logger.warning("Unable to write the publish sidecar: %s" % (e,))
+        else:
+            self.logger.debug("Wrote publish sidecar %s" % (sidecar_path,))
+
+        engine.publish_index.record_metadata(publish_data["id"], publish_path, metadata)
+
+    def _warn_if_already_published(self, path):
+        """
+        Log a warning if the saved document has already been published with
+        the same content.
+
+        :param str path: The path of the saved document.
+        """
+
+        # the document is saved before it is published, so unsaved changes
+        # mean the published content will differ from what is on disk
+        if sketchbook_api.is_current_document_dirty():
+            return
+
+        # the document is hashed in the background when it is saved, it's not
+        # hashed here to keep the validation responsive
+        engine = self.parent.engine
+        content_hash = engine.get_content_hash(path)
+        if not content_hash:
+            self.logger.debug("Content hash not available yet for %s" % (path,))
+            return
+
+        entry = engine.publish_index.find(content_hash)
+        if entry and entry["published_file"]:
+            self.logger.warning(
+                "This file has not changed since it was published from %s."
+                % (entry["path"],),
+                extra={
+                    "action_show_in_shotgun": {
+                        "label": "Show Publish",
+                        "tooltip": "Reveal the previous publish in Shotgun.",
+                        "entity": entry["published_file"],
+                    }
+                },
+            )
 
 
 def _session_path():
@@ -345,21 +753,76 @@ def _session_path():
     :return:
     """
 
-    return sketchbook_api.get_current_path()
+    return sgtk.platform.current_engine().get_current_path()
 
 
-def _get_save_as_action():
+def _is_stored(item):
     """
-    Simple helper for returning a log action dict for saving the session
+    Return True if the item's publish is stored as a delta or compressed, see
+    :mod:`tk_sketchbook.publish_storage`.
+    """
+
+    publish_copy = item.properties.get("publish_copy")
+    return bool(publish_copy) and publish_copy.get("mode") in ("delta", "compressed")
+
+
+def _get_prevalidated(name, path, work_template):
+    """
+    Return the result of a validation check computed in the background when
+    the document was saved, see :class:`tk_sketchbook.ValidationCache`.
+
+    :param str name: The check name.
+    :param str path: The document path.
+    :param work_template: The work template the check must have used.
+
+    :returns: The check result, or None if the check must be computed.
     """
 
     engine = sgtk.platform.current_engine()
-    callback = engine.show_save_dialog
+    found, result = engine.validation_cache.lookup(name, path)
+    if not found:
+        return None
 
-    return {
-        "action_button": {
-            "label": "Save As...",
-            "tooltip": "Save the current session",
-            "callback": callback,
-        }
-    }
+    template_name = work_template.name if work_template else None
+    if result.get("template") != template_name:
+        return None
+    return result
+
+
+class _PrefetchedPublisher(object):
+    """
+    Proxy of the publisher app whose util answers the look ups of conflicting
+    publishes from the publishes prefetched by the pre publish hook, see
+    :class:`tk_sketchbook.PublishedFileCache`. Look ups the cache can't answer
+    go to Shotgun. Everything else is the publisher's.
+    """
+
+    def __init__(self, publisher, cache):
+        self._publisher = publisher
+        self.util = _PrefetchedUtil(publisher, cache)
+
+    def __getattr__(self, name):
+        return getattr(self._publisher, name)
+
+
+class _PrefetchedUtil(object):
+    """
+    Proxy of the publisher's util module, see :class:`_PrefetchedPublisher`.
+    """
+
+    def __init__(self, publisher, cache):
+        self._publisher = publisher
+        self._cache = cache
+
+    def get_conflicting_publishes(self, context, path, publish_name, filters=None):
+        publishes = self._cache.find_conflicting(
+            self._publisher.sgtk, context, path, publish_name, filters
+        )
+        if publishes is None:
+            return self._publisher.util.get_conflicting_publishes(
+                context, path, publish_name, filters=filters
+            )
+        return publishes
+
+    def __getattr__(self, name):
+        return getattr(self._publisher.util, name)
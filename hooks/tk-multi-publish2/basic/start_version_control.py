@@ -10,11 +10,14 @@
 
 import os
 import sgtk
-import sketchbook_api
 
 HookBaseClass = sgtk.get_hook_baseclass()
 
 
+# measures the plugin phases, see tk_sketchbook.publish_profile.profiled
+_profiled = sgtk.platform.current_engine().tk_sketchbook.publish_profile.profiled
+
+
 class SketchBookStartVersionControlPlugin(HookBaseClass):
     """
     Simple plugin to insert a version number into the SketchBook file path if one
@@ -91,6 +94,7 @@ class SketchBookStartVersionControlPlugin(HookBaseClass):
         """
         return {}
 
+    @_profiled
     def accept(self, settings, item):
         """
         Method called by the publisher to determine if an item is of any
@@ -137,11 +141,12 @@ class SketchBookStartVersionControlPlugin(HookBaseClass):
             # the session has not been saved before (no path determined).
             # provide a save button. the session will need to be saved before
             # validation will succeed.
+            save_ledger = self.parent.engine.tk_sketchbook.save_ledger
             self.logger.warn(
                 "SketchBook `{name}` plugin is not accepted because the current session has not been saved. Please save and refresh.".format(
                     name=self.name
                 ),
-                extra=_get_save_as_action(),
+                extra=save_ledger.get_save_as_action(),
             )
 
         self.logger.info(
@@ -152,6 +157,7 @@ class SketchBookStartVersionControlPlugin(HookBaseClass):
         # return the acceptance value
         return acceptance
 
+    @_profiled
     def validate(self, settings, item):
         """
         Validates the given item to check that it is ok to publish.
@@ -169,24 +175,37 @@ class SketchBookStartVersionControlPlugin(HookBaseClass):
         publisher = self.parent
         path = _session_path()
 
+        # start a new save ledger for this publish
+        item.properties["save_ledger"] = None
+
         # NOTE: If the plugin is attached to an item, that means no version
         # number could be found in the path. If that's the case, the work file
         # template won't be much use here as it likely has a version number
         # field defined within it. Simply use the path info hook to inject a
         # version number into the current file path
 
-        # get the path to a versioned copy of the file.
-        version_path = publisher.util.get_version_path(path, "v001")
-        if os.path.exists(version_path):
+        # get the path to a versioned copy of the file, checked in the
+        # background when the document was saved if possible
+        engine = publisher.engine
+        found, version_control = engine.validation_cache.lookup("version_control", path)
+        if found:
+            version_path_exists = version_control["exists"]
+        else:
+            version_path = publisher.util.get_version_path(path, "v001")
+            version_path_exists = os.path.exists(version_path)
+
+        if version_path_exists:
             error_msg = (
                 "A file already exists with a version number. Please "
                 "choose another name."
             )
-            self.logger.error(error_msg, extra=_get_save_as_action())
+            save_ledger = engine.tk_sketchbook.save_ledger
+            self.logger.error(error_msg, extra=save_ledger.get_save_as_action())
             raise Exception(error_msg)
 
         return True
 
+    @_profiled
     def publish(self, settings, item):
         """
         Executes the publish logic for the given item and settings.
@@ -203,17 +222,19 @@ class SketchBookStartVersionControlPlugin(HookBaseClass):
         # are appropriate for current os, no double separators, etc.
         path = sgtk.util.ShotgunPath.normalize(_session_path())
 
-        # ensure the session is saved in its current state
-        sketchbook_api.save_file()
-
         # get the path to a versioned copy of the file.
         version_path = publisher.util.get_version_path(path, "v001")
 
-        # save to the new version path
-        sketchbook_api.save_file_as(version_path)
+        # save the session in its current state to the new version path. the
+        # save of the current path is merged into the save as, so the document
+        # is only written once.
+        ledger = self.parent.engine.tk_sketchbook.save_ledger.get_save_ledger(item)
+        ledger.save(defer=True)
+        ledger.save_as(version_path)
         self.logger.info("A version number has been added to the SketchBook file...")
         self.logger.info("  SketchBook file path: %s" % (version_path,))
 
+    @_profiled
     def finalize(self, settings, item):
         """
         Execute the finalization pass. This pass executes once
@@ -270,25 +291,7 @@ def _session_path():
     :return:
     """
 
-    return sketchbook_api.get_current_path()
-
-
-def _get_save_as_action():
-    """
-
-    Simple helper for returning a log action dict for saving the session
-    """
-
-    engine = sgtk.platform.current_engine()
-    callback = engine.show_save_dialog
-
-    return {
-        "action_button": {
-            "label": "Save As...",
-            "tooltip": "Save the current session",
-            "callback": callback,
-        }
-    }
+    return sgtk.platform.current_engine().get_current_path()
 
 
 def _get_version_docs_action():
@@ -8,14 +8,25 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Autodesk, Inc.
 
+import logging
 import os
 import pprint
+import shutil
+import time
+from multiprocessing.pool import ThreadPool
+
 import sgtk
 from tank_vendor import six
 
+import sketchbook_api
+
 HookBaseClass = sgtk.get_hook_baseclass()
 
 
+# measures the plugin phases, see tk_sketchbook.publish_profile.profiled
+_profiled = sgtk.platform.current_engine().tk_sketchbook.publish_profile.profiled
+
+
 class SketchBookUploadVersionPlugin(HookBaseClass):
     """
     Plugin for sending images to Shotgun for review.
@@ -101,6 +112,18 @@ class SketchBookUploadVersionPlugin(HookBaseClass):
                 "default": True,
                 "description": "Should the local file be referenced by Shotgun",
             },
+            "Review Proxy Max Size": {
+                "type": "int",
+                "default": 2048,
+                "description": "Maximum width or height, in pixels, of the review "
+                "proxy uploaded in place of the original file. Set to 0 to "
+                "upload the original file.",
+            },
+            "Review Proxy Format": {
+                "type": "str",
+                "default": "jpg",
+                "description": "Image format of the review proxy, e.g. jpg or png",
+            },
         }
 
     @property
@@ -116,6 +139,7 @@ class SketchBookUploadVersionPlugin(HookBaseClass):
         # we use "video" since that's the mimetype category.
         return ["sketchbook.session"]
 
+    @_profiled
     def accept(self, settings, item):
         """
         Method called by the publisher to determine if an item is of any
@@ -147,11 +171,12 @@ class SketchBookUploadVersionPlugin(HookBaseClass):
 
         # Let's tell the log something when a file is not saved
         if not file_path:
+            save_ledger = publisher.engine.tk_sketchbook.save_ledger
             self.logger.warn(
                 "SketchBook `{name}` plugin is not accepted because the current session has not been saved. Please save and refresh.".format(
                     name=self.name
                 ),
-                extra=_get_save_as_action(),
+                extra=save_ledger.get_save_as_action(),
             )
             return {"accepted": False, "checked": False}
 
@@ -182,6 +207,7 @@ class SketchBookUploadVersionPlugin(HookBaseClass):
             )
             return {"accepted": False}
 
+    @_profiled
     def validate(self, settings, item):
         """
         Validates the given item to check that it is ok to publish.
@@ -195,8 +221,66 @@ class SketchBookUploadVersionPlugin(HookBaseClass):
 
         :returns: True if item is valid, False otherwise.
         """
+
+        # ---- check whether this content has already been uploaded
+
+        existing_version = self._find_existing_version(item)
+
+        linked_version = item.properties.get("link_existing_version")
+        if linked_version and (
+            not existing_version or linked_version["id"] != existing_version["id"]
+        ):
+            # the document has changed since the user chose to link it
+            item.properties["link_existing_version"] = None
+            linked_version = None
+
+        if linked_version:
+            self.logger.info(
+                "The publish will be linked to the existing Version instead of "
+                "uploading the file again.",
+                extra={
+                    "action_show_in_shotgun": {
+                        "label": "Show Version",
+                        "tooltip": "Reveal the version in Shotgun.",
+                        "entity": linked_version,
+                    }
+                },
+            )
+        elif existing_version:
+
+            def link_existing_version():
+                # only query Shotgun once the user chooses to link, to make
+                # sure the Version hasn't been deleted since
+                version = self.parent.shotgun.find_one(
+                    "Version", [["id", "is", existing_version["id"]]], ["code"]
+                )
+                if not version:
+                    self.logger.warning(
+                        "The Version has been deleted, the file will be uploaded."
+                    )
+                    return
+
+                item.properties["link_existing_version"] = version
+                self.logger.info(
+                    "The publish will be linked to Version '%s'." % (version["code"],)
+                )
+
+            self.logger.warning(
+                "This file has not changed since it was uploaded for review "
+                "from %s." % (existing_version["path"],),
+                extra={
+                    "action_button": {
+                        "label": "Link Version",
+                        "tooltip": "Link the publish to the existing Version "
+                        "instead of uploading the file again",
+                        "callback": link_existing_version,
+                    }
+                },
+            )
+
         return True
 
+    @_profiled
     def publish(self, settings, item):
         """
         Executes the publish logic for the given item and settings.
@@ -207,9 +291,82 @@ class SketchBookUploadVersionPlugin(HookBaseClass):
         :param item: Item to process
         """
 
+        publisher = self.parent
+
+        round_trips = publisher.engine.tk_sketchbook.RoundTripLog()
+
+        # file transfers run in worker threads so that they overlap with the
+        # entity writes. each thread uses its own Shotgun connection.
+        transfer_pool = ThreadPool(2)
+        try:
+            if item.properties.get("link_existing_version"):
+                self._link_existing_version(item, round_trips, transfer_pool)
+            else:
+                self._create_version(settings, item, round_trips, transfer_pool)
+        finally:
+            transfer_pool.close()
+
+        self.logger.info(
+            "Made %d Shotgun round trips." % (round_trips.count,),
+            extra={
+                "action_show_more_info": {
+                    "label": "Round Trips",
+                    "tooltip": "Show the Shotgun round trips and their latency",
+                    "text": "<pre>%s</pre>" % (round_trips.summary(),),
+                }
+            },
+        )
+
+    def _create_version(self, settings, item, round_trips, transfer_pool):
+        """
+        Create the Version for the item, upload the file for review and update
+        the publish thumbnail.
+
+        :param settings: Dictionary of Settings.
+        :param item: Item to process
+        :param round_trips: The :class:`RoundTripLog` to record requests in.
+        :param transfer_pool: The thread pool to run file transfers in.
+        """
+
         publisher = self.parent
         path = item.properties["path"]
 
+        # the document may still be being written to the work area
+        error = publisher.engine.wait_for_saves(path)
+        if error:
+            raise Exception(error)
+
+        # the content hash is looked up once, for the thumbnail and the
+        # publish index
+        content_hash = self._get_content_hash(path)
+        item.properties["content_hash"] = content_hash
+
+        # start generating the review proxy now so that it is produced while
+        # the Version is being created in Shotgun
+        proxy_request = None
+        if settings["Upload"].value and settings["Review Proxy Max Size"].value > 0:
+            review_proxy = publisher.engine.tk_sketchbook.review_proxy
+            proxy_request = review_proxy.start_review_proxy(
+                path,
+                settings["Review Proxy Max Size"].value,
+                settings["Review Proxy Format"].value,
+            )
+
+        # the publish thumbnail doesn't depend on the Version, upload it while
+        # the Version is being created
+        publish_data = item.properties.get("sg_publish_data")
+        thumbnail_upload = None
+        if publish_data:
+            self.logger.info("Updating publish thumbnail...")
+            thumbnail_upload = self._start_publish_thumbnail_upload(
+                item,
+                publish_data,
+                proxy_request,
+                content_hash,
+                round_trips,
+                transfer_pool,
+            )
+
         # allow the publish name to be supplied via the item properties. this is
         # useful for collectors that have access to templates and can determine
         # publish information about the item that doesn't require further, fuzzy
@@ -234,33 +391,39 @@ class SketchBookUploadVersionPlugin(HookBaseClass):
             "sg_task": item.context.task,
         }
 
-        if "sg_publish_data" in item.properties:
-            publish_data = item.properties["sg_publish_data"]
+        if publish_data:
             version_data["published_files"] = [publish_data]
 
         if settings["Link Local File"].value:
             version_data["sg_path_to_movie"] = path
 
-        # log the version data for debugging
-        self.logger.debug(
-            "Populated Version data...",
-            extra={
-                "action_show_more_info": {
-                    "label": "Version Data",
-                    "tooltip": "Show the complete Version data dictionary",
-                    "text": "<pre>%s</pre>" % (pprint.pformat(version_data),),
-                }
-            },
-        )
+        # log the version data for debugging, only formatting it if debug
+        # messages are logged
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                "Populated Version data...",
+                extra={
+                    "action_show_more_info": {
+                        "label": "Version Data",
+                        "tooltip": "Show the complete Version data dictionary",
+                        "text": "<pre>%s</pre>" % (pprint.pformat(version_data),),
+                    }
+                },
+            )
 
-        # Create the version
-        version = publisher.shotgun.create("Version", version_data)
+        # Create the version. The link to the publish is part of the Version
+        # data, so no further write is needed.
+        version = round_trips.call(
+            "create Version", publisher.shotgun.create, "Version", version_data
+        )
         self.logger.info("Version created!")
 
         # stash the version info in the item just in case
         item.properties["sg_version_data"] = version
 
-        thumb = item.get_thumbnail_as_path()
+        upload_path = path
+        if proxy_request:
+            upload_path = self._get_review_proxy_path(proxy_request, item)
 
         if settings["Upload"].value:
             self.logger.info("Uploading content...")
@@ -268,32 +431,32 @@ class SketchBookUploadVersionPlugin(HookBaseClass):
             # on windows, ensure the path is utf-8 encoded to avoid issues with
             # the shotgun api
             if sgtk.util.is_windows():
-                upload_path = six.ensure_text(path)
-            else:
-                upload_path = path
-
-            self.parent.shotgun.upload(
-                "Version", version["id"], upload_path, "sg_uploaded_movie"
+                upload_path = six.ensure_text(upload_path)
+
+            start_time = time.time()
+            round_trips.call(
+                "upload: sg_uploaded_movie",
+                publisher.shotgun.upload,
+                "Version",
+                version["id"],
+                upload_path,
+                "sg_uploaded_movie",
             )
+            upload_seconds = time.time() - start_time
 
-        self.logger.info("Upload complete!")
+            self.logger.info("Upload complete!")
+            if upload_seconds > 0:
+                publisher.engine.tk_sketchbook.metrics.observe(
+                    "sketchbook_upload_bytes_per_second",
+                    os.path.getsize(upload_path) / upload_seconds,
+                )
 
-        # thumbnail to upload is the one stored in item
-        thumb = item.get_thumbnail_as_path()
-        # if thumbnail not set, consider the one created from file path
-        if not thumb:
-            thumb = upload_path
-
-        # go ahead and update the publish thumbnail (if there was one)
-        if publish_data:
-            self.logger.info("Updating publish thumbnail...")
-            self.parent.shotgun.upload_thumbnail(
-                publish_data["type"], publish_data["id"], thumb
-            )
-            self.logger.info("Publish thumbnail updated!")
+        if thumbnail_upload:
+            self._wait_for_publish_thumbnail_upload(thumbnail_upload)
 
         item.properties["upload_path"] = upload_path
 
+    @_profiled
     def finalize(self, settings, item):
         """
         Execute the finalization pass. This pass executes once all the publish
@@ -308,6 +471,16 @@ class SketchBookUploadVersionPlugin(HookBaseClass):
         path = item.properties["path"]
         version = item.properties["sg_version_data"]
 
+        # remember the Version this content was uploaded as
+        content_hash = item.properties.get("content_hash")
+        if content_hash:
+            self.parent.engine.publish_index.record(content_hash, path, version=version)
+
+        # the review proxy has been uploaded, remove it from disk
+        review_proxy = item.properties.get("review_proxy")
+        if review_proxy:
+            shutil.rmtree(os.path.dirname(review_proxy["path"]), ignore_errors=True)
+
         self.logger.info(
             "Version uploaded for file: %s" % (path,),
             extra={
@@ -319,6 +492,221 @@ class SketchBookUploadVersionPlugin(HookBaseClass):
             },
         )
 
+    def _get_content_hash(self, path):
+        """
+        Return the content hash of the given file, as computed when it was
+        saved if it's known, or None if it cannot be computed.
+        """
+
+        content_hash = self.parent.engine.get_content_hash(path)
+        if content_hash:
+            return content_hash
+
+        try:
+            return self.parent.engine.tk_sketchbook.hashing.hash_file(path)
+        except Exception as e:
+            self.logger.debug("Unable to hash '%s': %s" % (path, e))
+            return None
+
+    def _find_existing_version(self, item):
+        """
+        Return the Version the document was previously uploaded as, if its
+        content hasn't changed since. Shotgun isn't queried, the Version may
+        have been deleted since.
+
+        :param item: Item to process
+
+        :returns: The Version entity dictionary, with the path the content was
+            uploaded from as its ``path`` key, or None.
+        """
+
+        path = item.properties.get("path")
+
+        # the document is saved before it is published, so unsaved changes
+        # mean the uploaded content will differ from what is on disk
+        if not path or sketchbook_api.is_current_document_dirty():
+            return None
+
+        # the document is hashed in the background when it is saved, it's not
+        # hashed here to keep the validation responsive
+        content_hash = self.parent.engine.get_content_hash(path)
+        if not content_hash:
+            return None
+
+        entry = self.parent.engine.publish_index.find(content_hash)
+        if not entry or not entry["version"]:
+            return None
+
+        return dict(entry["version"], path=entry["path"])
+
+    def _link_existing_version(self, item, round_trips, transfer_pool):
+        """
+        Link the publish to the existing Version chosen during validation,
+        instead of creating a new Version and uploading the file again.
+
+        :param item: Item to process
+        :param round_trips: The :class:`RoundTripLog` to record requests in.
+        :param transfer_pool: The thread pool to run file transfers in.
+        """
+
+        publisher = self.parent
+        version = item.properties["link_existing_version"]
+
+        publish_data = item.properties.get("sg_publish_data")
+        if publish_data:
+            self.logger.info("Updating publish thumbnail...")
+            thumbnail_upload = self._start_publish_thumbnail_upload(
+                item,
+                publish_data,
+                None,
+                self._get_content_hash(item.properties["path"]),
+                round_trips,
+                transfer_pool,
+            )
+
+            self.logger.info("Linking publish to Version '%s'..." % (version["code"],))
+            round_trips.call(
+                "update Version",
+                publisher.shotgun.update,
+                "Version",
+                version["id"],
+                {"published_files": [publish_data]},
+                multi_entity_update_modes={"published_files": "add"},
+            )
+
+            self._wait_for_publish_thumbnail_upload(thumbnail_upload)
+
+        item.properties["sg_version_data"] = version
+        item.properties["upload_path"] = None
+
+    def _get_review_proxy_path(self, proxy_request, item):
+        """
+        Wait for the review proxy to be generated and return its path. If the
+        proxy could not be generated, the original file path is returned.
+
+        :param proxy_request: The pending review proxy request.
+        :param item: Item to process
+
+        :returns: The path of the file to upload for review.
+        """
+
+        path = item.properties["path"]
+
+        try:
+            review_proxy = proxy_request.get()
+        except Exception as e:
+            self.logger.warning(
+                "Unable to generate a review proxy, uploading the original "
+                "file instead: %s" % (e,)
+            )
+            return path
+
+        item.properties["review_proxy"] = review_proxy
+
+        saved_bytes = review_proxy["source_bytes"] - review_proxy["proxy_bytes"]
+        self.logger.info(
+            "Review proxy generated in %.2fs, saving %.1f MB of upload."
+            % (review_proxy["seconds"], saved_bytes / (1024.0 * 1024.0)),
+            extra={
+                "action_show_more_info": {
+                    "label": "Proxy Info",
+                    "tooltip": "Show the review proxy details",
+                    "text": "<pre>%s</pre>" % (pprint.pformat(review_proxy),),
+                }
+            },
+        )
+
+        return review_proxy["path"]
+
+    def _start_publish_thumbnail_upload(
+        self,
+        item,
+        publish_data,
+        proxy_request,
+        content_hash,
+        round_trips,
+        transfer_pool,
+    ):
+        """
+        Start uploading the publish thumbnail in a transfer thread.
+
+        The thumbnail stored in the item is used if there is one. Otherwise a
+        cached thumbnail generated from the document is used, falling back to
+        the review proxy, then the document itself, if no thumbnail can be
+        generated.
+
+        :param item: Item to process
+        :param dict publish_data: The PublishedFile to upload the thumbnail for.
+        :param proxy_request: The pending review proxy request, if any.
+        :param str content_hash: The content hash of the document, or None.
+        :param round_trips: The :class:`RoundTripLog` to record requests in.
+        :param transfer_pool: The thread pool to run file transfers in.
+
+        :returns: A :class:`multiprocessing.pool.AsyncResult` for the upload,
+            see :meth:`_wait_for_publish_thumbnail_upload`.
+        """
+
+        # the item thumbnail is a QPixmap, it must be read on the main thread
+        item_thumbnail = item.get_thumbnail_as_path()
+        thumbnail_request = item.properties.get("thumbnail_request")
+        thumbnail_cache = self.parent.engine.thumbnail_cache
+        path = item.properties["path"]
+
+        def upload_thumbnail():
+            # runs in a transfer thread, so this must not log. the publisher's
+            # log view is updated on the main thread.
+            thumb = item_thumbnail
+            error = None
+            if not thumb:
+                try:
+                    if thumbnail_request and not content_hash:
+                        # the thumbnail of the document as it was collected
+                        thumb = thumbnail_request.get()
+                    else:
+                        # wait for the thumbnail requested by the collector,
+                        # if any, then look it up in the cache by the hash,
+                        # without reading the document again. this
+                        # regenerates the thumbnail if the document has been
+                        # saved since.
+                        if thumbnail_request:
+                            thumbnail_request.wait()
+                        thumb = thumbnail_cache.get_thumbnail(path, content_hash)
+                except Exception as e:
+                    error = e
+                    thumb = path
+                    if proxy_request:
+                        try:
+                            thumb = proxy_request.get()["path"]
+                        except Exception:
+                            pass
+
+            round_trips.call(
+                "upload_thumbnail: %s" % (publish_data["type"],),
+                self.parent.shotgun.upload_thumbnail,
+                publish_data["type"],
+                publish_data["id"],
+                thumb,
+            )
+            return error
+
+        return transfer_pool.apply_async(upload_thumbnail)
+
+    def _wait_for_publish_thumbnail_upload(self, thumbnail_upload):
+        """
+        Wait for the publish thumbnail upload to complete.
+
+        :param thumbnail_upload: The result returned by
+            :meth:`_start_publish_thumbnail_upload`.
+        """
+
+        thumbnail_error = thumbnail_upload.get()
+        if thumbnail_error:
+            self.logger.warning(
+                "Unable to generate a publish thumbnail, used the uploaded "
+                "file instead: %s" % (thumbnail_error,)
+            )
+        self.logger.info("Publish thumbnail updated!")
+
     def _get_version_entity(self, item):
         """
         Returns the best entity to link the version to.
@@ -330,20 +718,3 @@ class SketchBookUploadVersionPlugin(HookBaseClass):
             return item.context.project
         else:
             return None
-
-
-def _get_save_as_action():
-    """
-    Simple helper for returning a log action dict for saving the session
-    """
-
-    engine = sgtk.platform.current_engine()
-    callback = engine.show_save_dialog
-
-    return {
-        "action_button": {
-            "label": "Save As...",
-            "tooltip": "Save the current session",
-            "callback": callback,
-        }
-    }
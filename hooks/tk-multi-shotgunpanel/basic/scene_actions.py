@@ -13,8 +13,6 @@ Hook that loads defines all the available actions, broken down by publish type.
 
 import sgtk
 
-import sketchbook_api
-
 HookBaseClass = sgtk.get_hook_baseclass()
 
 
@@ -57,9 +55,12 @@ class SketchBookActions(HookBaseClass):
         :returns List of dictionaries, each with keys name, params, caption and description
         """
         app = self.parent
-        app.log_debug(
-            "Generate actions called for UI element %s. "
-            "Actions: %s. Publish Data: %s" % (ui_area, actions, sg_data)
+        # formatted only if written to the log
+        app.logger.debug(
+            "Generate actions called for UI element %s. Actions: %s. Publish Data: %s",
+            ui_area,
+            actions,
+            sg_data,
         )
 
         action_instances = []
@@ -72,13 +73,31 @@ class SketchBookActions(HookBaseClass):
             # base class doesn't have the method, so ignore and continue
             pass
 
+        # describe published files from their publish sidecar, once it has been
+        # looked up in the background
+        details = ""
+        if sg_data.get("type") == "PublishedFile":
+            # the path is resolved in the background, along with the look ups
+            def get_path():
+                return self.get_publish_path(sg_data)
+
+            description = app.engine.publish_details.describe(sg_data["id"], get_path)
+            if description:
+                details = " (%s)" % (description,)
+
+            # the file is likely to be opened or imported next, start reading
+            # it in the background
+            if "open_file" in actions or "add_image" in actions:
+                app.engine.read_ahead_publish(sg_data["id"], get_path)
+
         if "open_file" in actions:
             action_instances.append(
                 {
                     "name": "open_file",
                     "params": None,
                     "caption": "Open File",
-                    "description": "Open an image file to start working with.",
+                    "description": "Open an image file to start working with."
+                    + details,
                 }
             )
 
@@ -88,7 +107,8 @@ class SketchBookActions(HookBaseClass):
                     "name": "add_image",
                     "params": None,
                     "caption": "Add Image...",
-                    "description": "This will import the selected image file to the canvas.",
+                    "description": "This will import the selected image file to the canvas."
+                    + details,
                 }
             )
 
@@ -104,34 +124,22 @@ class SketchBookActions(HookBaseClass):
         :param sg_data: Shotgun data dictionary with all the standard publish fields.
         :returns: No return value expected.
         """
-        app = self.parent
-        app.log_debug(
-            "Execute action called for action %s. "
-            "Parameters: %s. Shotgun Data: %s" % (name, params, sg_data)
-        )
 
-        if name == "open_file":
-            # resolve path
-            path = self.get_publish_path(sg_data)
-            return sketchbook_api.open_file(path)
-        elif name == "add_image":
-            # resolve path
-            path = self.get_publish_path(sg_data)
-            return sketchbook_api.add_image(path)
-
-        else:
-            try:
-                HookBaseClass.execute_action(self, name, params, sg_data)
-            except AttributeError:
-                # base class doesn't have the method, so ignore and continue
-                pass
+        report = self._get_executor().execute([(name, params, sg_data)])
+        result = report.results[0]
+        if result["error"] is not None:
+            raise result["error"]
+        return result["message"]
 
     def execute_multiple_actions(self, actions):
         """
         Executes the specified action on a list of items.
 
-        The default implementation dispatches each item from ``actions`` to
-        the ``execute_action`` method.
+        The actions are run by the engine's
+        :class:`tk_sketchbook.ActionExecutor`: the same action on the same
+        file only runs once, the files of all the items are read ahead
+        concurrently, and each item is loaded in SketchBook, in order, as soon
+        as its file is ready.
 
         The ``actions`` is a list of dictionaries holding all the actions to execute.
         Each entry will have the following values:
@@ -141,18 +149,46 @@ class SketchBookActions(HookBaseClass):
             params: Parameters passed down from the generate_actions hook.
 
         .. note::
-            This is the default entry point for the hook. It reuses the ``execute_action``
-            method for backward compatibility with hooks written for the previous
+            This is the default entry point for the hook. ``execute_action`` is
+            kept for backward compatibility with hooks written for the previous
             version of the loader.
 
         .. note::
-            The hook will stop applying the actions on the selection if an error
-            is raised midway through.
+            An error doesn't stop the remaining actions. The errors are
+            reported together once all the actions have run.
 
         :param list actions: Action dictionaries.
         """
-        for single_action in actions:
-            name = single_action["name"]
-            sg_data = single_action["sg_data"]
-            params = single_action["params"]
-            self.execute_action(name, params, sg_data)
+
+        report = self._get_executor().execute(
+            [
+                (
+                    single_action["name"],
+                    single_action["params"],
+                    single_action["sg_data"],
+                )
+                for single_action in actions
+            ]
+        )
+        report.show()
+
+    def _get_executor(self):
+        """
+        Return an action executor running the actions of this hook.
+        """
+
+        engine = self.parent.engine
+        return engine.tk_sketchbook.ActionExecutor(
+            engine, self.get_publish_path, self._execute_base_action
+        )
+
+    def _execute_base_action(self, name, params, sg_data):
+        """
+        Execute an action of the base class, if it has any.
+        """
+
+        try:
+            return HookBaseClass.execute_action(self, name, params, sg_data)
+        except AttributeError:
+            # base class doesn't have the method, so ignore and continue
+            pass
@@ -64,11 +64,22 @@ class SceneOperation(HookClass):
                                 all others     - True if operation was successfully completed,
                                                  otherwise False
         """
+        tracing = self.parent.engine.tk_sketchbook.tracing
+        with tracing.span(
+            "workfiles2.scene_operation", operation=operation, path=file_path
+        ):
+            return self._execute_operation(operation, file_path)
+
+    def _execute_operation(self, operation, file_path):
+        """
+        Perform a scene operation, see :meth:`execute`.
+        """
+
         if operation == "current_path":
             """
             Get current file path
             """
-            return sketchbook_api.get_current_path()
+            return self.parent.engine.get_current_path()
 
         elif operation == "open":
             """
@@ -85,14 +96,18 @@ class SceneOperation(HookClass):
             """
             File Save
             """
-            sketchbook_api.save_file()
+            self.parent.engine.save_file()
+            self.parent.engine.validation_cache.schedule(
+                self.parent.engine.get_current_path()
+            )
             return True
 
         elif operation == "save_as":
             """
             File Save As
             """
-            sketchbook_api.save_file_as(file_path)
+            self.parent.engine.save_file_as(file_path)
+            self.parent.engine.validation_cache.schedule(file_path)
             return True
 
         elif operation == "reset":
@@ -1,3 +1,32 @@
 # Copyright (c) 2020  Autodesk Inc.
 
 from .menu import SketchBookMenu
+from .actions import ActionExecutor
+from .async_logging import AsyncFileLogging
+from .command_profiler import CommandProfiler
+from . import file_copy
+from . import hashing
+from . import image_utils
+from . import metrics
+from . import prefetch
+from . import prevalidation
+from . import publish_profile
+from . import publish_storage
+from . import review_proxy
+from . import save_ledger
+from . import sidecar
+from . import tracing
+from .prescale import PrescaleCache
+from .prevalidation import ValidationCache
+from .publish_index import PublishIndex
+from .publish_profile import PublishProfile
+from .published_files import PublishedFileCache
+from .read_ahead import ReadAhead
+from .round_trips import RoundTripLog
+from .save_ledger import SaveLedger
+from .sidecar import PublishDetails
+from .staging import StagingCache
+from .thumbnails import ThumbnailCache
+from .watchdog import StallWatchdog
+from .work_manifest import WorkManifest
+from .write_behind import WriteBehindCache
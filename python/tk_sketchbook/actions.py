@@ -0,0 +1,297 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+Execution of the actions of the Loader and Shotgun Panel scene actions hooks.
+"""
+
+import contextlib
+import os
+import time
+
+import sgtk
+
+import sketchbook_api
+
+from . import tracing
+from .prefetch import iter_prefetched
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+# The actions run on the published file by the SketchBook API.
+FILE_ACTIONS = ("open_file", "add_image")
+
+
+class ActionExecutor(object):
+    """
+    Runs the actions of a selection, in order.
+
+    The selection is deduplicated, so that the same action on the same file
+    only runs once, and each publish path is resolved once. The files are
+    staged, read ahead and scaled concurrently in a thread pool while
+    SketchBook loads the previous ones. An error doesn't stop the remaining
+    actions, all the outcomes are collected in an :class:`ActionReport`.
+    """
+
+    def __init__(self, engine, get_publish_path, execute_action=None):
+        """
+        :param engine: The SketchBook engine.
+        :param get_publish_path: Function returning the path of a publish
+            from its Shotgun data, e.g. the hook's ``get_publish_path``.
+        :param execute_action: Optional function taking the action name,
+            params and Shotgun data, and running the actions other than
+            :data:`FILE_ACTIONS`.
+        """
+
+        self._engine = engine
+        self._get_publish_path = get_publish_path
+        self._execute_action = execute_action
+        self._paths = {}
+
+    def execute(self, actions):
+        """
+        Run the actions.
+
+        :param actions: A list of (name, params, Shotgun data) tuples.
+
+        :returns: An :class:`ActionReport`.
+        """
+
+        with tracing.span("actions.execute", count=len(actions)):
+            return self._execute(actions)
+
+    def _execute(self, actions):
+        """
+        Run the actions, see :meth:`execute`.
+        """
+
+        report = ActionReport()
+        items = []
+        seen = set()
+        for name, params, sg_data in actions:
+            path = None
+            if name in FILE_ACTIONS:
+                path = self._get_path(sg_data)
+                key = (name, os.path.normcase(os.path.normpath(path)))
+            else:
+                key = (name, sg_data.get("type"), sg_data.get("id"))
+
+            if key in seen:
+                report.duplicates += 1
+                continue
+            seen.add(key)
+            items.append((name, params, sg_data, path))
+
+        max_size = None
+        if any(item[0] == "add_image" for item in items):
+            max_size = self._engine.get_image_import_size()
+
+        def resolve(item):
+            name, _, sg_data, path = item
+            if path is None:
+                return None
+
+            publish_id = None
+            if sg_data.get("type") == "PublishedFile":
+                publish_id = sg_data["id"]
+            with tracing.span("actions.resolve", path=path):
+                path = self._engine.stage_publish(path, publish_id)
+                if name == "add_image":
+                    path = self._engine.prescale_image(path, max_size)
+            return path
+
+        # keep the files staged ahead from being evicted until they're loaded
+        prefetched = iter_prefetched(items, resolve=resolve)
+        with self._engine.staging_cache.hold(), contextlib.closing(prefetched):
+            for item, read_path, read_seconds, error in prefetched:
+                name, params, sg_data, path = item
+                logger.debug(
+                    "Execute action called for action %s. "
+                    "Parameters: %s. Shotgun Data: %s",
+                    name,
+                    params,
+                    sg_data,
+                )
+
+                message = None
+                start_time = time.time()
+                if error is None:
+                    try:
+                        with tracing.span("actions.run", action=name, path=read_path):
+                            message = self._run(name, params, sg_data, read_path)
+                    except Exception as e:
+                        logger.debug("Action %s failed", name, exc_info=True)
+                        error = e
+
+                report.results.append(
+                    {
+                        "name": name,
+                        "path": path,
+                        "read_seconds": read_seconds,
+                        "run_seconds": time.time() - start_time,
+                        "message": message,
+                        "error": error,
+                    }
+                )
+
+        return report
+
+    def _get_path(self, sg_data):
+        """
+        Return the publish path of an entity, resolving it once.
+        """
+
+        key = (sg_data.get("type"), sg_data.get("id"))
+        if key not in self._paths:
+            self._paths[key] = self._get_publish_path(sg_data)
+        return self._paths[key]
+
+    def _run(self, name, params, sg_data, path):
+        """
+        Run an action on the main thread.
+        """
+
+        if name == "open_file":
+            return sketchbook_api.open_file(path)
+        elif name == "add_image":
+            return sketchbook_api.add_image(path)
+        elif self._execute_action:
+            return self._execute_action(name, params, sg_data)
+
+
+class ActionReport(object):
+    """
+    The outcome of the actions run by an :class:`ActionExecutor`.
+    """
+
+    def __init__(self):
+        # dictionaries with the keys name, path, read_seconds (spent in the
+        # background), run_seconds, message (returned by the action) and
+        # error (the exception raised by the action, else None)
+        self.results = []
+        self.duplicates = 0
+
+    @property
+    def errors(self):
+        """
+        The results of the actions that failed.
+        """
+
+        return [result for result in self.results if result["error"] is not None]
+
+    def get_messages(self):
+        """
+        Return the messages returned by the actions and the errors, grouped by
+        message type and code.
+
+        :returns: A dictionary of message type, e.g. "warning", to dictionaries
+            of message code to dictionaries with the keys ``is_error`` and
+            ``paths``.
+        """
+
+        messages = {}
+
+        def add_message(message_type, message_code, is_error, path):
+            codes = messages.setdefault(message_type, {})
+            if message_code not in codes:
+                codes[message_code] = dict(is_error=is_error, paths=[])
+            codes[message_code]["paths"].append(path)
+
+        for result in self.results:
+            if result["error"] is not None:
+                add_message(
+                    "critical",
+                    "Unable to run {}: {}".format(result["name"], result["error"]),
+                    True,
+                    result["path"] or "",
+                )
+
+            message = result["message"]
+            if isinstance(message, dict):
+                add_message(
+                    message.get("message_type"),
+                    message.get("message_code"),
+                    message.get("is_error"),
+                    message.get("publish_path"),
+                )
+
+        return messages
+
+    def get_summary(self):
+        """
+        Return a summary of where the time of the actions went, or an empty
+        string for a single action.
+        """
+
+        if len(self.results) + self.duplicates < 2:
+            return ""
+
+        lines = []
+        timed = [
+            result
+            for result in self.results
+            if result["path"] and result["error"] is None
+        ]
+        if len(timed) > 1:
+            slowest = max(
+                timed, key=lambda result: result["read_seconds"] + result["run_seconds"]
+            )
+            lines.append(
+                "Loaded {} files: {:.1f}s reading ahead in the background, {:.1f}s "
+                "loading in SketchBook. Slowest: {} ({:.1f}s read, {:.1f}s load)".format(
+                    len(timed),
+                    sum(result["read_seconds"] for result in timed),
+                    sum(result["run_seconds"] for result in timed),
+                    os.path.basename(slowest["path"]),
+                    slowest["read_seconds"],
+                    slowest["run_seconds"],
+                )
+            )
+        if self.duplicates:
+            lines.append(
+                "Skipped {} duplicate items of the selection.".format(self.duplicates)
+            )
+        return "\n".join(lines)
+
+    def show(self):
+        """
+        Show the messages in a dialog per message type, with the summary.
+        """
+
+        from sgtk.platform.qt import QtGui
+
+        summary = self.get_summary()
+        if summary:
+            logger.debug(summary)
+
+        active_window = QtGui.QApplication.activeWindow()
+        for message_type, message_type_details in self.get_messages().items():
+            content = ""
+            for message_code, message_code_details in message_type_details.items():
+                if content:
+                    content += "\n\n"
+
+                is_error = message_code_details.get("is_error")
+                paths = message_code_details.get("paths")
+
+                if is_error:
+                    content += "{}: {}".format(message_code, ", ".join(paths))
+                else:
+                    if len(paths) == 1:
+                        content += "{}: {}".format(message_code, paths[0])
+                    else:
+                        content += "{} ({})".format(message_code, len(paths))
+
+            if summary:
+                content += "\n\n" + summary
+
+            getattr(QtGui.QMessageBox, message_type)(
+                active_window, message_type.title(), content
+            )
@@ -0,0 +1,253 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+Asynchronous file logging. Log records are queued by the thread that logs
+them, e.g. SketchBook's UI thread, and formatted and written to the log file
+by a background thread.
+"""
+
+import logging
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    # python 2
+    import Queue as queue
+
+try:
+    from logging.handlers import QueueHandler, QueueListener
+except ImportError:
+    # python 2
+    QueueHandler = QueueListener = None
+
+import sgtk
+
+# Default maximum number of debug records logged per second by a logger.
+DEBUG_RATE_LIMIT = 50
+
+
+class AsyncFileLogging(object):
+    """
+    Moves the Toolkit log file handler behind a queue.
+
+    The logging thread only pays for merging the message with its arguments,
+    so later changes to mutable arguments aren't logged, and queuing the
+    record: the record is formatted by the background thread when it's
+    written. Debug records above a rate limit per logger are dropped, and the
+    number of dropped records is logged once per second.
+    """
+
+    def __init__(self, debug_rate_limit=DEBUG_RATE_LIMIT):
+        """
+        :param int debug_rate_limit: The maximum number of debug records a
+            logger writes per second, 0 for no limit.
+        """
+
+        self._debug_rate_limit = debug_rate_limit
+        self._file_handler = None
+        self._queue_handler = None
+        self._listener = None
+
+    @property
+    def latency(self):
+        """
+        The :class:`LogLatency` of the records queued, None if not started.
+        """
+
+        if self._queue_handler is None:
+            return None
+        return self._queue_handler.latency
+
+    def start(self):
+        """
+        Replace the Toolkit log file handler with the queue.
+
+        :returns: True if file logging is asynchronous, False if there is no
+            log file handler or queues aren't supported by this Python.
+        """
+
+        if QueueHandler is None or self._listener is not None:
+            return False
+
+        log_manager = sgtk.LogManager()
+        file_handler = log_manager.base_file_handler
+        if file_handler is None:
+            return False
+
+        record_queue = queue.Queue()
+        self._queue_handler = _LazyQueueHandler(record_queue)
+        if self._debug_rate_limit:
+            self._queue_handler.addFilter(_DebugRateLimit(self._debug_rate_limit))
+
+        self._listener = QueueListener(
+            record_queue, file_handler, respect_handler_level=True
+        )
+        self._listener.start()
+
+        self._file_handler = file_handler
+        log_manager.root_logger.addHandler(self._queue_handler)
+        log_manager.root_logger.removeHandler(file_handler)
+        return True
+
+    def stop(self):
+        """
+        Write the queued records and restore the Toolkit log file handler.
+        """
+
+        if self._listener is None:
+            return
+
+        root_logger = sgtk.LogManager().root_logger
+        root_logger.addHandler(self._file_handler)
+        root_logger.removeHandler(self._queue_handler)
+        self._listener.stop()
+        self._listener = None
+
+
+class LogLatency(object):
+    """
+    Time spent by the logging threads handling records.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def add(self, seconds):
+        """
+        Record the time spent handling a record.
+        """
+
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def summary(self):
+        """
+        Return a one line summary.
+        """
+
+        with self._lock:
+            if not self.count:
+                return "No log records"
+            return "%d log records, %.1fus mean, %.1fus max" % (
+                self.count,
+                self.total_seconds / self.count * 1e6,
+                self.max_seconds * 1e6,
+            )
+
+
+def measure_latency(logger, count=1000, message_size=2000):
+    """
+    Measure the time the calling thread spends logging debug messages, with
+    the log handlers currently installed. Run it with and without
+    :class:`AsyncFileLogging` started, with debug logging enabled, to compare.
+
+    :param logger: The logger to log the messages with.
+    :param int count: The number of messages.
+    :param int message_size: The size of the formatted argument of each
+        message, e.g. a dump of a Shotgun dictionary.
+
+    :returns: A dictionary with the keys ``count``, ``mean``, ``p50``, ``p99``
+        and ``max``, in seconds.
+    """
+
+    data = {"field_%d" % (index,): "x" * 16 for index in range(message_size // 30)}
+    timings = []
+    for index in range(count):
+        start_time = time.time()
+        logger.debug("Latency probe %d: %s", index, data)
+        timings.append(time.time() - start_time)
+
+    timings.sort()
+    return {
+        "count": count,
+        "mean": sum(timings) / count,
+        "p50": timings[count // 2],
+        "p99": timings[min(count - 1, int(count * 0.99))],
+        "max": timings[-1],
+    }
+
+
+if QueueHandler is not None:
+
+    class _LazyQueueHandler(QueueHandler):
+        """
+        Queue handler leaving the formatting of the record to the listener,
+        once its message is merged with its arguments.
+        """
+
+        def __init__(self, record_queue):
+            QueueHandler.__init__(self, record_queue)
+            self.latency = LogLatency()
+
+        def handle(self, record):
+            start_time = time.time()
+            try:
+                return QueueHandler.handle(self, record)
+            finally:
+                self.latency.add(time.time() - start_time)
+
+        def prepare(self, record):
+            # merge the arguments while they have the values they were logged
+            # with, as the arguments, e.g. a Shotgun dictionary, may change
+            # before the listener gets to the record
+            record.msg = record.getMessage()
+            record.args = None
+            # the traceback can only be rendered while it's being handled
+            if record.exc_info:
+                if not record.exc_text:
+                    record.exc_text = logging.Formatter().formatException(
+                        record.exc_info
+                    )
+                record.exc_info = None
+            return record
+
+
+class _DebugRateLimit(logging.Filter):
+    """
+    Drops the debug records of a logger above a number per second.
+    """
+
+    def __init__(self, limit):
+        logging.Filter.__init__(self)
+        self._limit = limit
+        self._lock = threading.Lock()
+        # logger name -> [window start time, records, dropped records]
+        self._windows = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+
+        now = time.time()
+        with self._lock:
+            window = self._windows.get(record.name)
+            if window is None or now - window[0] >= 1.0:
+                dropped = window[2] if window else 0
+                window = self._windows[record.name] = [now, 0, 0]
+                if dropped:
+                    # say so in the record that starts the next window
+                    record.msg = "(%d debug messages dropped) %s" % (
+                        dropped,
+                        record.msg,
+                    )
+
+            window[1] += 1
+            if window[1] <= self._limit:
+                return True
+            window[2] += 1
+            return False
@@ -0,0 +1,158 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+Profiling of a Shotgun menu command, armed from the menu for the next
+command, so support can be sent a profile of a slow command.
+"""
+
+import collections
+import cProfile
+import os
+import re
+import threading
+import time
+
+import sgtk
+
+from .watchdog import sample_stack
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+
+class CommandProfiler(object):
+    """
+    Profiles the next command run once armed.
+
+    The stack of the thread running the command is sampled from a background
+    thread and written as collapsed stacks, one "frame;frame;frame count" line
+    per stack, the input of flamegraph.pl and https://www.speedscope.app. In
+    the "cprofile" mode, the command also runs under :mod:`cProfile` and its
+    statistics are written as a :mod:`pstats` file. The "sampling" mode only
+    samples, which slows the command down far less, e.g. for commands opening
+    modal dialogs that are used for a while.
+    """
+
+    MODES = ("cprofile", "sampling")
+
+    # seconds between stack samples, maximum frames per sample
+    SAMPLE_INTERVAL = 0.005
+    MAX_DEPTH = 200
+
+    def __init__(self, output_dir, mode="cprofile"):
+        """
+        :param str output_dir: The directory to write the profiles to.
+        :param str mode: The profiling mode, one of :attr:`MODES`.
+        """
+
+        self._output_dir = output_dir
+        self._mode = mode
+        self.armed = False
+        # the profile files written by the last run, even if it raised
+        self.paths = []
+
+    def run(self, name, func, *args, **kwargs):
+        """
+        Run a command, profiling it, and disarm the profiler.
+
+        :param str name: The command name, used in the profile file names.
+        :param func: The function running the command.
+
+        :returns: A tuple of the function's return value and the list of the
+            profile files written.
+        """
+
+        self.armed = False
+        self.paths = []
+
+        base_path = os.path.join(
+            self._output_dir,
+            "tk-sketchbook-profile-%s-%s"
+            % (
+                re.sub(r"\W+", "_", name).strip("_").lower() or "command",
+                time.strftime("%Y%m%d-%H%M%S"),
+            ),
+        )
+
+        sampler = _StackSampler(
+            threading.current_thread().ident, self.SAMPLE_INTERVAL, self.MAX_DEPTH
+        )
+        profile = cProfile.Profile() if self._mode == "cprofile" else None
+
+        start_time = time.time()
+        sampler.start()
+        if profile is not None:
+            profile.enable()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            if profile is not None:
+                profile.disable()
+            sampler.stop()
+            paths = self.paths = self._write(base_path, profile, sampler.stacks)
+            logger.info(
+                "Profiled %s for %.2fs, written to %s",
+                name,
+                time.time() - start_time,
+                ", ".join(paths),
+            )
+
+        return result, paths
+
+    def _write(self, base_path, profile, stacks):
+        """
+        Write the profile files, returning their paths.
+        """
+
+        sgtk.util.filesystem.ensure_folder_exists(self._output_dir)
+
+        paths = []
+        if profile is not None:
+            profile.dump_stats(base_path + ".pstats")
+            paths.append(base_path + ".pstats")
+
+        with open(base_path + ".collapsed.txt", "w") as collapsed_file:
+            for stack, count in sorted(stacks.items()):
+                collapsed_file.write("%s %d\n" % (";".join(stack), count))
+        paths.append(base_path + ".collapsed.txt")
+
+        return paths
+
+
+class _StackSampler(object):
+    """
+    Counts the stacks of a thread, sampled from a background thread.
+    """
+
+    def __init__(self, thread_ident, interval, max_depth):
+        self._thread_ident = thread_ident
+        self._interval = interval
+        self._max_depth = max_depth
+        self._stopped = threading.Event()
+        self._thread = None
+        self.stacks = collections.Counter()
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="SketchBookCommandProfiler"
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            stack = sample_stack(self._thread_ident, self._max_depth)
+            if stack:
+                self.stacks[stack] += 1
+            self._stopped.wait(self._interval)
@@ -0,0 +1,239 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+File copy engine used to copy large documents, e.g. work files to their
+publish location. The cheapest available method is used:
+
+- ``reflink``: a copy on write clone of the file (FICLONE on Linux, clonefile
+  on macOS). No data is copied, only supported on the same file system.
+- ``copy_file_range``: an in kernel copy (Linux, Python 3.8+), no data passes
+  through user space.
+- ``stream``: a large buffer streaming copy that computes the checksum of the
+  data in the same pass.
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+# Buffer size used by the streaming copy.
+BUFFER_SIZE = 8 * 1024 * 1024
+
+# Linux FICLONE ioctl request, _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+
+METHODS = ("reflink", "copy_file_range", "stream")
+
+
+def copy_file(source, destination, permissions=0o666, methods=METHODS):
+    """
+    Copy the source file to the destination, trying each method in turn.
+
+    :param str source: The file to copy.
+    :param str destination: The destination file path. Any existing file is
+        replaced.
+    :param int permissions: The permissions of the destination file.
+    :param methods: The copy methods to try, in order. See :data:`METHODS`.
+
+    :returns: A dictionary with the keys ``method``, ``bytes``, ``seconds``,
+        ``throughput`` (in bytes per second) and ``checksum`` (the SHA-1 of the
+        copied data, only computed by the streaming copy, else None).
+    :raises: The error raised by the last method tried, if none succeeded.
+    """
+
+    copiers = {
+        "reflink": _reflink,
+        "copy_file_range": _copy_file_range,
+        "stream": _stream_copy,
+    }
+
+    size = os.path.getsize(source)
+    start_time = time.time()
+    error = ValueError("No copy method given")
+
+    for method in methods:
+        # remove any existing file so it is replaced rather than modified in
+        # place, e.g. if it's a clone of another file.
+        if os.path.lexists(destination):
+            os.remove(destination)
+
+        try:
+            checksum = copiers[method](source, destination)
+            copied_size = os.path.getsize(destination)
+        except (OSError, IOError, NotImplementedError) as e:
+            error = e
+            continue
+
+        if copied_size != size:
+            error = IOError(
+                "The %s copy of '%s' is %d bytes instead of %d"
+                % (method, source, copied_size, size)
+            )
+            continue
+
+        os.chmod(destination, permissions)
+        seconds = time.time() - start_time
+        return {
+            "method": method,
+            "bytes": size,
+            "seconds": seconds,
+            "throughput": size / seconds if seconds > 0 else float("inf"),
+            "checksum": checksum,
+        }
+
+    if os.path.lexists(destination):
+        os.remove(destination)
+    raise error
+
+
+def checksum_file(path):
+    """
+    Return the checksum of the file, as computed by the streaming copy.
+
+    :param str path: The file path.
+    """
+
+    sha = hashlib.sha1()
+    with open(path, "rb") as data_file:
+        for chunk in iter(lambda: data_file.read(BUFFER_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def benchmark(directory, sizes=(1, 16, 128, 512), repeat=3):
+    """
+    Time each copy method for files of the given sizes.
+
+    :param str directory: The directory to create the test files in. Should be
+        on the file system the copies will be made on.
+    :param sizes: The file sizes to test, in megabytes.
+    :param int repeat: The number of copies made per size and method. The
+        fastest is reported.
+
+    :returns: A list of (size in MB, method, seconds, MB per second) tuples.
+        Methods unsupported on the file system are reported with None timings.
+    """
+
+    results = []
+    for size in sizes:
+        handle, source = tempfile.mkstemp(dir=directory)
+        destination = source + ".copy"
+        try:
+            with os.fdopen(handle, "wb") as source_file:
+                block = os.urandom(1024 * 1024)
+                for _ in range(size):
+                    source_file.write(block)
+
+            for method in METHODS:
+                timings = []
+                for _ in range(repeat):
+                    try:
+                        result = copy_file(source, destination, methods=(method,))
+                    except (OSError, IOError, NotImplementedError):
+                        break
+                    timings.append(result["seconds"])
+
+                if timings:
+                    seconds = min(timings)
+                    results.append(
+                        (size, method, seconds, size / seconds if seconds else None)
+                    )
+                else:
+                    results.append((size, method, None, None))
+        finally:
+            for path in (source, destination):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    return results
+
+
+def _reflink(source, destination):
+    """
+    Clone the source file, sharing its data blocks.
+    """
+
+    if sys.platform.startswith("linux"):
+        import fcntl
+
+        with open(source, "rb") as source_file:
+            with open(destination, "wb") as destination_file:
+                fcntl.ioctl(destination_file.fileno(), _FICLONE, source_file.fileno())
+        return None
+
+    if sys.platform == "darwin":
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "clonefile"):
+            raise NotImplementedError("clonefile is not available")
+        if libc.clonefile(_encode_path(source), _encode_path(destination), 0) != 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        return None
+
+    raise NotImplementedError("Reflinks are not supported on %s" % (sys.platform,))
+
+
+def _copy_file_range(source, destination):
+    """
+    Copy the file in the kernel with copy_file_range.
+    """
+
+    if not hasattr(os, "copy_file_range"):
+        raise NotImplementedError("copy_file_range is not available")
+
+    with open(source, "rb") as source_file:
+        with open(destination, "wb") as destination_file:
+            remaining = os.fstat(source_file.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(
+                    source_file.fileno(),
+                    destination_file.fileno(),
+                    min(remaining, 1024 * 1024 * 1024),
+                )
+                if copied == 0:
+                    # the kernel stopped copying, e.g. the file was truncated
+                    # while being copied, don't report a partial copy
+                    raise IOError(
+                        "copy_file_range stopped with %d bytes of '%s' left to "
+                        "copy" % (remaining, source)
+                    )
+                remaining -= copied
+
+    return None
+
+
+def _stream_copy(source, destination):
+    """
+    Copy the file through a large buffer, computing its checksum on the way.
+    """
+
+    sha = hashlib.sha1()
+    with open(source, "rb") as source_file:
+        with open(destination, "wb") as destination_file:
+            for chunk in iter(lambda: source_file.read(BUFFER_SIZE), b""):
+                sha.update(chunk)
+                destination_file.write(chunk)
+    return sha.hexdigest()
+
+
+def _encode_path(path):
+    """
+    Return the path as bytes, for passing to C functions.
+    """
+
+    if isinstance(path, bytes):
+        return path
+    return path.encode(sys.getfilesystemencoding())
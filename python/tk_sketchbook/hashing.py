@@ -0,0 +1,128 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import hashlib
+import mmap
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+
+# Files are hashed as a list of fixed size segments. The digest of the file is
+# the digest of its segment digests, which allows the segments of large files
+# to be hashed in parallel. hashlib releases the GIL while hashing large
+# buffers, so the segments are hashed concurrently by a small thread pool.
+SEGMENT_SIZE = 16 * 1024 * 1024
+HASH_THREADS = 4
+
+# Digests of files already hashed in this session, keyed by the file path and
+# its stat signature, so that a file is only read again once it has changed.
+_digest_cache = {}
+_digest_cache_lock = threading.Lock()
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+
+def file_signature(path):
+    """
+    Return a cheap signature of the file that changes whenever the file is
+    written to.
+
+    :param str path: The file path.
+
+    :returns: A (size, mtime in nanoseconds) tuple.
+    """
+
+    return stat_signature(os.stat(path))
+
+
+def stat_signature(stat):
+    """
+    Return the signature of a file from its stat result, see
+    :func:`file_signature`.
+
+    :param stat: The ``os.stat`` result of the file, or of a directory entry.
+
+    :returns: A (size, mtime in nanoseconds) tuple.
+    """
+
+    mtime_ns = getattr(stat, "st_mtime_ns", None)
+    if mtime_ns is None:
+        mtime_ns = int(stat.st_mtime * 1e9)
+    return (stat.st_size, mtime_ns)
+
+
+def hash_file(path):
+    """
+    Return the content hash of the given file.
+
+    The file is memory mapped and its segments are hashed in parallel. The
+    result is cached for the session until the file's size or modification
+    time changes.
+
+    :param str path: The file path.
+
+    :returns: The hex digest of the file's content.
+    """
+
+    signature = file_signature(path)
+    with _digest_cache_lock:
+        cached = _digest_cache.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    size = signature[0]
+    offsets = list(range(0, size, SEGMENT_SIZE))
+
+    with open(path, "rb") as file_handle:
+        if size == 0:
+            segment_digests = []
+        else:
+            file_map = mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                view = memoryview(file_map)
+                try:
+
+                    def hash_segment(offset):
+                        return hashlib.sha1(
+                            view[offset : offset + SEGMENT_SIZE]
+                        ).digest()
+
+                    if len(offsets) == 1:
+                        segment_digests = [hash_segment(0)]
+                    else:
+                        segment_digests = _get_hash_pool().map(hash_segment, offsets)
+                finally:
+                    view.release()
+            finally:
+                file_map.close()
+
+    sha = hashlib.sha1(str(size).encode("ascii"))
+    for segment_digest in segment_digests:
+        sha.update(segment_digest)
+    digest = sha.hexdigest()
+
+    with _digest_cache_lock:
+        _digest_cache[path] = (signature, digest)
+
+    return digest
+
+
+def _get_hash_pool():
+    """
+    Return the thread pool used to hash file segments, creating it on first
+    use.
+    """
+
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ThreadPool(HASH_THREADS)
+    return _hash_pool
@@ -0,0 +1,127 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+Image helpers shared by the review proxy and thumbnail generation. These only
+use the Qt image classes, which are reentrant, so they are safe to call from
+worker threads.
+"""
+
+
+def read_image_size(path):
+    """
+    Read the image dimensions from the file header, without decoding pixels.
+
+    :param str path: The image file path.
+
+    :returns: A (width, height) tuple, or None if the header cannot be read.
+    """
+
+    from sgtk.platform.qt import QtGui
+
+    size = QtGui.QImageReader(path).size()
+    if not size.isValid():
+        return None
+    return (size.width(), size.height())
+
+
+def read_scaled_image(path, max_size):
+    """
+    Decode an image so that it fits within max_size x max_size pixels.
+
+    The image is decoded at a reduced size when the image plugin supports it
+    (e.g. JPEG DCT scaling), otherwise it is decoded at full size and
+    downsampled with smooth (area averaging) filtering.
+
+    :param str path: The image file path.
+    :param int max_size: The maximum width or height of the image.
+
+    :returns: The decoded :class:`QtGui.QImage`.
+    :raises RuntimeError: If the image cannot be decoded.
+    """
+
+    from sgtk.platform.qt import QtCore, QtGui
+
+    reader = QtGui.QImageReader(path)
+    source_size = reader.size()
+    if not source_size.isValid():
+        raise RuntimeError(
+            "Unable to read image header of '%s': %s" % (path, reader.errorString())
+        )
+
+    target_size = QtCore.QSize(source_size)
+    if max(source_size.width(), source_size.height()) > max_size:
+        target_size.scale(max_size, max_size, QtCore.Qt.KeepAspectRatio)
+
+    if target_size != source_size and reader.supportsOption(
+        QtGui.QImageIOHandler.ScaledSize
+    ):
+        reader.setScaledSize(target_size)
+
+    image = reader.read()
+    if image.isNull():
+        raise RuntimeError(
+            "Unable to decode image '%s': %s" % (path, reader.errorString())
+        )
+
+    if image.size() != target_size:
+        image = image.scaled(
+            target_size, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation
+        )
+
+    return image
+
+
+def flatten_image(image):
+    """
+    Composite an image with an alpha channel onto white, like the SketchBook
+    canvas, for formats that have no alpha channel (e.g. JPEG).
+
+    :param image: The :class:`QtGui.QImage` to flatten.
+
+    :returns: The flattened :class:`QtGui.QImage`.
+    """
+
+    from sgtk.platform.qt import QtCore, QtGui
+
+    if not image.hasAlphaChannel():
+        return image
+
+    flattened = QtGui.QImage(image.size(), QtGui.QImage.Format_RGB32)
+    flattened.fill(QtCore.Qt.white)
+    painter = QtGui.QPainter(flattened)
+    painter.drawImage(0, 0, image)
+    painter.end()
+    return flattened
+
+
+def write_image(image, path, quality=90):
+    """
+    Write the image to the given path. The format is taken from the path's
+    extension and images are flattened for formats without an alpha channel.
+
+    :param image: The :class:`QtGui.QImage` to write.
+    :param str path: The destination path.
+    :param int quality: The compression quality for lossy formats.
+
+    :raises RuntimeError: If the image cannot be written.
+    """
+
+    from sgtk.platform.qt import QtGui
+
+    if path.lower().endswith((".jpg", ".jpeg")):
+        image = flatten_image(image)
+
+    writer = QtGui.QImageWriter(path)
+    writer.setQuality(quality)
+    if not writer.write(image):
+        raise RuntimeError(
+            "Unable to write image '%s': %s" % (path, writer.errorString())
+        )
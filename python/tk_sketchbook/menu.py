@@ -14,6 +14,9 @@ from sgtk.platform.qt import QtGui
 from sgtk.platform.qt import QtCore
 from sgtk.util import is_windows, is_macos, is_linux
 
+from . import metrics
+from . import tracing
+
 
 class SketchBookMenu(object):
     """
@@ -23,6 +26,8 @@ class SketchBookMenu(object):
     ABOUT_MENU_TEXT = "About Shotgun Pipeline Toolkit"
     JUMP_TO_SG_TEXT = "Jump to Shotgun"
     JUMP_TO_FS_TEXT = "Jump to File System"
+    PROFILE_NEXT_TEXT = "Profile Next Command"
+    CANCEL_PROFILE_TEXT = "Cancel Profiling Next Command"
     SEPARATOR_ITEM = "_SEPARATOR_"
 
     def __init__(self, engine):
@@ -67,6 +72,12 @@ class SketchBookMenu(object):
                 if data.get("properties").get("type") == "context_menu"
             ]
         )
+
+        profiler = self._engine.command_profiler
+        if profiler is not None and profiler.armed:
+            names.extend([self.SEPARATOR_ITEM, self.CANCEL_PROFILE_TEXT])
+        elif profiler is not None:
+            names.extend([self.SEPARATOR_ITEM, self.PROFILE_NEXT_TEXT])
         return [self.context_name, names]
 
     def create_apps_entries(self):
@@ -88,6 +99,31 @@ class SketchBookMenu(object):
         return favourites
 
     def do_command(self, command_name):
+        profiler = self._engine.command_profiler
+        if command_name in (self.PROFILE_NEXT_TEXT, self.CANCEL_PROFILE_TEXT):
+            profiler.armed = command_name == self.PROFILE_NEXT_TEXT
+            if profiler.armed:
+                self.logger.info("The next Shotgun menu command will be profiled.")
+            self._engine.refresh_menu()
+            return
+
+        timer = metrics.timer(
+            "sketchbook_command_duration_seconds", command=command_name
+        )
+        with tracing.span("menu.do_command", command=command_name), timer:
+            if profiler is None or not profiler.armed:
+                self._do_command(command_name)
+                return
+
+            try:
+                profiler.run(command_name, self._do_command, command_name)
+            finally:
+                # the profile of a command that failed is the most useful one
+                self._engine.refresh_menu()
+                if profiler.paths:
+                    self.show_profile(command_name, profiler.paths)
+
+    def _do_command(self, command_name):
         if not self.already_running(command_name):
             self.logger.debug("Running command %s.", command_name)
 
@@ -144,19 +180,40 @@ class SketchBookMenu(object):
         paths = self._engine.context.filesystem_locations
 
         for disk_location in paths:
-            # run the app
-            if is_linux():
-                cmd = 'xdg-open "%s"' % disk_location
-            elif is_macos():
-                cmd = 'open "%s"' % disk_location
-            elif is_windows():
-                cmd = 'cmd.exe /C start "Folder" "%s"' % disk_location
-            else:
-                raise Exception("Platform is not supported.")
-
-            self._engine.logger.debug("Jump to filesystem command: {}".format(cmd))
-
-            exit_code = os.system(cmd)
-
-            if exit_code != 0:
-                self.logger.error("Failed to launch '%s'!", cmd)
+            self.open_folder(disk_location)
+
+    def open_folder(self, disk_location):
+        """
+        Open a folder in the file browser.
+        """
+        # run the app
+        if is_linux():
+            cmd = 'xdg-open "%s"' % disk_location
+        elif is_macos():
+            cmd = 'open "%s"' % disk_location
+        elif is_windows():
+            cmd = 'cmd.exe /C start "Folder" "%s"' % disk_location
+        else:
+            raise Exception("Platform is not supported.")
+
+        self._engine.logger.debug("Jump to filesystem command: {}".format(cmd))
+
+        exit_code = os.system(cmd)
+
+        if exit_code != 0:
+            self.logger.error("Failed to launch '%s'!", cmd)
+
+    def show_profile(self, command_name, paths):
+        """
+        Tell the user where the profile of a command was written, offering to
+        reveal it in the file browser.
+        """
+        answer = QtGui.QMessageBox.question(
+            QtGui.QApplication.activeWindow(),
+            "Command Profile",
+            "The profile of '{}' was written to:\n\n{}\n\n"
+            "Show it in the file browser?".format(command_name, "\n".join(paths)),
+            QtGui.QMessageBox.Yes | QtGui.QMessageBox.No,
+        )
+        if answer == QtGui.QMessageBox.Yes:
+            self.open_folder(os.path.dirname(paths[0]))
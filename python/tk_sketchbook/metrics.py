@@ -0,0 +1,441 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+Performance metrics of the engine and its hooks, exported in the OpenMetrics
+text format to a file, e.g. read by the node exporter's textfile collector,
+or to a local HTTP endpoint.
+
+Metrics are disabled until :func:`enable` is called. While disabled,
+:func:`observe` and :func:`inc` return immediately and :func:`timer` returns
+a shared context manager that does nothing.
+"""
+
+import functools
+import os
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    # python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+import sgtk
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+SECONDS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_PER_SECOND_BUCKETS = (1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8, 5e8, 1e9)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    "sketchbook_command_duration_seconds": (
+        "histogram",
+        "Time to run a Shotgun menu command.",
+        SECONDS_BUCKETS,
+    ),
+    "sketchbook_refresh_context_duration_seconds": (
+        "histogram",
+        "Time to refresh the context from the current document.",
+        SECONDS_BUCKETS,
+    ),
+    "sketchbook_dialog_show_duration_seconds": (
+        "histogram",
+        "Time to create and show a Toolkit dialog.",
+        SECONDS_BUCKETS,
+    ),
+    "sketchbook_publish_phase_duration_seconds": (
+        "histogram",
+        "Time spent in a publish plugin phase.",
+        SECONDS_BUCKETS,
+    ),
+    "sketchbook_upload_bytes_per_second": (
+        "histogram",
+        "Throughput of the review uploads.",
+        BYTES_PER_SECOND_BUCKETS,
+    ),
+    "sketchbook_host_api_calls": (
+        "counter",
+        "Calls to the SketchBook API.",
+        None,
+    ),
+}
+
+_registry = None
+
+# (module, attribute, function) of the functions replaced by count_calls
+_originals = []
+
+
+def enable():
+    """
+    Start recording the metrics.
+
+    :returns: The :class:`MetricsRegistry` the metrics are recorded in.
+    """
+
+    global _registry
+    if _registry is None:
+        _registry = MetricsRegistry(METRICS)
+    return _registry
+
+
+def disable():
+    """
+    Stop recording the metrics, restoring the functions whose calls were
+    counted.
+    """
+
+    global _registry
+    _registry = None
+
+    while _originals:
+        module, attribute, func = _originals.pop()
+        setattr(module, attribute, func)
+
+
+def observe(name, value, **labels):
+    """
+    Record a value in a histogram.
+
+    :param str name: The histogram name, one of :data:`METRICS`.
+    :param float value: The value.
+    :param labels: The label values of the series, e.g. command="Publish...".
+    """
+
+    if _registry is not None:
+        _registry.observe(name, value, labels)
+
+
+def inc(name, amount=1, **labels):
+    """
+    Increment a counter.
+
+    :param str name: The counter name, one of :data:`METRICS`.
+    :param amount: The increment.
+    :param labels: The label values of the series.
+    """
+
+    if _registry is not None:
+        _registry.inc(name, amount, labels)
+
+
+def timer(name, **labels):
+    """
+    Return a context manager recording the seconds spent in its block in a
+    histogram.
+
+    :param str name: The histogram name, one of :data:`METRICS`.
+    :param labels: The label values of the series.
+    """
+
+    if _registry is None:
+        return _NO_TIMER
+    return _Timer(_registry, name, labels)
+
+
+def count_calls(module, name):
+    """
+    Replace the functions of a module with wrappers counting their calls in a
+    counter, labelled with the function name, until :func:`disable` is called.
+
+    :param module: The module, e.g. the SketchBook API.
+    :param str name: The counter name, one of :data:`METRICS`.
+    """
+
+    for attribute, func in list(vars(module).items()):
+        if attribute.startswith("_") or not callable(func):
+            continue
+        if getattr(func, "_counted_calls", False) or isinstance(func, type):
+            continue
+        _originals.append((module, attribute, func))
+        setattr(module, attribute, _counting(func, name, attribute))
+
+
+def _counting(func, name, function_name):
+    """
+    Return a wrapper of the function counting its calls.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _registry is not None:
+            _registry.inc(name, 1, {"function": function_name})
+        return func(*args, **kwargs)
+
+    wrapper._counted_calls = True
+    return wrapper
+
+
+class _NoTimer(object):
+    """
+    Context manager doing nothing, returned while metrics are disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+class _Timer(object):
+    """
+    Context manager recording the seconds spent in its block.
+    """
+
+    def __init__(self, registry, name, labels):
+        self._registry = registry
+        self._name = name
+        self._labels = labels
+        self._start_time = None
+
+    def __enter__(self):
+        self._start_time = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._registry.observe(self._name, time.time() - self._start_time, self._labels)
+        return False
+
+
+class MetricsRegistry(object):
+    """
+    Histograms and counters, by label values, rendered in the OpenMetrics
+    text format.
+    """
+
+    def __init__(self, definitions):
+        """
+        :param dict definitions: The metrics, see :data:`METRICS`.
+        """
+
+        self._definitions = definitions
+        self._lock = threading.Lock()
+        # name -> label items -> histogram [bucket counts, count, sum] or
+        # counter value
+        self._series = dict((name, {}) for name in definitions)
+
+    def observe(self, name, value, labels):
+        """
+        Record a value in a histogram.
+        """
+
+        buckets = self._definitions[name][2]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series[name].get(key)
+            if series is None:
+                series = self._series[name][key] = [[0] * len(buckets), 0, 0.0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def inc(self, name, amount, labels):
+        """
+        Increment a counter.
+        """
+
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counters = self._series[name]
+            counters[key] = counters.get(key, 0) + amount
+
+    def render(self):
+        """
+        Return the metrics in the OpenMetrics text format.
+        """
+
+        lines = []
+        with self._lock:
+            for name in sorted(self._definitions):
+                metric_type, help_text, buckets = self._definitions[name]
+                lines.append("# TYPE %s %s" % (name, metric_type))
+                lines.append("# HELP %s %s" % (name, help_text))
+
+                for key, series in sorted(self._series[name].items()):
+                    if metric_type == "counter":
+                        lines.append(
+                            "%s_total%s %s"
+                            % (name, _format_labels(key), _format_value(series))
+                        )
+                        continue
+
+                    bucket_counts, count, total = series
+                    for bound, bucket_count in zip(buckets, bucket_counts):
+                        lines.append(
+                            "%s_bucket%s %d"
+                            % (
+                                name,
+                                _format_labels(key + (("le", repr(float(bound))),)),
+                                bucket_count,
+                            )
+                        )
+                    lines.append(
+                        "%s_bucket%s %d"
+                        % (name, _format_labels(key + (("le", "+Inf"),)), count)
+                    )
+                    lines.append("%s_count%s %d" % (name, _format_labels(key), count))
+                    lines.append(
+                        "%s_sum%s %s"
+                        % (name, _format_labels(key), _format_value(total))
+                    )
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(key):
+    """
+    Return the label set of a series, e.g. '{command="Publish..."}'.
+    """
+
+    if not key:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"'
+        % (
+            label,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for label, value in key
+    )
+
+
+def _format_value(value):
+    """
+    Return a sample value, as an integer if it's one.
+    """
+
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return "%d" % (value,)
+
+
+class MetricsExporter(object):
+    """
+    Exports a :class:`MetricsRegistry` from background threads, so the UI
+    thread only pays for recording the metrics.
+
+    The metrics are written to a file periodically, replacing it atomically
+    so it's never read half written, and/or served over HTTP on the loopback
+    interface, at any path, e.g. http://localhost:9464/metrics.
+    """
+
+    CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+    def __init__(self, registry, path=None, port=None, interval=15):
+        """
+        :param registry: The :class:`MetricsRegistry` to export.
+        :param str path: The file to write the metrics to, or None.
+        :param int port: The local port to serve the metrics on, or None.
+        :param float interval: The seconds between writes of the file.
+        """
+
+        self._registry = registry
+        self._path = path
+        self._port = port
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+        self._server = None
+
+    def start(self):
+        """
+        Start writing and serving the metrics.
+
+        :raises socket.error: If the port can't be listened on.
+        """
+
+        self._stopped.clear()
+
+        if self._port:
+            registry = self._registry
+            content_type = self.CONTENT_TYPE
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = registry.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    logger.debug("Metrics request: " + format, *args)
+
+            self._server = HTTPServer(("127.0.0.1", self._port), Handler)
+            server_thread = threading.Thread(
+                target=self._server.serve_forever, name="SketchBookMetricsServer"
+            )
+            server_thread.daemon = True
+            server_thread.start()
+
+        if self._path:
+            self._thread = threading.Thread(
+                target=self._run, name="SketchBookMetricsWriter"
+            )
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop serving the metrics and write them a last time.
+        """
+
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        """
+        Write the metrics until stopped, and once more when stopped.
+        """
+
+        while True:
+            try:
+                self._write()
+            except (IOError, OSError) as e:
+                logger.debug("Unable to write the metrics to %s: %s", self._path, e)
+            if self._stopped.is_set():
+                return
+            self._stopped.wait(self._interval)
+
+    def _write(self):
+        """
+        Write the metrics to the file.
+        """
+
+        sgtk.util.filesystem.ensure_folder_exists(os.path.dirname(self._path))
+        temp_path = "%s.%s.tmp" % (self._path, os.getpid())
+        with open(temp_path, "w") as metrics_file:
+            metrics_file.write(self._registry.render())
+
+        if hasattr(os, "replace"):
+            os.replace(temp_path, self._path)
+        else:
+            # python 2
+            if os.path.exists(self._path):
+                os.remove(self._path)
+            os.rename(temp_path, self._path)
@@ -0,0 +1,94 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+Concurrent read ahead of files about to be loaded by SketchBook, so that
+loading a batch of files from network storage doesn't wait on one cold read
+after the other.
+"""
+
+import os
+import time
+from multiprocessing.pool import ThreadPool
+
+# Number of files read at the same time.
+PREFETCH_THREADS = 4
+
+# Size of the reads used to pull a file into the OS cache.
+READ_SIZE = 4 * 1024 * 1024
+
+
+def prefetch_file(path):
+    """
+    Read the file into the operating system's cache, so that the next read of
+    the file is served from memory.
+
+    :param str path: The file path.
+
+    :returns: The number of bytes read.
+    """
+
+    size = 0
+    buffer = bytearray(READ_SIZE)
+    with open(path, "rb") as data_file:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(data_file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        while True:
+            count = data_file.readinto(buffer)
+            if not count:
+                break
+            size += count
+
+    return size
+
+
+def iter_prefetched(items, resolve=None, threads=PREFETCH_THREADS):
+    """
+    Read the files ahead in a thread pool and yield them in order, each as soon
+    as it and the files before it are ready.
+
+    :param items: The paths of the files to read, or items to resolve to them.
+    :param resolve: Optional function called in the thread pool with each
+        item, returning the path to read it from, e.g.
+        :meth:`SketchBookEngine.stage_publish`, or None if there's no file to
+        read for the item.
+    :param int threads: The maximum number of files read at the same time.
+
+    :returns: A generator of (item, read path, seconds, error) tuples. The
+        error is the exception raised reading the file, else None.
+    """
+
+    def read(item, read_ahead=True):
+        start_time = time.time()
+        read_path = item
+        try:
+            if resolve:
+                read_path = resolve(item)
+            if read_ahead and read_path is not None:
+                prefetch_file(read_path)
+        except Exception as e:
+            return (item, read_path, time.time() - start_time, e)
+        return (item, read_path, time.time() - start_time, None)
+
+    items = list(items)
+    if len(items) < 2:
+        # there's no other file to read while this one is loaded
+        for item in items:
+            yield read(item, read_ahead=False)
+        return
+
+    pool = ThreadPool(min(threads, len(items)))
+    try:
+        for result in pool.imap(read, items):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
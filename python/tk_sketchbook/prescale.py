@@ -0,0 +1,132 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import os
+import threading
+
+import sgtk
+
+from .hashing import hash_file
+from .image_utils import read_image_size, read_scaled_image, write_image
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+
+class PrescaleCache(object):
+    """
+    Downscaled copies of images too large for the canvas they are imported
+    to, so SketchBook doesn't decode and hold the full resolution image.
+
+    Copies are cached on disk by the content hash of the image and the size
+    they were scaled to. The least recently used copies are evicted once the
+    cache grows beyond its size limit.
+    """
+
+    # Extensions of the formats the copies can be written in, others are
+    # written as PNG.
+    WRITABLE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp")
+
+    def __init__(self, cache_dir, max_bytes):
+        """
+        :param str cache_dir: The directory to store the copies in.
+        :param int max_bytes: The maximum total size of the copies.
+        """
+
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def get_scaled(self, path, max_size):
+        """
+        Return the path of the image scaled to fit within max_size x max_size
+        pixels, or the image path if it already fits.
+
+        The image header is read first, so images that fit are not decoded.
+        Decoding uses the Qt image classes, which are safe to use from worker
+        threads.
+
+        :param str path: The image path.
+        :param int max_size: The maximum width or height of the image.
+
+        :returns: The path of the image to import.
+        :raises RuntimeError: If the image cannot be decoded or written.
+        """
+
+        size = read_image_size(path)
+        if size is None or max(size) <= max_size:
+            return path
+
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in self.WRITABLE_EXTENSIONS:
+            extension = ".png"
+        scaled_path = os.path.join(
+            self._cache_dir, "%s-%d%s" % (hash_file(path), max_size, extension)
+        )
+
+        if os.path.exists(scaled_path):
+            logger.debug("Prescaled image cache hit for %s", path)
+            # mark the copy as most recently used
+            os.utime(scaled_path, None)
+            return scaled_path
+
+        logger.debug(
+            "Scaling %s from %dx%d to fit %dpx", path, size[0], size[1], max_size
+        )
+        image = read_scaled_image(path, max_size)
+
+        sgtk.util.filesystem.ensure_folder_exists(self._cache_dir)
+
+        # write to a temporary file first so that a partially written copy is
+        # never picked up by another thread or process
+        temp_path = "%s.%s.%s.tmp%s" % (
+            scaled_path,
+            os.getpid(),
+            threading.current_thread().ident,
+            extension,
+        )
+        write_image(image, temp_path, quality=95)
+        if os.path.exists(scaled_path):
+            os.remove(scaled_path)
+        os.rename(temp_path, scaled_path)
+
+        self._evict()
+
+        return scaled_path
+
+    def _evict(self):
+        """
+        Remove the least recently used copies until the cache fits within its
+        size limit. The copies being written are skipped.
+        """
+
+        with self._lock:
+            entries = []
+            total_bytes = 0
+            for file_name in os.listdir(self._cache_dir):
+                if ".tmp" in file_name:
+                    continue
+                file_path = os.path.join(self._cache_dir, file_name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, file_path))
+                total_bytes += stat.st_size
+
+            entries.sort()
+            for _, size, file_path in entries:
+                if total_bytes <= self._max_bytes:
+                    break
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    continue
+                total_bytes -= size
+                logger.debug("Evicted prescaled image %s", file_path)
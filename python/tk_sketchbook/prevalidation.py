@@ -0,0 +1,225 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+Publish validation checks computed in the background each time the document is
+saved, so that the publish plugins can validate without touching the file
+system.
+"""
+
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+
+import sgtk
+
+from .hashing import file_signature, hash_file
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+
+class ValidationCache(object):
+    """
+    Runs the registered checks on a saved document in a background thread
+    and caches their results by document path and modification time, so a
+    result is only ever returned for the document as it was checked.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._checks = []
+        # path -> (signature, {check name: result})
+        self._results = {}
+        # path -> (signature, AsyncResult) of the checks in progress
+        self._pending = {}
+
+    def register(self, name, check):
+        """
+        Register a check to run on saved documents.
+
+        :param str name: The name the result is looked up by.
+        :param check: Function taking the document path and returning the
+            check result. It is called from a background thread and must not
+            use Qt widgets.
+        """
+
+        self._checks.append((name, check))
+
+    def schedule(self, path):
+        """
+        Run the checks on the given document in the background, unless they
+        already ran or are running for its current version.
+
+        :param str path: The path of the saved document.
+        """
+
+        if not path or not self._checks or not os.path.isfile(path):
+            return
+
+        signature = file_signature(path)
+        with self._lock:
+            if self._results.get(path, (None,))[0] == signature:
+                return
+            if self._pending.get(path, (None,))[0] == signature:
+                return
+
+            if self._pool is None:
+                self._pool = ThreadPool(1)
+            self._pending[path] = (
+                signature,
+                self._pool.apply_async(self._run_checks, (path, signature)),
+            )
+
+    def lookup(self, name, path, timeout=1.0):
+        """
+        Look up the result of a check on the current version of a document.
+
+        :param str name: The check name.
+        :param str path: The document path.
+        :param float timeout: How long to wait, in seconds, for the checks if
+            they are still running on the current version of the document.
+
+        :returns: A (found, result) tuple. If found is False, the check must
+            be computed by the caller.
+        """
+
+        if not path or not os.path.isfile(path):
+            return (False, None)
+
+        signature = file_signature(path)
+        with self._lock:
+            pending = self._pending.get(path)
+        if pending and pending[0] == signature:
+            try:
+                pending[1].wait(timeout)
+            except Exception:
+                pass
+
+        with self._lock:
+            checked_signature, results = self._results.get(path, (None, {}))
+        if checked_signature != signature or name not in results:
+            return (False, None)
+        return (True, results[name])
+
+    def _run_checks(self, path, signature):
+        """
+        Run the registered checks and store their results.
+        """
+
+        results = {}
+        for name, check in self._checks:
+            try:
+                results[name] = check(path)
+            except Exception:
+                # the publish plugin will run the check itself
+                logger.debug("Pre-validation check %s failed", name, exc_info=True)
+
+        with self._lock:
+            self._results[path] = (signature, results)
+            if self._pending.get(path, (None,))[0] == signature:
+                del self._pending[path]
+
+
+def register_publish_checks(cache, engine):
+    """
+    Register the checks of the SketchBook publish plugins, see the
+    publish_session.py and start_version_control.py publish hooks.
+
+    The checks use the publisher's configuration, so they only run when the
+    publisher is configured in the engine's environment.
+
+    :param cache: The :class:`ValidationCache` to register the checks with.
+    :param engine: The SketchBook engine.
+    """
+
+    def get_publisher():
+        for app in engine.apps.values():
+            if app.name == "tk-multi-publish2":
+                return app
+        raise RuntimeError("The publisher is not configured.")
+
+    def get_work_template(publisher):
+        collector_settings = publisher.get_setting("collector_settings") or {}
+        template_name = collector_settings.get("Work Template")
+        return engine.get_template_by_name(template_name) if template_name else None
+
+    def check_work_template(path):
+        work_template = get_work_template(get_publisher())
+        return {
+            "template": work_template.name if work_template else None,
+            "matches": bool(work_template and work_template.validate(path)),
+        }
+
+    def check_next_version(path):
+        publisher = get_publisher()
+        work_template = get_work_template(publisher)
+
+        next_version_path, version = _get_next_version_info(
+            publisher, work_template, path
+        )
+        exists = bool(next_version_path and os.path.exists(next_version_path))
+        if exists:
+            while os.path.exists(next_version_path):
+                next_version_path, version = _get_next_version_info(
+                    publisher, work_template, next_version_path
+                )
+
+        return {
+            "template": work_template.name if work_template else None,
+            "exists": exists,
+            "path": next_version_path,
+            "version": version,
+        }
+
+    def check_version_control(path):
+        version_path = get_publisher().util.get_version_path(path, "v001")
+        return {"path": version_path, "exists": os.path.exists(version_path)}
+
+    # looked up by the publish plugins to tell whether the document has
+    # already been published, see the engine's get_content_hash method
+    cache.register("content_hash", hash_file)
+    cache.register("work_template", check_work_template)
+    cache.register("next_version", check_next_version)
+    cache.register("version_control", check_version_control)
+
+
+def _get_next_version_info(publisher, work_template, path):
+    """
+    Return the path and number of the version after the given file, the same
+    way the base file publish plugin's ``_get_next_version_info`` does.
+
+    The plugin's method can't be used here: the plugin only exists while the
+    publisher is open and needs a publish item, while the checks run after
+    every save. Its logic is kept in step with this function, and a result
+    that doesn't match the plugin's work template is ignored by the plugin,
+    see the publish_session.py hook.
+
+    This runs in the validation thread. It only computes paths: templates are
+    immutable once loaded, and the publisher util calls the publisher's
+    path_info hook, whose default implementation only parses the path. Core
+    resolves a hook's base class per thread, so executing the hook from this
+    thread is safe. A custom path_info hook must not use Qt. If the hook
+    raises, the check is skipped and the plugin computes it on the UI thread.
+
+    :returns: A (next version path, version number) tuple.
+    """
+
+    work_fields = None
+    if work_template and work_template.validate(path):
+        work_fields = work_template.get_fields(path)
+
+    if work_fields and "version" in work_fields:
+        work_fields["version"] += 1
+        return (work_template.apply_fields(work_fields), work_fields["version"])
+
+    next_version_path = publisher.util.get_next_version_path(path)
+    version = publisher.util.get_version_number(path)
+    return (next_version_path, version + 1 if version is not None else None)
@@ -0,0 +1,190 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import json
+import os
+import sqlite3
+import time
+
+import sgtk
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+
+class PublishIndex(object):
+    """
+    Local SQLite index mapping the content hash of published documents to the
+    PublishedFile and Version entities they were published as. This lets the
+    publish plugins detect that a document hasn't changed since it was last
+    published without querying Shotgun.
+
+    The index also holds the sidecar metadata of published documents, see
+    :mod:`sidecar`, so that the loader can describe them without reading
+    anything from the publish location.
+    """
+
+    def __init__(self, db_path):
+        """
+        :param str db_path: The path of the SQLite database file.
+        """
+
+        self._db_path = db_path
+        sgtk.util.filesystem.ensure_folder_exists(os.path.dirname(db_path))
+
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS content ("
+                    "hash TEXT PRIMARY KEY, "
+                    "path TEXT, "
+                    "published_file_id INTEGER, "
+                    "version_id INTEGER, "
+                    "updated REAL)"
+                )
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS metadata ("
+                    "published_file_id INTEGER PRIMARY KEY, "
+                    "path TEXT, "
+                    "data TEXT, "
+                    "updated REAL)"
+                )
+        finally:
+            connection.close()
+
+    def find(self, content_hash):
+        """
+        Look up the entities previously published for the given content.
+
+        :param str content_hash: The content hash, see :func:`hashing.hash_file`.
+
+        :returns: A dictionary with the keys ``path``, ``published_file`` and
+            ``version``, where the entities are Shotgun entity dictionaries or
+            None, or None if the content has never been published.
+        """
+
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT path, published_file_id, version_id FROM content "
+                "WHERE hash = ?",
+                (content_hash,),
+            ).fetchone()
+        finally:
+            connection.close()
+
+        if row is None:
+            return None
+
+        path, published_file_id, version_id = row
+        return {
+            "path": path,
+            "published_file": _entity("PublishedFile", published_file_id),
+            "version": _entity("Version", version_id),
+        }
+
+    def record(self, content_hash, path, published_file=None, version=None):
+        """
+        Record the entities the given content was published as. Entities that
+        are not supplied keep their previously recorded value.
+
+        :param str content_hash: The content hash, see :func:`hashing.hash_file`.
+        :param str path: The path of the published document.
+        :param dict published_file: The PublishedFile entity, if any.
+        :param dict version: The Version entity, if any.
+        """
+
+        published_file_id = published_file["id"] if published_file else None
+        version_id = version["id"] if version else None
+
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR IGNORE INTO content (hash) VALUES (?)",
+                    (content_hash,),
+                )
+                connection.execute(
+                    "UPDATE content SET path = ?, "
+                    "published_file_id = COALESCE(?, published_file_id), "
+                    "version_id = COALESCE(?, version_id), "
+                    "updated = ? WHERE hash = ?",
+                    (path, published_file_id, version_id, time.time(), content_hash),
+                )
+        finally:
+            connection.close()
+
+        logger.debug(
+            "Recorded publish of %s (%s): %s, %s",
+            path,
+            content_hash,
+            published_file,
+            version,
+        )
+
+    def find_metadata(self, published_file_id):
+        """
+        Look up the metadata recorded for a published document.
+
+        :param int published_file_id: The id of the PublishedFile entity.
+
+        :returns: The metadata dictionary, or None if none was recorded.
+        """
+
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT data FROM metadata WHERE published_file_id = ?",
+                (published_file_id,),
+            ).fetchone()
+        finally:
+            connection.close()
+
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def record_metadata(self, published_file_id, path, metadata):
+        """
+        Record the metadata of a published document.
+
+        :param int published_file_id: The id of the PublishedFile entity.
+        :param str path: The path of the published document.
+        :param dict metadata: The metadata, see :func:`sidecar.read_metadata`.
+        """
+
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO metadata "
+                    "(published_file_id, path, data, updated) VALUES (?, ?, ?, ?)",
+                    (published_file_id, path, json.dumps(metadata), time.time()),
+                )
+        finally:
+            connection.close()
+
+    def _connect(self):
+        """
+        Open a new connection to the index. A connection is opened for each
+        operation since SQLite connections cannot be shared between threads.
+        """
+
+        return sqlite3.connect(self._db_path, timeout=10)
+
+
+def _entity(entity_type, entity_id):
+    """
+    Return a Shotgun entity dictionary, or None if there is no id.
+    """
+
+    if entity_id is None:
+        return None
+    return {"type": entity_type, "id": entity_id}
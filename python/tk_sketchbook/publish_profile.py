@@ -0,0 +1,332 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import types
+
+import sgtk
+
+from . import metrics
+from . import tracing
+
+PHASES = ("accept", "validate", "publish", "finalize")
+
+# The counted operations, see PublishProfile.measure.
+COUNTERS = ("api_calls", "stat_calls", "round_trips")
+
+_counts = dict((counter, 0) for counter in COUNTERS)
+_counts_lock = threading.Lock()
+
+# Number of measurements in progress, the counters are installed while it's
+# above zero, and the original functions they replaced.
+_active_count = 0
+_originals = []
+
+
+def profiled(method):
+    """
+    Decorator measuring a publish plugin phase in the item's publish profile,
+    see :class:`PublishProfile`. Once the plugin is finalized, its
+    measurements are logged and appended to the publish profile log. The
+    phase is also traced when the session is, see :mod:`tracing`.
+
+    The calls are only counted when the engine's publish_profile_call_counts
+    setting is on.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, settings, item):
+        profile = item.properties.get("publish_profile")
+        if profile is None:
+            profile = PublishProfile(
+                count_calls=self.parent.engine.get_setting(
+                    "publish_profile_call_counts", False
+                )
+            )
+            item.properties["publish_profile"] = profile
+
+        plugin = self.__class__.__name__
+        span = tracing.span(
+            "publish2.%s.%s" % (plugin, method.__name__), item=item.name
+        )
+        timer = metrics.timer(
+            "sketchbook_publish_phase_duration_seconds",
+            plugin=plugin,
+            phase=method.__name__,
+        )
+        measurement = profile.measure(plugin, method.__name__, self.parent.shotgun)
+        with span, timer, measurement:
+            result = method(self, settings, item)
+
+        if method.__name__ == "finalize":
+            profile.report(
+                self.logger,
+                plugin,
+                os.path.join(
+                    sgtk.LogManager().log_folder, "tk-sketchbook-publish-profile.jsonl"
+                ),
+            )
+        return result
+
+    return wrapper
+
+
+class PublishProfile(object):
+    """
+    Records where the time of a publish goes, per plugin and phase: the wall
+    time and, when calls are counted, the number of SketchBook API calls,
+    file system stat calls and Shotgun round trips.
+
+    The SketchBook API and stat calls are counted process wide while a phase
+    is measured, so calls made by background threads at the same time are
+    included. The round trips are only counted on the given connection.
+    """
+
+    def __init__(self, count_calls=False):
+        """
+        :param bool count_calls: If true, the calls are counted while a phase
+            is measured. Otherwise only the time is.
+        """
+
+        self._count_calls = count_calls
+        self._lock = threading.Lock()
+        self._records = {}
+
+    @contextlib.contextmanager
+    def measure(self, plugin, phase, connection=None):
+        """
+        Context manager measuring a phase of a plugin. Repeated measurements
+        of the same phase, e.g. when validating again, add up.
+
+        :param str plugin: The plugin name.
+        :param str phase: The phase name, see :data:`PHASES`.
+        :param connection: The Shotgun connection whose round trips are
+            counted, or None.
+        """
+
+        counted_connection = None
+        if self._count_calls:
+            _install_counters()
+            if connection is not None and "_call_rpc" not in vars(connection):
+                # wrap the connection's method, not the class's, so other
+                # connections are left alone
+                counted_connection = connection
+                connection._call_rpc = _count("round_trips", connection._call_rpc)
+
+        start_counts = _snapshot()
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            seconds = time.time() - start_time
+            end_counts = _snapshot()
+            if self._count_calls:
+                _uninstall_counters()
+            if counted_connection is not None:
+                del counted_connection._call_rpc
+
+            with self._lock:
+                record = self._records.get((plugin, phase))
+                if record is None:
+                    record = {"plugin": plugin, "phase": phase, "runs": 0}
+                    record["seconds"] = 0.0
+                    record.update((counter, 0) for counter in COUNTERS)
+                    self._records[(plugin, phase)] = record
+                record["runs"] += 1
+                record["seconds"] += seconds
+                for counter in COUNTERS:
+                    record[counter] += end_counts[counter] - start_counts[counter]
+
+    def records(self, plugin=None):
+        """
+        Return the recorded measurements, in phase order.
+
+        :param str plugin: Only return the measurements of this plugin.
+
+        :returns: A list of dictionaries with the keys ``plugin``, ``phase``,
+            ``runs``, ``seconds`` and one key per counter in :data:`COUNTERS`.
+        """
+
+        def sort_key(record):
+            phase = record["phase"]
+            return (
+                record["plugin"],
+                PHASES.index(phase) if phase in PHASES else len(PHASES),
+                phase,
+            )
+
+        with self._lock:
+            records = [
+                dict(record)
+                for record in self._records.values()
+                if plugin is None or record["plugin"] == plugin
+            ]
+        return sorted(records, key=sort_key)
+
+    def summary(self, plugin=None):
+        """
+        Return a plain text table of the recorded measurements.
+
+        :param str plugin: Only include the measurements of this plugin.
+        """
+
+        lines = [
+            "%-40s %-9s %4s %9s %9s %9s %9s"
+            % ("Plugin", "Phase", "Runs", "Wall", "API", "stat", "Shotgun")
+        ]
+        for record in self.records(plugin):
+            lines.append(
+                "%-40s %-9s %4d %8.3fs %9d %9d %9d"
+                % (
+                    record["plugin"],
+                    record["phase"],
+                    record["runs"],
+                    record["seconds"],
+                    record["api_calls"],
+                    record["stat_calls"],
+                    record["round_trips"],
+                )
+            )
+        return "\n".join(lines)
+
+    def report(self, logger, plugin, json_path):
+        """
+        Log a summary of a plugin's measurements, with the full table in the
+        publish log's more info, and append them to a JSON lines file.
+
+        :param logger: The plugin's logger.
+        :param str plugin: The plugin name.
+        :param str json_path: The JSON lines file to append to, see
+            :meth:`write`.
+        """
+
+        records = self.records(plugin)
+        if not records:
+            return
+
+        message = "%s took %.2fs" % (
+            plugin,
+            sum(record["seconds"] for record in records),
+        )
+        if self._count_calls:
+            message += ", %d Shotgun round trips" % (
+                sum(record["round_trips"] for record in records),
+            )
+
+        logger.info(
+            message + ".",
+            extra={
+                "action_show_more_info": {
+                    "label": "Profile",
+                    "tooltip": "Show where the time of this plugin went",
+                    "text": "<pre>%s</pre>" % (self.summary(plugin),),
+                }
+            },
+        )
+
+        try:
+            self.write(json_path, plugin)
+        except (IOError, OSError) as e:
+            logger.debug("Unable to write the publish profile: %s" % (e,))
+
+    def write(self, path, plugin=None, **extra):
+        """
+        Append the recorded measurements to a JSON lines file, one line per
+        plugin and phase, for aggregation across publishes.
+
+        :param str path: The file to append to.
+        :param str plugin: Only write the measurements of this plugin.
+        :param extra: Additional values written on every line, e.g. the
+            published file path.
+        """
+
+        timestamp = time.time()
+        with open(path, "a") as profile_file:
+            for record in self.records(plugin):
+                record.update(extra)
+                record["time"] = timestamp
+                profile_file.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def _snapshot():
+    """
+    Return a copy of the current counts.
+    """
+
+    with _counts_lock:
+        return dict(_counts)
+
+
+def _count(counter, func):
+    """
+    Return a wrapper of the function that increments the counter when called.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _counts_lock:
+            _counts[counter] += 1
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _install_counters():
+    """
+    Wrap the SketchBook API functions and ``os.stat``, if they aren't already.
+    The Shotgun round trips are counted per connection, see
+    :meth:`PublishProfile.measure`.
+    """
+
+    global _active_count
+    with _counts_lock:
+        _active_count += 1
+        if _active_count > 1:
+            return
+
+    targets = []
+
+    sketchbook_api = sys.modules.get("sketchbook_api")
+    if sketchbook_api is not None:
+        for name in dir(sketchbook_api):
+            if not name.startswith("_") and isinstance(
+                getattr(sketchbook_api, name),
+                (types.FunctionType, types.BuiltinFunctionType),
+            ):
+                targets.append((sketchbook_api, name, "api_calls"))
+
+    targets.append((os, "stat", "stat_calls"))
+
+    for owner, name, counter in targets:
+        original = getattr(owner, name)
+        _originals.append((owner, name, original))
+        setattr(owner, name, _count(counter, original))
+
+
+def _uninstall_counters():
+    """
+    Restore the counted functions once no measurement is in progress.
+    """
+
+    global _active_count
+    with _counts_lock:
+        _active_count -= 1
+        if _active_count > 0:
+            return
+
+    while _originals:
+        owner, name, original = _originals.pop()
+        setattr(owner, name, original)
@@ -0,0 +1,557 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+Space efficient storage of published documents.
+
+Successive publishes of a document usually only differ in a few tiles, so
+instead of a full copy, a publish can be stored as a delta against a full
+base publish of the same document. The delta file holds a small header
+followed by the blocks that are not found in the base::
+
+    MAGIC | header length (4 bytes, big endian) | JSON header | blocks
+
+The header ``blocks`` list has one entry per block of the document: the index
+of the identical block in the base, or -1 if the block is stored in the delta.
+
+A publish can also be stored compressed. The document is split into chunks
+that are compressed with zlib and stored one after the other, the header
+``chunks`` list holding the compressed size of each chunk.
+
+Stored files are only understood by this module, so published files must go
+through :func:`materialize` before being handed to SketchBook. They are not
+TIFF files, and are registered with their own published file type,
+:data:`PUBLISHED_FILE_TYPE`, so that other applications don't mistake them
+for one.
+
+A delta can only be materialized while its base file exists. The publish
+plugin records the base publish as a dependency of the delta publish, so a
+base must not be deleted while publishes depend on it.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import struct
+import threading
+import time
+import zlib
+from multiprocessing.pool import ThreadPool
+
+import sgtk
+
+from .hashing import hash_file
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+MAGIC = b"SKBPUB\x00\x01"
+
+# Published file type of the files stored as deltas or compressed.
+PUBLISHED_FILE_TYPE = "SketchBook Stored Document"
+
+# Size of the blocks compared between a document and its base.
+BLOCK_SIZE = 64 * 1024
+
+# If more than this fraction of a document's blocks differ from its base, the
+# document is stored in full and becomes the new base.
+MAX_DELTA_RATIO = 0.5
+
+# Name of the per folder manifest recording the base of each document.
+MANIFEST_NAME = ".sketchbook_publish_storage.json"
+
+# Size of the chunks compressed independently, and the number of threads
+# compressing them. zlib releases the GIL, so the chunks are compressed in
+# parallel.
+CHUNK_SIZE = 4 * 1024 * 1024
+COMPRESSION_THREADS = 4
+
+_manifest_lock = threading.Lock()
+_compression_pool = None
+_compression_pool_lock = threading.Lock()
+
+
+def is_stored(path):
+    """
+    Return True if the file is stored in one of this module's formats, i.e.
+    it must be materialized before being read.
+
+    :param str path: The file path.
+    """
+
+    with open(path, "rb") as file_handle:
+        return file_handle.read(len(MAGIC)) == MAGIC
+
+
+def read_header(path):
+    """
+    Read the header of a stored file.
+
+    :param str path: The file path.
+
+    :returns: A (header dictionary, payload offset) tuple.
+    """
+
+    with open(path, "rb") as file_handle:
+        if file_handle.read(len(MAGIC)) != MAGIC:
+            raise ValueError("'%s' is not a stored publish file" % (path,))
+        (header_length,) = struct.unpack(">I", file_handle.read(4))
+        header = json.loads(file_handle.read(header_length).decode("utf-8"))
+    return (header, len(MAGIC) + 4 + header_length)
+
+
+def store_delta(source, destination, publish_name):
+    """
+    Store the source document at the destination as a delta against the base
+    of the given publish name, in the destination folder.
+
+    If there is no base yet, the document differs too much from it, or the
+    destination is the base itself, e.g. when a publish is retried, the
+    document is copied in full and becomes the new base.
+
+    :param str source: The document to store.
+    :param str destination: The published file path.
+    :param str publish_name: The name identifying the document across
+        versions, e.g. the publish name without its version number.
+
+    :returns: A dictionary with the keys ``mode`` ("delta" or "base"),
+        ``bytes`` (the number of bytes written), ``source_bytes`` and ``base``
+        (the path of the base file the delta depends on, or None).
+    """
+
+    from .file_copy import copy_file
+
+    folder = os.path.dirname(destination)
+    base = _get_base(folder, publish_name)
+
+    # a delta written over its own base would reference itself
+    if base and os.path.normcase(base["file"]) != os.path.normcase(
+        os.path.basename(destination)
+    ):
+        delta_size = _write_delta(source, destination, base)
+        if delta_size is not None:
+            return {
+                "mode": "delta",
+                "bytes": delta_size,
+                "source_bytes": os.path.getsize(source),
+                "base": os.path.join(folder, base["file"]),
+            }
+
+    copy_file(source, destination)
+    _set_base(folder, publish_name, destination)
+    size = os.path.getsize(destination)
+    return {"mode": "base", "bytes": size, "source_bytes": size, "base": None}
+
+
+def store_compressed(source, destination, level=6):
+    """
+    Store the source document at the destination compressed. The written file
+    is decompressed and checked against the source before returning, so that
+    a publish is never registered with corrupt data.
+
+    :param str source: The document to store.
+    :param str destination: The published file path.
+    :param int level: The zlib compression level, from 1 (fastest) to 9.
+
+    :returns: A dictionary with the keys ``mode`` ("compressed"), ``bytes``
+        (the number of bytes written), ``source_bytes``, ``seconds`` (the time
+        taken to compress) and ``validation_seconds``.
+    :raises ValueError: If the written file doesn't match the source.
+    """
+
+    start_time = time.time()
+    pool = _get_compression_pool()
+
+    compressed_sizes = []
+    digests = []
+    temp_path = "%s.%s.tmp" % (destination, os.getpid())
+    with open(temp_path, "wb") as compressed_file:
+        # reserve room for the header, written once the chunk sizes are known
+        header = _get_compressed_header(source, [0] * _chunk_count(source))
+        compressed_file.write(_pack_header(header))
+        for chunks in _read_chunk_batches(source):
+            for data, digest in pool.map(
+                lambda chunk: (
+                    zlib.compress(chunk, level),
+                    hashlib.sha1(chunk).hexdigest(),
+                ),
+                chunks,
+            ):
+                compressed_file.write(data)
+                compressed_sizes.append(len(data))
+                digests.append(digest)
+
+        header["chunks"] = ["%012d" % (size,) for size in compressed_sizes]
+        compressed_file.seek(0)
+        compressed_file.write(_pack_header(header))
+
+    seconds = time.time() - start_time
+
+    # check the written data before replacing the destination
+    start_time = time.time()
+    written_digests = [
+        hashlib.sha1(chunk).hexdigest() for chunk in _read_compressed(temp_path)
+    ]
+    if written_digests != digests:
+        os.remove(temp_path)
+        raise ValueError(
+            "The compressed copy of '%s' doesn't match the original." % (source,)
+        )
+
+    if os.path.exists(destination):
+        os.remove(destination)
+    os.rename(temp_path, destination)
+
+    return {
+        "mode": "compressed",
+        "bytes": os.path.getsize(destination),
+        "source_bytes": header["size"],
+        "seconds": seconds,
+        "validation_seconds": time.time() - start_time,
+    }
+
+
+def materialize(path, cache_dir, max_bytes=None):
+    """
+    Return a path to the full content of the given published file.
+
+    Plain files are returned as is. Stored files are reconstructed into the
+    cache directory, named after their content hash, so that they are only
+    reconstructed once. The reconstructed content is checked against the
+    hash. The least recently used files are evicted once the cache grows
+    beyond its size limit.
+
+    :param str path: The published file path.
+    :param str cache_dir: The directory to reconstruct stored files in.
+    :param int max_bytes: The maximum total size of the cache directory, or
+        None for no limit.
+
+    :returns: The path to read the file content from.
+    :raises IOError: If the file is a delta whose base file is missing.
+    :raises ValueError: If the reconstructed content doesn't match the hash,
+        e.g. if the base of a delta was replaced.
+    """
+
+    if not is_stored(path):
+        return path
+
+    header, payload_offset = read_header(path)
+    extension = os.path.splitext(path)[1]
+    materialized_path = os.path.join(cache_dir, header["hash"] + extension)
+    if os.path.exists(materialized_path):
+        # mark the file as most recently used
+        os.utime(materialized_path, None)
+        return materialized_path
+
+    sgtk.util.filesystem.ensure_folder_exists(cache_dir)
+    temp_path = "%s.%s.%s.tmp" % (
+        materialized_path,
+        os.getpid(),
+        threading.current_thread().ident,
+    )
+
+    if header["kind"] == "delta":
+        _materialize_delta(path, header, payload_offset, temp_path)
+    elif header["kind"] == "compressed":
+        with open(temp_path, "wb") as output_file:
+            for chunk in _read_compressed(path):
+                output_file.write(chunk)
+    else:
+        raise ValueError("Unknown storage kind '%s' for '%s'" % (header["kind"], path))
+
+    if os.path.getsize(temp_path) != header["size"]:
+        os.remove(temp_path)
+        raise ValueError("Reconstructed '%s' has an unexpected size" % (path,))
+    if hash_file(temp_path) != header["hash"]:
+        os.remove(temp_path)
+        raise ValueError(
+            "Reconstructed '%s' doesn't match the published content" % (path,)
+        )
+
+    if hasattr(os, "replace"):
+        os.replace(temp_path, materialized_path)
+    else:
+        # python 2
+        if os.path.exists(materialized_path):
+            os.remove(materialized_path)
+        os.rename(temp_path, materialized_path)
+    logger.debug("Materialized %s to %s", path, materialized_path)
+
+    if max_bytes is not None:
+        _evict(cache_dir, max_bytes, materialized_path)
+    return materialized_path
+
+
+def _evict(cache_dir, max_bytes, keep_path):
+    """
+    Remove the least recently used materialized files until the cache
+    directory fits within its size limit, except the given file.
+    """
+
+    entries = []
+    total_bytes = 0
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith(".tmp"):
+            # being written by another thread
+            continue
+        file_path = os.path.join(cache_dir, file_name)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, file_path))
+        total_bytes += stat.st_size
+
+    entries.sort()
+    for _, size, file_path in entries:
+        if total_bytes <= max_bytes:
+            break
+        if file_path == keep_path:
+            continue
+        try:
+            os.remove(file_path)
+        except OSError:
+            continue
+        total_bytes -= size
+        logger.debug("Evicted materialized publish %s", file_path)
+
+
+def _write_delta(source, destination, base):
+    """
+    Write the delta of the source against the base to the destination.
+
+    :returns: The size of the delta file, or None if the source differs too
+        much from the base for a delta to be worth it.
+    """
+
+    base_blocks = {}
+    for index, digest in enumerate(base["blocks"]):
+        base_blocks.setdefault(digest, index)
+
+    entries = []
+    literal_count = 0
+    with open(source, "rb") as source_file:
+        for block in iter(lambda: source_file.read(BLOCK_SIZE), b""):
+            index = base_blocks.get(hashlib.sha1(block).hexdigest(), -1)
+            entries.append(index)
+            if index < 0:
+                literal_count += 1
+
+    if literal_count > MAX_DELTA_RATIO * max(1, len(entries)):
+        logger.debug(
+            "%d of %d blocks of %s differ from its base, storing in full.",
+            literal_count,
+            len(entries),
+            source,
+        )
+        return None
+
+    header = {
+        "kind": "delta",
+        "base": base["file"],
+        "block_size": BLOCK_SIZE,
+        "size": os.path.getsize(source),
+        "hash": hash_file(source),
+        "blocks": entries,
+    }
+    header_data = json.dumps(header).encode("utf-8")
+
+    temp_path = "%s.%s.tmp" % (destination, os.getpid())
+    with open(temp_path, "wb") as delta_file:
+        delta_file.write(MAGIC)
+        delta_file.write(struct.pack(">I", len(header_data)))
+        delta_file.write(header_data)
+        with open(source, "rb") as source_file:
+            for index in entries:
+                block = source_file.read(BLOCK_SIZE)
+                if index < 0:
+                    delta_file.write(block)
+
+    if os.path.exists(destination):
+        os.remove(destination)
+    os.rename(temp_path, destination)
+
+    return os.path.getsize(destination)
+
+
+def _materialize_delta(path, header, payload_offset, output_path):
+    """
+    Reconstruct a delta file from its base.
+    """
+
+    block_size = header["block_size"]
+    base_path = os.path.join(os.path.dirname(path), header["base"])
+    if not os.path.exists(base_path):
+        raise IOError(
+            "'%s' is stored as a delta of '%s', which has been deleted."
+            % (path, base_path)
+        )
+
+    with open(path, "rb") as delta_file, open(base_path, "rb") as base_file:
+        delta_file.seek(payload_offset)
+        with open(output_path, "wb") as output_file:
+            for position, index in enumerate(header["blocks"]):
+                if index < 0:
+                    # the last block of the document may be shorter
+                    if position == len(header["blocks"]) - 1:
+                        length = header["size"] - position * block_size
+                    else:
+                        length = block_size
+                    output_file.write(delta_file.read(length))
+                else:
+                    base_file.seek(index * block_size)
+                    output_file.write(base_file.read(block_size))
+    # the last block copied from the base may be longer than the document's
+    # last block, trim to the recorded size
+    with open(output_path, "r+b") as output_file:
+        output_file.truncate(header["size"])
+
+
+def _get_compressed_header(source, chunk_sizes):
+    """
+    Return the header of a compressed file storing the source.
+    """
+
+    return {
+        "kind": "compressed",
+        "chunk_size": CHUNK_SIZE,
+        "size": os.path.getsize(source),
+        "hash": hash_file(source),
+        # fixed width sizes, so that the header size doesn't depend on them
+        "chunks": ["%012d" % (size,) for size in chunk_sizes],
+    }
+
+
+def _pack_header(header):
+    """
+    Return the bytes starting a stored file with the given header.
+    """
+
+    header_data = json.dumps(header).encode("utf-8")
+    return MAGIC + struct.pack(">I", len(header_data)) + header_data
+
+
+def _chunk_count(path):
+    """
+    Return the number of chunks the file is compressed in.
+    """
+
+    return (os.path.getsize(path) + CHUNK_SIZE - 1) // CHUNK_SIZE
+
+
+def _read_chunk_batches(path):
+    """
+    Yield the chunks of the file, in lists of as many chunks as there are
+    compression threads.
+    """
+
+    with open(path, "rb") as source_file:
+        while True:
+            chunks = []
+            for _ in range(COMPRESSION_THREADS):
+                chunk = source_file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            if not chunks:
+                return
+            yield chunks
+            if len(chunks) < COMPRESSION_THREADS:
+                return
+
+
+def _read_compressed(path):
+    """
+    Yield the decompressed chunks of a compressed file.
+    """
+
+    header, payload_offset = read_header(path)
+    pool = _get_compression_pool()
+    sizes = [int(size) for size in header["chunks"]]
+
+    with open(path, "rb") as compressed_file:
+        compressed_file.seek(payload_offset)
+        for start in range(0, len(sizes), COMPRESSION_THREADS):
+            data = [
+                compressed_file.read(size)
+                for size in sizes[start : start + COMPRESSION_THREADS]
+            ]
+            for chunk in pool.map(zlib.decompress, data):
+                yield chunk
+
+
+def _get_compression_pool():
+    """
+    Return the thread pool used to compress and decompress chunks, creating it
+    on first use.
+    """
+
+    global _compression_pool
+    with _compression_pool_lock:
+        if _compression_pool is None:
+            _compression_pool = ThreadPool(COMPRESSION_THREADS)
+    return _compression_pool
+
+
+def _get_base(folder, publish_name):
+    """
+    Return the base recorded for the publish name in the folder's manifest,
+    or None if there is none or the base file is gone.
+    """
+
+    manifest = _read_manifest(folder)
+    base = manifest.get(publish_name)
+    if not base or not os.path.exists(os.path.join(folder, base["file"])):
+        return None
+    if base.get("block_size") != BLOCK_SIZE:
+        return None
+    return base
+
+
+def _set_base(folder, publish_name, path):
+    """
+    Record the file as the base for the publish name in the folder's manifest.
+    """
+
+    blocks = []
+    with open(path, "rb") as base_file:
+        for block in iter(lambda: base_file.read(BLOCK_SIZE), b""):
+            blocks.append(hashlib.sha1(block).hexdigest())
+
+    with _manifest_lock:
+        manifest = _read_manifest(folder)
+        manifest[publish_name] = {
+            "file": os.path.basename(path),
+            "block_size": BLOCK_SIZE,
+            "blocks": blocks,
+        }
+        manifest_path = os.path.join(folder, MANIFEST_NAME)
+        temp_path = "%s.%s.tmp" % (manifest_path, os.getpid())
+        with open(temp_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        shutil.move(temp_path, manifest_path)
+
+
+def _read_manifest(folder):
+    """
+    Read the folder's manifest, returning an empty one if there is none.
+    """
+
+    manifest_path = os.path.join(folder, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, "r") as manifest_file:
+            return json.load(manifest_file)
+    except ValueError:
+        logger.warning("Ignoring corrupt publish storage manifest %s", manifest_path)
+        return {}
@@ -0,0 +1,189 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import threading
+
+import sgtk
+
+from . import tracing
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+
+class PublishedFileCache(object):
+    """
+    The PublishedFile records of a context's work area, fetched in a single
+    query, to answer the publisher's look ups of previous publishes without a
+    Shotgun round trip each.
+
+    The records can be fetched in the background, see
+    :meth:`prefetch_in_background`. Until they are, look ups can't be
+    answered from the cache.
+    """
+
+    FIELDS = [
+        "code",
+        "entity",
+        "name",
+        "path",
+        "project",
+        "sg_status_list",
+        "task",
+        "version_number",
+    ]
+
+    def __init__(self, context, publishes=None):
+        """
+        :param context: The context the publishes were fetched for.
+        :param list publishes: The PublishedFile records of the context's
+            project and entity, or None while they are being fetched.
+        """
+
+        self._context = context
+        self._publishes = publishes
+
+    @classmethod
+    def prefetch(cls, shotgun, context):
+        """
+        Fetch the PublishedFile records of the context's project and entity.
+
+        :param shotgun: The Shotgun API connection.
+        :param context: The context whose work area to fetch the publishes of.
+
+        :returns: A :class:`PublishedFileCache`.
+        """
+
+        return cls(context, cls._find_publishes(shotgun, context))
+
+    @classmethod
+    def prefetch_in_background(cls, get_shotgun, context):
+        """
+        Start fetching the PublishedFile records of the context's project and
+        entity in a background thread.
+
+        :param get_shotgun: Function returning the Shotgun API connection to
+            use, called from the background thread.
+        :param context: The context whose work area to fetch the publishes of.
+
+        :returns: A :class:`PublishedFileCache` that answers look ups once the
+            publishes are fetched.
+        """
+
+        cache = cls(context)
+
+        def fetch():
+            try:
+                with tracing.span("publish2.prefetch_publishes"):
+                    cache._publishes = cls._find_publishes(get_shotgun(), context)
+            except Exception as e:
+                # the plugins query Shotgun themselves
+                logger.debug("Unable to prefetch the publishes: %s", e)
+
+        thread = threading.Thread(target=fetch, name="SketchBookPrefetchPublishes")
+        thread.daemon = True
+        thread.start()
+        return cache
+
+    @classmethod
+    def _find_publishes(cls, shotgun, context):
+        """
+        Return the PublishedFile records of the context's project and entity.
+        """
+
+        publishes = shotgun.find(
+            "PublishedFile",
+            [
+                ["project", "is", context.project],
+                ["entity", "is", context.entity],
+            ],
+            cls.FIELDS,
+        )
+        logger.debug("Prefetched %d publishes for %s", len(publishes), context)
+        return publishes
+
+    def find_conflicting(self, tk, context, path, publish_name, filters=None):
+        """
+        Return the publishes of the given path, name and context, like the
+        publisher's ``util.get_conflicting_publishes``.
+
+        :param tk: The Toolkit API instance.
+        :param context: The context of the publish.
+        :param str path: The path of the publish.
+        :param str publish_name: The name of the publish.
+        :param filters: An additional filter on the publishes, e.g.
+            ``["sg_status_list", "is_not", None]``. Only ``is`` and ``is_not``
+            filters on the fetched fields are supported.
+
+        :returns: The list of matching publishes, or None if the look up can't
+            be answered from the cache.
+        """
+
+        all_publishes = self._publishes
+        if all_publishes is None:
+            # still being fetched
+            return None
+
+        if not _same_entity(context.project, self._context.project) or not (
+            _same_entity(context.entity, self._context.entity)
+        ):
+            return None
+
+        if filters:
+            field, operator, value = filters
+            if field not in self.FIELDS or operator not in ("is", "is_not"):
+                return None
+        else:
+            field = None
+
+        # ask core for the fields the publish would be registered with,
+        # without creating it
+        publish_data = sgtk.util.register_publish(
+            tk, context, path, publish_name, version_number=None, dry_run=True
+        )
+        publish_path = sgtk.util.ShotgunPath.normalize(path)
+
+        matching_publishes = []
+        for publish in all_publishes:
+            if publish["code"] != publish_data["code"]:
+                continue
+            if publish["name"] != publish_data["name"]:
+                continue
+            if not _same_entity(publish["task"], publish_data["task"]):
+                continue
+            if field and (_same_value(publish[field], value) != (operator == "is")):
+                continue
+
+            local_path = (publish["path"] or {}).get("local_path")
+            if local_path and sgtk.util.ShotgunPath.normalize(local_path) == (
+                publish_path
+            ):
+                matching_publishes.append(publish)
+
+        return matching_publishes
+
+
+def _same_entity(entity, other):
+    """
+    Return True if both are the same entity, or both are None.
+    """
+
+    if not entity or not other:
+        return not entity and not other
+    return entity["type"] == other["type"] and entity["id"] == other["id"]
+
+
+def _same_value(value, other):
+    """
+    Return True if the field values are equal, comparing entities by id.
+    """
+
+    if isinstance(value, dict) or isinstance(other, dict):
+        return _same_entity(value, other)
+    return value == other
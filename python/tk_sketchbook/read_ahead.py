@@ -0,0 +1,109 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import os
+import threading
+
+import sgtk
+
+from . import tracing
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+
+class ReadAhead(object):
+    """
+    Speculative background staging of the published files a user is looking
+    at in the Loader or Shotgun Panel, so that the file is usually local by
+    the time they open or import it.
+
+    A new request cancels the requests that haven't started yet, as the user
+    has moved on to another publish. Files above the size limit are left
+    alone, and at most a fixed number of files are read at the same time.
+    """
+
+    def __init__(self, stage, max_bytes, threads=2):
+        """
+        :param stage: Function taking a published file path and publish id,
+            and making the file local, e.g.
+            :meth:`SketchBookEngine.stage_publish`.
+        :param int max_bytes: The size of the largest file read ahead.
+        :param int threads: The maximum number of files read at the same
+            time.
+        """
+
+        self._stage = stage
+        self._max_bytes = max_bytes
+        self._max_threads = threads
+        self._condition = threading.Condition()
+        self._threads = []
+        # (publish id, path function) not started yet, and the publish ids
+        # being read
+        self._queue = []
+        self._reading = set()
+
+    def request(self, publish_id, get_path):
+        """
+        Read the published file ahead, cancelling the requests that haven't
+        started yet.
+
+        :param int publish_id: The id of the PublishedFile.
+        :param get_path: Function returning the published file path. It is
+            called from the read ahead thread.
+        """
+
+        with self._condition:
+            cancelled = [queued for queued in self._queue if queued[0] != publish_id]
+            if cancelled:
+                logger.debug("Cancelled reading ahead %d files", len(cancelled))
+
+            self._queue = (
+                [] if publish_id in self._reading else [(publish_id, get_path)]
+            )
+            if self._queue and len(self._threads) < self._max_threads:
+                thread = threading.Thread(target=self._run, name="SketchBookReadAhead")
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+            self._condition.notify()
+
+    def _run(self):
+        """
+        Read the requested files ahead, forever.
+        """
+
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                publish_id, get_path = self._queue.pop(0)
+                self._reading.add(publish_id)
+
+            try:
+                self._read(get_path(), publish_id)
+            except Exception as e:
+                # the action will read the file itself
+                logger.debug("Unable to read publish %s ahead: %s", publish_id, e)
+            finally:
+                with self._condition:
+                    self._reading.discard(publish_id)
+
+    def _read(self, path, publish_id):
+        """
+        Stage the published file, if it isn't too large.
+        """
+
+        size = os.path.getsize(path)
+        if size > self._max_bytes:
+            logger.debug("Not reading %s ahead, %d bytes is too large", path, size)
+            return
+
+        with tracing.span("read_ahead.stage", path=path, size=size):
+            self._stage(path, publish_id)
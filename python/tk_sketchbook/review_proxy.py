@@ -0,0 +1,92 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import os
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+import sgtk
+
+from .image_utils import read_scaled_image, write_image
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+# Single worker shared by all proxy requests. Generating a proxy is I/O and
+# decode bound, and the Qt image classes release the GIL while decoding, so a
+# worker thread lets the publish carry on with its Shotgun round trips while
+# the proxy is being produced.
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+
+def _get_worker_pool():
+    """
+    Return the worker pool used to generate review proxies, creating it on
+    first use.
+    """
+
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            _worker_pool = ThreadPool(1)
+    return _worker_pool
+
+
+def start_review_proxy(source_path, max_size, image_format="jpg"):
+    """
+    Start generating a review proxy for the given image in the background.
+
+    :param str source_path: The full resolution image to create a proxy for.
+    :param int max_size: The maximum width or height of the proxy, in pixels.
+    :param str image_format: The proxy image format, e.g. "jpg" or "png".
+
+    :returns: A :class:`multiprocessing.pool.AsyncResult` whose ``get`` method
+        returns the dictionary described in :func:`create_review_proxy`.
+    """
+
+    return _get_worker_pool().apply_async(
+        create_review_proxy, (source_path, max_size, image_format)
+    )
+
+
+def create_review_proxy(source_path, max_size, image_format="jpg"):
+    """
+    Create a screen resolution review proxy for the given image.
+
+    See :func:`image_utils.read_scaled_image` for how the image is decoded
+    and downsampled.
+
+    :param str source_path: The full resolution image to create a proxy for.
+    :param int max_size: The maximum width or height of the proxy, in pixels.
+    :param str image_format: The proxy image format, e.g. "jpg" or "png".
+
+    :returns: A dictionary with the keys ``path`` (the proxy path),
+        ``source_bytes``, ``proxy_bytes`` and ``seconds``.
+    :raises RuntimeError: If the source image cannot be decoded.
+    """
+
+    start_time = time.time()
+
+    image = read_scaled_image(source_path, max_size)
+
+    output_dir = tempfile.mkdtemp(prefix="tk-sketchbook-proxy-")
+    base_name = os.path.splitext(os.path.basename(source_path))[0]
+
+    proxy_path = os.path.join(output_dir, "%s.%s" % (base_name, image_format))
+    write_image(image, proxy_path)
+
+    return {
+        "path": proxy_path,
+        "source_bytes": os.path.getsize(source_path),
+        "proxy_bytes": os.path.getsize(proxy_path),
+        "seconds": time.time() - start_time,
+    }
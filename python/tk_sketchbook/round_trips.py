@@ -0,0 +1,83 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import threading
+import time
+
+
+class RoundTripLog(object):
+    """
+    Times a sequence of Shotgun requests, possibly made from several threads,
+    so that the number of round trips and where the time went can be reported.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start_time = time.time()
+        self._entries = []
+
+    @property
+    def count(self):
+        """
+        The number of requests made.
+        """
+
+        return len(self._entries)
+
+    def call(self, label, func, *args, **kwargs):
+        """
+        Call the given function and record how long it took.
+
+        :param str label: The label to report the request under.
+        :param func: The function making the request.
+
+        :returns: The function's return value.
+        """
+
+        start_time = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end_time = time.time()
+            with self._lock:
+                self._entries.append(
+                    (
+                        label,
+                        start_time - self._start_time,
+                        end_time - start_time,
+                        threading.current_thread().name,
+                    )
+                )
+
+    def summary(self):
+        """
+        Return a plain text table of the recorded requests, in the order they
+        were started.
+        """
+
+        with self._lock:
+            entries = sorted(self._entries, key=lambda entry: entry[1])
+
+        lines = ["%-32s %9s %9s  %s" % ("Request", "Start", "Latency", "Thread")]
+        for label, start, latency, thread_name in entries:
+            lines.append(
+                "%-32s %8.3fs %8.3fs  %s" % (label, start, latency, thread_name)
+            )
+
+        lines.append("")
+        lines.append(
+            "%d round trips, %.3fs total latency, %.3fs elapsed"
+            % (
+                len(entries),
+                sum(entry[2] for entry in entries),
+                time.time() - self._start_time,
+            )
+        )
+        return "\n".join(lines)
@@ -0,0 +1,155 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import time
+
+import sgtk
+
+import sketchbook_api
+
+
+class SaveLedger(object):
+    """
+    Publish scoped record of the document saves requested by the publish
+    plugins. Saving a large SketchBook document serializes the whole document,
+    so the ledger skips saves that wouldn't change anything and merges a save
+    that is immediately followed by a save as into a single write.
+    """
+
+    def __init__(self, save_file=None, save_file_as=None):
+        """
+        :param save_file: Function saving the current document, defaults to
+            the SketchBook API's.
+        :param save_file_as: Function saving the current document to a path,
+            defaults to the SketchBook API's.
+        """
+
+        self._save_file = save_file or sketchbook_api.save_file
+        self._save_file_as = save_file_as or sketchbook_api.save_file_as
+        self._pending_save = False
+        self._entries = []
+
+    @property
+    def write_count(self):
+        """
+        The number of times the document has been written.
+        """
+
+        return len([entry for entry in self._entries if entry[2] is not None])
+
+    def save(self, defer=False):
+        """
+        Save the current document, if it has unsaved changes.
+
+        :param bool defer: If True, the save is held back so that it can be
+            merged with a following :meth:`save_as`. Call :meth:`flush` to
+            write a deferred save that wasn't merged.
+        """
+
+        if self._pending_save:
+            if defer:
+                return
+            self._pending_save = False
+
+        if not sketchbook_api.is_current_document_dirty():
+            self._entries.append(("save", "skipped, no unsaved changes", None))
+            return
+
+        if defer:
+            self._pending_save = True
+            return
+
+        self._write("save", None, self._save_file)
+
+    def save_as(self, path):
+        """
+        Save the current document to the given path. A deferred save is merged
+        into this write.
+
+        :param str path: The path to save the document to.
+        """
+
+        if self._pending_save:
+            self._pending_save = False
+            self._entries.append(("save", "merged into save as", None))
+
+        self._write("save as", path, self._save_file_as, path)
+
+    def flush(self):
+        """
+        Write a deferred save that hasn't been merged into a save as.
+        """
+
+        if self._pending_save:
+            self.save()
+
+    def summary(self):
+        """
+        Return a plain text summary of the requested saves.
+        """
+
+        lines = []
+        for operation, detail, seconds in self._entries:
+            if seconds is None:
+                lines.append("%-8s %s" % (operation, detail))
+            else:
+                lines.append("%-8s %s (%.2fs)" % (operation, detail, seconds))
+
+        lines.append("")
+        lines.append(
+            "%d of %d requested saves written" % (self.write_count, len(self._entries))
+        )
+        return "\n".join(lines)
+
+    def _write(self, operation, path, func, *args):
+        """
+        Perform and record a write of the document.
+        """
+
+        start_time = time.time()
+        func(*args)
+        self._entries.append(
+            (operation, path or "current path", time.time() - start_time)
+        )
+
+
+def get_save_ledger(item):
+    """
+    Return the save ledger shared by the plugins publishing the session item,
+    creating it on first use.
+
+    :param item: The session item.
+
+    :returns: The item's :class:`SaveLedger`.
+    """
+
+    ledger = item.properties.get("save_ledger")
+    if ledger is None:
+        engine = sgtk.platform.current_engine()
+        ledger = SaveLedger(engine.save_file, engine.save_file_as)
+        item.properties["save_ledger"] = ledger
+    return ledger
+
+
+def get_save_as_action():
+    """
+    Simple helper for returning a log action dict for saving the session
+    """
+
+    engine = sgtk.platform.current_engine()
+    callback = engine.show_save_dialog
+
+    return {
+        "action_button": {
+            "label": "Save As...",
+            "tooltip": "Save the current session",
+            "callback": callback,
+        }
+    }
@@ -0,0 +1,299 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+Metadata sidecars written next to published documents, so that the loader can
+describe a publish (dimensions, layers, size) without opening the document.
+"""
+
+import json
+import os
+import struct
+import threading
+from multiprocessing.pool import ThreadPool
+
+import sgtk
+
+from . import tracing
+from .hashing import hash_file
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+SIDECAR_EXTENSION = ".sbmeta.json"
+
+# TIFF tags holding the image dimensions.
+_TIFF_IMAGE_WIDTH = 256
+_TIFF_IMAGE_LENGTH = 257
+
+# Upper bound on the number of TIFF directories read, in case of corrupt files.
+_MAX_TIFF_PAGES = 4096
+
+
+def read_metadata(path, thumbnail_path=None):
+    """
+    Read the metadata of a document, to be written to its sidecar.
+
+    :param str path: The document path.
+    :param str thumbnail_path: The path of a thumbnail of the document, if any.
+
+    :returns: A dictionary with the keys ``width``, ``height``, ``layers`` (the
+        number of TIFF pages, None for other formats), ``bytes``, ``hash`` and
+        ``thumbnail``. The dimensions are None if they cannot be read.
+    """
+
+    try:
+        tiff_info = read_tiff_info(path)
+    except struct.error:
+        # truncated or corrupt TIFF file
+        tiff_info = None
+
+    if tiff_info:
+        width, height, layers = tiff_info
+    else:
+        from .image_utils import read_image_size
+
+        width, height = read_image_size(path) or (None, None)
+        layers = None
+
+    return {
+        "width": width,
+        "height": height,
+        "layers": layers,
+        "bytes": os.path.getsize(path),
+        "hash": hash_file(path),
+        "thumbnail": thumbnail_path,
+    }
+
+
+def write_sidecar(path, metadata):
+    """
+    Write the metadata to the sidecar of the given document.
+
+    :param str path: The document path.
+    :param dict metadata: The metadata, see :func:`read_metadata`.
+
+    :returns: The sidecar path.
+    """
+
+    sidecar_path = path + SIDECAR_EXTENSION
+    temp_path = "%s.%s.tmp" % (sidecar_path, os.getpid())
+    with open(temp_path, "w") as sidecar_file:
+        json.dump(metadata, sidecar_file, sort_keys=True)
+    if os.path.exists(sidecar_path):
+        os.remove(sidecar_path)
+    os.rename(temp_path, sidecar_path)
+    return sidecar_path
+
+
+def read_sidecar(path):
+    """
+    Read the sidecar of the given document.
+
+    :param str path: The document path.
+
+    :returns: The metadata dictionary, or None if the document has no
+        readable sidecar.
+    """
+
+    sidecar_path = path + SIDECAR_EXTENSION
+    try:
+        with open(sidecar_path, "r") as sidecar_file:
+            return json.load(sidecar_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def find_metadata(publish_index, published_file_id, path):
+    """
+    Return the metadata of a published document, from the local publish index
+    or failing that from the document's sidecar. Sidecar metadata is added to
+    the index so that later look ups stay local.
+
+    :param publish_index: The :class:`PublishIndex` to look the metadata up in.
+    :param int published_file_id: The id of the PublishedFile entity.
+    :param str path: The published document path.
+
+    :returns: The metadata dictionary, or None if there is none.
+    """
+
+    metadata = publish_index.find_metadata(published_file_id)
+    if metadata is None and path:
+        metadata = read_sidecar(path)
+        if metadata is not None:
+            publish_index.record_metadata(published_file_id, path, metadata)
+    return metadata
+
+
+def format_metadata(metadata):
+    """
+    Return a short description of a document from its metadata, e.g.
+    "4096 x 3072 px, 12 layers, 48.0 MB".
+
+    :param dict metadata: The metadata, see :func:`read_metadata`.
+    """
+
+    parts = []
+    if metadata.get("width") and metadata.get("height"):
+        parts.append("%d x %d px" % (metadata["width"], metadata["height"]))
+    if metadata.get("layers"):
+        parts.append(
+            "%d layer%s" % (metadata["layers"], "" if metadata["layers"] == 1 else "s")
+        )
+    if metadata.get("bytes") is not None:
+        parts.append("%.1f MB" % (metadata["bytes"] / (1024.0 * 1024.0),))
+    return ", ".join(parts)
+
+
+class PublishDetails(object):
+    """
+    Descriptions of published documents for the actions of the Loader and
+    Shotgun Panel, from their metadata, see :func:`find_metadata`.
+
+    The metadata of a publish is looked up in a background thread the first
+    time it is described, so describing a publish never reads the publish
+    index or a sidecar from the calling thread. The descriptions are kept in
+    memory for the session.
+    """
+
+    def __init__(self, publish_index):
+        """
+        :param publish_index: The :class:`PublishIndex` to look the metadata
+            up in.
+        """
+
+        self._publish_index = publish_index
+        self._lock = threading.Lock()
+        self._pool = None
+        # published file id -> description, empty if the publish has none
+        self._descriptions = {}
+        # published file ids being looked up
+        self._pending = set()
+
+    def describe(self, published_file_id, get_path):
+        """
+        Return the description of a published document if its metadata has
+        been looked up, else start looking it up in the background.
+
+        :param int published_file_id: The id of the PublishedFile entity.
+        :param get_path: Function returning the published document path. It is
+            called from the background thread.
+
+        :returns: The description, e.g. "4096 x 3072 px, 12 layers, 48.0 MB",
+            an empty string if the publish has no metadata, or None if it is
+            still being looked up.
+        """
+
+        with self._lock:
+            if published_file_id in self._descriptions:
+                return self._descriptions[published_file_id]
+
+            if published_file_id not in self._pending:
+                self._pending.add(published_file_id)
+                if self._pool is None:
+                    self._pool = ThreadPool(1)
+                self._pool.apply_async(self._look_up, (published_file_id, get_path))
+        return None
+
+    def _look_up(self, published_file_id, get_path):
+        """
+        Look up the metadata of a published document and store its
+        description.
+        """
+
+        try:
+            path = get_path()
+            with tracing.span("sidecar.publish_details", path=path):
+                metadata = find_metadata(self._publish_index, published_file_id, path)
+        except Exception as e:
+            # looked up again the next time the publish is described
+            logger.debug("Unable to read the publish metadata: %s", e)
+            with self._lock:
+                self._pending.discard(published_file_id)
+            return
+
+        with self._lock:
+            self._descriptions[published_file_id] = (
+                format_metadata(metadata) if metadata else ""
+            )
+            self._pending.discard(published_file_id)
+
+
+def read_tiff_info(path):
+    """
+    Read the dimensions and number of pages of a TIFF file by walking its
+    directories, without reading any image data. SketchBook stores each layer
+    of a document in its own page.
+
+    :param str path: The file path.
+
+    :returns: A (width, height, page count) tuple, or None if the file is not
+        a TIFF file.
+    """
+
+    with open(path, "rb") as tiff_file:
+        header = tiff_file.read(16)
+        if header[:2] == b"II":
+            byte_order = "<"
+        elif header[:2] == b"MM":
+            byte_order = ">"
+        else:
+            return None
+
+        (magic,) = struct.unpack(byte_order + "H", header[2:4])
+        if magic == 42:
+            # classic TIFF, 32 bit offsets
+            (offset,) = struct.unpack(byte_order + "I", header[4:8])
+            count_format, entry_format, offset_format = ("H", "HHI4s", "I")
+        elif magic == 43:
+            # BigTIFF, 64 bit offsets
+            (offset,) = struct.unpack(byte_order + "Q", header[8:16])
+            count_format, entry_format, offset_format = ("Q", "HHQ8s", "Q")
+        else:
+            return None
+
+        count_size = struct.calcsize(byte_order + count_format)
+        entry_size = struct.calcsize(byte_order + entry_format)
+        offset_size = struct.calcsize(byte_order + offset_format)
+
+        width = height = None
+        pages = 0
+        visited = set()
+        while offset and offset not in visited and pages < _MAX_TIFF_PAGES:
+            visited.add(offset)
+            tiff_file.seek(offset)
+            (entry_count,) = struct.unpack(
+                byte_order + count_format, tiff_file.read(count_size)
+            )
+            entries = tiff_file.read(entry_count * entry_size)
+
+            if pages == 0:
+                for index in range(entry_count):
+                    tag, field_type, _, value = struct.unpack(
+                        byte_order + entry_format,
+                        entries[index * entry_size : (index + 1) * entry_size],
+                    )
+                    if tag not in (_TIFF_IMAGE_WIDTH, _TIFF_IMAGE_LENGTH):
+                        continue
+                    # SHORT (3) or LONG (4) values, stored at the start of the
+                    # value field
+                    value_format = "H" if field_type == 3 else "I"
+                    (value,) = struct.unpack_from(byte_order + value_format, value)
+                    if tag == _TIFF_IMAGE_WIDTH:
+                        width = value
+                    else:
+                        height = value
+
+            pages += 1
+            next_offset = tiff_file.read(offset_size)
+            if len(next_offset) < offset_size:
+                break
+            (offset,) = struct.unpack(byte_order + offset_format, next_offset)
+
+    return (width, height, pages)
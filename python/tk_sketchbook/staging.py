@@ -0,0 +1,251 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import contextlib
+import os
+import shutil
+import threading
+
+import sgtk
+
+from .file_copy import checksum_file, copy_file
+from .hashing import stat_signature
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+
+class StagingCache(object):
+    """
+    Local copies of published files opened or imported from network storage,
+    so that files used again are read from local disk.
+
+    Copies are keyed by publish id and the size and modification time of the
+    published file, so a published file that changed is copied again. A copy
+    keeps the modification time of the published file, and is only used if
+    its size and modification time still match. A copy is checked against the
+    checksum of the data read from the network before it is used.
+
+    The least recently used copies are evicted once the cache grows beyond
+    its size limit, except the copies being staged or returned and the copies
+    staged within a :meth:`hold`. Published files larger than the size limit
+    aren't copied.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        """
+        :param str cache_dir: The directory to store the copies in.
+        :param int max_bytes: The maximum total size of the copies.
+        """
+
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # staged path -> event set once the copy in progress completes
+        self._copying = {}
+        # staged folder -> number of stages in progress
+        self._staging = {}
+        # the lists of folders staged within each hold
+        self._holds = []
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def stage(self, publish_id, path):
+        """
+        Return the local copy of a published file, copying it if it isn't
+        already cached.
+
+        :param int publish_id: The id of the PublishedFile.
+        :param str path: The published file path.
+
+        :returns: The local copy path, or the published file path if it's
+            larger than the cache.
+        """
+
+        stat = os.stat(path)
+        size, mtime_ns = stat_signature(stat)
+        if size > self._max_bytes:
+            logger.debug("Not staging %s, it's larger than the cache", path)
+            return path
+
+        staged_folder = os.path.join(
+            self._cache_dir, "%s-%s-%s" % (publish_id, size, mtime_ns)
+        )
+        staged_path = os.path.join(staged_folder, os.path.basename(path))
+
+        # keep the copy from being evicted, by this or another thread, until
+        # it's returned, and within the holds until they exit
+        with self._lock:
+            self._staging[staged_folder] = self._staging.get(staged_folder, 0) + 1
+            for held in self._holds:
+                held.append(staged_folder)
+        try:
+            self._stage(path, stat, staged_path)
+        finally:
+            with self._lock:
+                self._staging[staged_folder] -= 1
+                if not self._staging[staged_folder]:
+                    del self._staging[staged_folder]
+
+        return staged_path
+
+    @contextlib.contextmanager
+    def hold(self):
+        """
+        Context manager keeping the copies staged within it from being evicted
+        until it exits, e.g. the files of a selection staged ahead of
+        SketchBook loading them.
+        """
+
+        held = []
+        with self._lock:
+            self._holds.append(held)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._holds.remove(held)
+
+    def _stage(self, path, stat, staged_path):
+        """
+        Copy a published file to the cache, unless it's already cached, see
+        :meth:`stage`.
+        """
+
+        staged_folder = os.path.dirname(staged_path)
+        while True:
+            if self._is_cached(stat, staged_path):
+                # mark the copy as most recently used
+                os.utime(staged_folder, None)
+                with self._lock:
+                    self.hits += 1
+                    self.bytes_saved += stat.st_size
+                self._log("hit", path)
+                return
+
+            # wait for another thread already copying the file, e.g. reading
+            # it ahead, rather than copying it twice
+            with self._lock:
+                copying = self._copying.get(staged_path)
+                if copying is None:
+                    self._copying[staged_path] = threading.Event()
+                    break
+            copying.wait()
+
+        try:
+            self._copy(path, stat, staged_path)
+        finally:
+            with self._lock:
+                self._copying.pop(staged_path).set()
+
+        with self._lock:
+            self.misses += 1
+        self._log("miss", path)
+
+        self._evict()
+
+    def _is_cached(self, stat, staged_path):
+        """
+        Return True if the copy exists and has the size and modification time
+        of the published file.
+        """
+
+        try:
+            staged_stat = os.stat(staged_path)
+        except OSError:
+            return False
+        # compare whole seconds, as the cache's file system may store
+        # modification times less precisely than network storage
+        return staged_stat.st_size == stat.st_size and int(staged_stat.st_mtime) == int(
+            stat.st_mtime
+        )
+
+    def _copy(self, path, stat, staged_path):
+        """
+        Copy a published file to the cache.
+        """
+
+        sgtk.util.filesystem.ensure_folder_exists(os.path.dirname(staged_path))
+
+        # copy to a temporary file first so that a partially written copy is
+        # never picked up by another thread or process
+        temp_path = "%s.%s.%s.tmp" % (
+            staged_path,
+            os.getpid(),
+            threading.current_thread().ident,
+        )
+        try:
+            result = copy_file(path, temp_path, methods=("stream",))
+            if checksum_file(temp_path) != result["checksum"]:
+                raise IOError("The local copy of %s is corrupt." % (path,))
+            os.utime(temp_path, (stat.st_atime, stat.st_mtime))
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+            os.rename(temp_path, staged_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _log(self, outcome, path):
+        """
+        Log a look up and the cache statistics of the session.
+        """
+
+        with self._lock:
+            logger.debug(
+                "Staging cache %s for %s: %d hits, %d misses, %.1f MB not read "
+                "from network storage this session",
+                outcome,
+                path,
+                self.hits,
+                self.misses,
+                self.bytes_saved / (1024.0 * 1024.0),
+            )
+
+    def _evict(self):
+        """
+        Remove the least recently used copies until the cache fits within its
+        size limit. The copies being staged or held are kept, even if the
+        cache doesn't fit then.
+        """
+
+        with self._lock:
+            in_use = set(self._staging)
+            for held in self._holds:
+                in_use.update(held)
+
+            entries = []
+            total_bytes = 0
+            for folder_name in os.listdir(self._cache_dir):
+                folder = os.path.join(self._cache_dir, folder_name)
+                try:
+                    used_time = os.stat(folder).st_mtime
+                    file_names = os.listdir(folder)
+                except OSError:
+                    continue
+                folder_bytes = 0
+                for file_name in file_names:
+                    if file_name.endswith(".tmp"):
+                        continue
+                    try:
+                        folder_bytes += os.path.getsize(os.path.join(folder, file_name))
+                    except OSError:
+                        continue
+                total_bytes += folder_bytes
+                if folder not in in_use:
+                    entries.append((used_time, folder_bytes, folder))
+
+            entries.sort()
+            for _, size, folder in entries:
+                if total_bytes <= self._max_bytes:
+                    break
+                shutil.rmtree(folder, ignore_errors=True)
+                total_bytes -= size
+                logger.debug("Evicted staged file %s", folder)
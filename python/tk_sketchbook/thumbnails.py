@@ -0,0 +1,140 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+
+import sgtk
+
+from .hashing import hash_file
+from .image_utils import read_scaled_image, write_image
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+
+class ThumbnailCache(object):
+    """
+    Generates small thumbnails of SketchBook documents in a background thread
+    and caches them on disk by content hash. The least recently used
+    thumbnails are evicted once the cache grows beyond its size limit.
+    """
+
+    THUMBNAIL_SIZE = 512
+    THUMBNAIL_EXTENSION = "jpg"
+
+    def __init__(self, cache_dir, max_bytes):
+        """
+        :param str cache_dir: The directory to store the thumbnails in.
+        :param int max_bytes: The maximum total size of the cached thumbnails.
+        """
+
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def request_thumbnail(self, path, callback=None):
+        """
+        Start generating the thumbnail for the given file in the background.
+
+        :param str path: The document to create a thumbnail for.
+        :param callback: Optional function called with the thumbnail path once
+            it has been generated. It is called from the worker thread.
+
+        :returns: A :class:`multiprocessing.pool.AsyncResult` whose ``get``
+            method returns the thumbnail path.
+        """
+
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPool(1)
+        return self._pool.apply_async(self.get_thumbnail, (path,), callback=callback)
+
+    def get_thumbnail(self, path, content_hash=None):
+        """
+        Return the path to the thumbnail of the given file, generating it if
+        it isn't already cached.
+
+        :param str path: The document to create a thumbnail for.
+        :param str content_hash: The content hash of the document, if already
+            known, so the document isn't read to look the thumbnail up.
+
+        :returns: The thumbnail path.
+        """
+
+        thumbnail_path = os.path.join(
+            self._cache_dir,
+            "%s.%s" % (content_hash or hash_file(path), self.THUMBNAIL_EXTENSION),
+        )
+
+        if os.path.exists(thumbnail_path):
+            logger.debug("Thumbnail cache hit for %s", path)
+            # mark the thumbnail as most recently used
+            os.utime(thumbnail_path, None)
+            return thumbnail_path
+
+        logger.debug("Thumbnail cache miss for %s", path)
+        image = read_scaled_image(path, self.THUMBNAIL_SIZE)
+
+        sgtk.util.filesystem.ensure_folder_exists(self._cache_dir)
+
+        # write to a temporary file first so that a partially written
+        # thumbnail is never picked up by another thread or process
+        temp_path = "%s.%s.%s.tmp.%s" % (
+            thumbnail_path,
+            os.getpid(),
+            threading.current_thread().ident,
+            self.THUMBNAIL_EXTENSION,
+        )
+        write_image(image, temp_path)
+        if hasattr(os, "replace"):
+            os.replace(temp_path, thumbnail_path)
+        else:
+            # python 2
+            if os.path.exists(thumbnail_path):
+                os.remove(thumbnail_path)
+            os.rename(temp_path, thumbnail_path)
+
+        self._evict()
+
+        return thumbnail_path
+
+    def _evict(self):
+        """
+        Remove the least recently used thumbnails until the cache fits within
+        its size limit.
+        """
+
+        with self._lock:
+            entries = []
+            total_bytes = 0
+            for file_name in os.listdir(self._cache_dir):
+                if ".tmp." in file_name:
+                    # being written by another thread
+                    continue
+                file_path = os.path.join(self._cache_dir, file_name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, file_path))
+                total_bytes += stat.st_size
+
+            entries.sort()
+            for _, size, file_path in entries:
+                if total_bytes <= self._max_bytes:
+                    break
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    continue
+                total_bytes -= size
+                logger.debug("Evicted thumbnail %s", file_path)
@@ -0,0 +1,258 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+Session tracing. Spans of the engine, its menu and its hooks are written to a
+trace file in the Chrome trace event format, which can be opened in Perfetto
+(https://ui.perfetto.dev) or chrome://tracing.
+
+Tracing is disabled until :func:`enable` is called. While disabled, and
+activities aren't tracked, :func:`span` returns a shared context manager that
+does nothing.
+
+Tracking activities keeps the names of the spans each thread is in, e.g. so
+the stall watchdog can tell which command or hook SketchBook was stuck in.
+"""
+
+import json
+import os
+import threading
+import time
+
+import sgtk
+
+# Number of spans kept in memory before they are appended to the trace file.
+FLUSH_SIZE = 500
+
+_tracer = None
+
+# thread ident -> names of the spans the thread is in, while tracked
+_activities = None
+
+
+def enable(path):
+    """
+    Start writing the spans to a trace file.
+
+    :param str path: The trace file path. An existing file is replaced.
+    """
+
+    global _tracer
+    disable()
+    _tracer = _Tracer(path)
+
+
+def disable():
+    """
+    Stop tracing, writing the remaining spans to the trace file.
+    """
+
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.flush()
+
+
+def is_enabled():
+    """
+    Return True if spans are being traced.
+    """
+
+    return _tracer is not None
+
+
+def track_activities(enabled):
+    """
+    Start or stop keeping the names of the spans each thread is in, whether
+    tracing is enabled or not. See :func:`get_activity`.
+
+    :param bool enabled: True to track the activities.
+    """
+
+    global _activities
+    _activities = {} if enabled else None
+
+
+def get_activity(thread_ident):
+    """
+    Return the names of the spans a thread is in, outermost first, e.g.
+    "menu.do_command > publish2.SketchBookSessionPublishPlugin.publish", or
+    None if it isn't in any or activities aren't tracked.
+
+    :param int thread_ident: The thread's ident.
+    """
+
+    activities = _activities
+    if not activities:
+        return None
+    names = activities.get(thread_ident)
+    if not names:
+        return None
+    return " > ".join(names)
+
+
+def span(name, **attributes):
+    """
+    Return a context manager tracing the time spent in its block. Spans of the
+    same thread nest by time.
+
+    :param str name: The span name, e.g. "engine.refresh_context".
+    :param attributes: Values shown with the span, e.g. a file path. They must
+        be JSON serializable, or are written as strings.
+    """
+
+    if _tracer is None and _activities is None:
+        return _NO_SPAN
+    return _Span(_tracer, name, attributes)
+
+
+def add_span(name, start_time, end_time, **attributes):
+    """
+    Trace a span measured by the caller, e.g. one that started before it was
+    known whether tracing is enabled.
+
+    :param str name: The span name.
+    :param float start_time: The ``time.time()`` the span started at.
+    :param float end_time: The ``time.time()`` the span ended at.
+    :param attributes: Values shown with the span.
+    """
+
+    if _tracer is not None:
+        _tracer.add(name, start_time, end_time, attributes)
+
+
+class _NoSpan(object):
+    """
+    Context manager doing nothing, returned while tracing is disabled and
+    activities aren't tracked.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span(object):
+    """
+    Context manager tracing a span, and tracking it as an activity of its
+    thread.
+    """
+
+    def __init__(self, tracer, name, attributes):
+        self._tracer = tracer
+        self._name = name
+        self._attributes = attributes
+        self._start_time = None
+        self._activity = None
+
+    def __enter__(self):
+        self._start_time = time.time()
+        activities = _activities
+        if activities is not None:
+            # only the thread itself changes its list
+            self._activity = activities.setdefault(threading.current_thread().ident, [])
+            self._activity.append(self._name)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._activity:
+            self._activity.pop()
+        if self._tracer is None:
+            return False
+
+        if exc_type is not None:
+            self._attributes["error"] = "%s: %s" % (exc_type.__name__, exc_value)
+        self._tracer.add(self._name, self._start_time, time.time(), self._attributes)
+        return False
+
+    def set(self, **attributes):
+        """
+        Add attributes to the span, e.g. values only known at its end.
+        """
+
+        self._attributes.update(attributes)
+
+
+class _Tracer(object):
+    """
+    Buffers spans and appends them to the trace file.
+
+    The file is written in the JSON array format without its closing bracket,
+    which the trace viewers accept, so that spans can be appended to it and a
+    trace of a session that crashed can still be opened.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._events = []
+        self._thread_ids = set()
+
+        sgtk.util.filesystem.ensure_folder_exists(os.path.dirname(path))
+        with open(path, "w") as trace_file:
+            trace_file.write("[\n")
+
+    def add(self, name, start_time, end_time, attributes):
+        """
+        Add a span, flushing the buffered spans if the buffer is full.
+        """
+
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": int(start_time * 1e6),
+            "dur": int((end_time - start_time) * 1e6),
+            "pid": self._pid,
+            "tid": thread.ident,
+        }
+        if attributes:
+            event["args"] = attributes
+
+        with self._lock:
+            if thread.ident not in self._thread_ids:
+                self._thread_ids.add(thread.ident)
+                self._events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": self._pid,
+                        "tid": thread.ident,
+                        "args": {"name": thread.name},
+                    }
+                )
+            self._events.append(event)
+            if len(self._events) < FLUSH_SIZE:
+                return
+
+        self.flush()
+
+    def flush(self):
+        """
+        Append the buffered spans to the trace file.
+        """
+
+        with self._lock:
+            events, self._events = self._events, []
+            if not events:
+                return
+
+            with open(self._path, "a") as trace_file:
+                for event in events:
+                    trace_file.write(json.dumps(event, default=str) + ",\n")
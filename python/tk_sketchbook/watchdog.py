@@ -0,0 +1,182 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+Detection of the UI thread stalls, e.g. SketchBook freezing on a Toolkit
+command or hook.
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+
+import sgtk
+
+from . import tracing
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+
+def sample_stack(thread_ident, max_depth):
+    """
+    Return the current Python stack of a thread, outermost frame first, as a
+    tuple of "function (file:line)" strings.
+
+    :param int thread_ident: The thread's ident.
+    :param int max_depth: The maximum number of innermost frames returned.
+    """
+
+    frame = sys._current_frames().get(thread_ident)
+    stack = []
+    while frame is not None and len(stack) < max_depth:
+        code = frame.f_code
+        stack.append(
+            "%s (%s:%d)"
+            % (code.co_name, os.path.basename(code.co_filename), frame.f_lineno)
+        )
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+class StallWatchdog(object):
+    """
+    Watches the Qt event loop of the UI thread from a background thread.
+
+    A timer on the UI thread beats while the event loop runs. When it hasn't
+    beaten for longer than the threshold, the watchdog samples the Python
+    stack of the UI thread until it beats again. The stall is then logged
+    with its hottest stacks and the command or hook the UI thread was in,
+    see :func:`tracing.get_activity`, and added to the session trace.
+    """
+
+    # sampling modes: seconds between samples, maximum frames per sample
+    MODES = {
+        # cheap enough to always run
+        "light": (0.1, 30),
+        "full": (0.01, 200),
+    }
+
+    # number of hottest stacks logged per stall
+    HOT_STACKS = 3
+
+    def __init__(self, threshold, mode="light"):
+        """
+        :param float threshold: The seconds the event loop can go without
+            running before it's considered stalled.
+        :param str mode: The sampling mode, one of :attr:`MODES`.
+        """
+
+        self._threshold = threshold
+        self._sample_interval, self._max_depth = self.MODES[mode]
+        self._main_thread_ident = threading.current_thread().ident
+        self._last_beat = time.time()
+        self._timer = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """
+        Start the heartbeat timer and the watchdog thread. Must be called from
+        the UI thread.
+        """
+
+        from sgtk.platform.qt import QtCore
+
+        if self._thread is not None:
+            return
+
+        tracing.track_activities(True)
+
+        self._main_thread_ident = threading.current_thread().ident
+        self._last_beat = time.time()
+        self._timer = QtCore.QTimer()
+        self._timer.timeout.connect(self._beat)
+        self._timer.start(max(10, int(self._threshold * 1000 / 4)))
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="SketchBookWatchdog")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop watching the UI thread.
+        """
+
+        if self._thread is None:
+            return
+
+        self._timer.stop()
+        self._timer = None
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        tracing.track_activities(False)
+
+    def _beat(self):
+        """
+        Called by the timer while the event loop runs.
+        """
+
+        self._last_beat = time.time()
+
+    def _run(self):
+        """
+        Check the heartbeat until stopped, sampling the UI thread while it's
+        stalled.
+        """
+
+        stall = None
+        while not self._stopped.is_set():
+            last_beat = self._last_beat
+            if time.time() - last_beat < self._threshold:
+                if stall is not None:
+                    self._report(last_beat, *stall)
+                    stall = None
+                self._stopped.wait(self._threshold / 2)
+                continue
+
+            if stall is None or stall[0] != last_beat:
+                if stall is not None:
+                    # it beat and stalled again between two samples
+                    self._report(last_beat, *stall)
+                activity = tracing.get_activity(self._main_thread_ident)
+                stall = (last_beat, activity, collections.Counter())
+
+            stack = sample_stack(self._main_thread_ident, self._max_depth)
+            if stack:
+                stall[2][stack] += 1
+            self._stopped.wait(self._sample_interval)
+
+    def _report(self, end_time, start_time, activity, stacks):
+        """
+        Log a stall and add it to the session trace.
+
+        :param float end_time: The time the event loop ran again.
+        :param float start_time: The time the event loop last ran before.
+        :param str activity: The spans the UI thread was in, or None.
+        :param stacks: A Counter of the sampled stacks.
+        """
+
+        samples = sum(stacks.values())
+        lines = [
+            "UI thread stalled for %.2fs in %s (%d samples)"
+            % (end_time - start_time, activity or "an unknown activity", samples)
+        ]
+        for stack, count in stacks.most_common(self.HOT_STACKS):
+            lines.append("%d%% of the samples:" % (count * 100 // samples,))
+            lines.extend("    " + frame for frame in stack)
+        logger.warning("\n".join(lines))
+
+        tracing.add_span(
+            "ui.stall", start_time, end_time, activity=activity, samples=samples
+        )
@@ -0,0 +1,217 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import json
+import os
+import threading
+
+import sgtk
+
+from .hashing import hash_file, stat_signature
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+
+class WorkManifest(object):
+    """
+    Persisted record of the size, modification time and content hash of the
+    work files at the time they were last published, used to find the files
+    of a work folder that changed since.
+
+    A folder is scanned in a single directory listing. Files that were never
+    published are new, and files whose size and modification time match the
+    manifest are unchanged, neither are read. Published files whose size or
+    modification time changed are hashed, so files that were touched without
+    their content changing are not reported as changed. The hashes of changed
+    files are kept in the manifest too, so they are only read again once
+    they change.
+    """
+
+    def __init__(self, manifest_path):
+        """
+        :param str manifest_path: The path of the JSON manifest file.
+        """
+
+        self._manifest_path = manifest_path
+        self._lock = threading.Lock()
+        # path key -> {"signature": ..., "hash": ...} of the published files,
+        # and of the changed files hashed since
+        self._published = None
+        self._hashes = None
+
+    def find_changed_files(self, folder, extensions):
+        """
+        Return the files of the folder that are new or changed since they were
+        last published.
+
+        :param str folder: The folder to scan, not recursively.
+        :param extensions: The lower case file extensions to consider.
+
+        :returns: A list of (path, content hash) tuples, sorted by path. The
+            content hash of new files is None, as they are not read.
+        """
+
+        with self._lock:
+            self._load()
+            published = dict(self._published)
+            hashes = dict(self._hashes)
+
+        changed = []
+        updates = {}
+        scanned = set()
+
+        for name, stat in _scan(folder):
+            if not name.lower().endswith(tuple(extensions)):
+                continue
+
+            path = os.path.join(folder, name)
+            key = _key(path)
+            scanned.add(key)
+            signature = list(stat_signature(stat))
+            entry = published.get(key)
+
+            if not entry:
+                # never published, there's no need to read it to know it's
+                # changed
+                changed.append((path, None))
+                continue
+
+            if entry["signature"] == signature:
+                continue
+
+            known = hashes.get(key)
+            if known and known["signature"] == signature:
+                content_hash = known["hash"]
+            else:
+                content_hash = hash_file(path)
+
+            if entry["hash"] == content_hash:
+                # touched but not modified, remember the new signature so the
+                # file isn't read again next time
+                updates[key] = (True, {"signature": signature, "hash": content_hash})
+                continue
+
+            if not known or known["signature"] != signature:
+                updates[key] = (False, {"signature": signature, "hash": content_hash})
+            changed.append((path, content_hash))
+
+        # forget the hashes of the files that have been deleted
+        folder_key = _key(folder)
+        for key in hashes:
+            if os.path.dirname(key) == folder_key and key not in scanned:
+                updates[key] = (False, None)
+
+        if updates:
+            with self._lock:
+                for key, (is_published, entry) in updates.items():
+                    if is_published:
+                        self._published[key] = entry
+                        self._hashes.pop(key, None)
+                    elif entry is None:
+                        self._hashes.pop(key, None)
+                    else:
+                        self._hashes[key] = entry
+                self._save()
+
+        logger.debug("%d changed work files in %s", len(changed), folder)
+        return sorted(changed)
+
+    def record(self, path, content_hash=None):
+        """
+        Record the current state of a work file that has just been published.
+
+        :param str path: The work file path.
+        :param str content_hash: The content hash of the file, e.g. as returned
+            by :meth:`find_changed_files`. Computed if not supplied and not
+            already known for the current version of the file.
+        """
+
+        key = _key(path)
+        signature = list(stat_signature(os.stat(path)))
+        if content_hash is None:
+            with self._lock:
+                self._load()
+                known = self._hashes.get(key)
+            if known and known["signature"] == signature:
+                content_hash = known["hash"]
+            else:
+                content_hash = hash_file(path)
+
+        with self._lock:
+            self._load()
+            self._published[key] = {"signature": signature, "hash": content_hash}
+            self._hashes.pop(key, None)
+            self._save()
+
+    def _load(self):
+        """
+        Read the manifest entries on first use. Must be called with the lock
+        held.
+        """
+
+        if self._published is not None:
+            return
+
+        self._published = {}
+        self._hashes = {}
+        if not os.path.exists(self._manifest_path):
+            return
+
+        try:
+            with open(self._manifest_path, "r") as manifest_file:
+                data = json.load(manifest_file)
+            self._published = data["published"]
+            self._hashes = data["hashes"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring corrupt work manifest %s", self._manifest_path)
+            self._published = {}
+            self._hashes = {}
+
+    def _save(self):
+        """
+        Write the manifest entries. Must be called with the lock held.
+        """
+
+        sgtk.util.filesystem.ensure_folder_exists(os.path.dirname(self._manifest_path))
+        temp_path = "%s.%s.tmp" % (self._manifest_path, os.getpid())
+        with open(temp_path, "w") as manifest_file:
+            json.dump(
+                {"published": self._published, "hashes": self._hashes}, manifest_file
+            )
+        if os.path.exists(self._manifest_path):
+            os.remove(self._manifest_path)
+        os.rename(temp_path, self._manifest_path)
+
+
+def _scan(folder):
+    """
+    Yield the (name, stat result) of the files in the folder, in a single
+    directory listing where supported.
+    """
+
+    if hasattr(os, "scandir"):
+        for entry in os.scandir(folder):
+            if entry.is_file():
+                yield (entry.name, entry.stat())
+        return
+
+    # python 2
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if os.path.isfile(path):
+            yield (name, os.stat(path))
+
+
+def _key(path):
+    """
+    Return the manifest key of a path.
+    """
+
+    return os.path.normcase(os.path.abspath(path))
@@ -0,0 +1,337 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+Write behind saves of work files on slow network storage. SketchBook saves the
+document to a mirror of its work area path on local storage, and a background
+thread copies each save to the work area.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import sgtk
+
+from .file_copy import checksum_file, copy_file
+from .hashing import file_signature
+
+logger = sgtk.LogManager.get_logger(__name__)
+
+# Suffix of the file recording the work area path of a mirrored file.
+TARGET_SUFFIX = ".sbtarget.json"
+
+
+class WriteBehindCache(object):
+    """
+    Local mirrors of work files, flushed to their work area path in the
+    background.
+
+    A flush copies the mirror next to the work file, checks the copy against
+    the checksum of the data read from the mirror and renames it over the work
+    file, so the work file is never left partially written. Saves made while
+    a flush is queued are written by that flush.
+    """
+
+    def __init__(self, mirror_root, on_flushed=None):
+        """
+        :param str mirror_root: The local folder to keep the mirrors in.
+        :param on_flushed: Optional function called with the work area path
+            of a file once a flush of it completed. It is called from the
+            background thread.
+        """
+
+        self._mirror_root = mirror_root
+        self._on_flushed = on_flushed
+        self._condition = threading.Condition()
+        self._thread = None
+        # work area paths to flush, in order, and the one being flushed
+        self._queue = []
+        self._flushing = None
+        # work area path -> error message of its last flush, if it failed
+        self._errors = {}
+        # mirror key -> work area path
+        self._targets = {}
+
+    def mirror_path(self, path):
+        """
+        Return the local mirror path of a work file. The mirror keeps the file
+        name, in a folder specific to the work file's folder.
+
+        :param str path: The work area path.
+        """
+
+        folder = os.path.normcase(os.path.abspath(os.path.dirname(path)))
+        folder_key = hashlib.sha1(folder.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self._mirror_root, folder_key, os.path.basename(path))
+
+    def is_mirror(self, path):
+        """
+        Return True if the path is the mirror of a work file.
+
+        :param str path: The file path.
+        """
+
+        root = os.path.normcase(os.path.abspath(self._mirror_root)) + os.sep
+        return os.path.normcase(os.path.abspath(path)).startswith(root)
+
+    def canonical_path(self, path):
+        """
+        Return the work area path of a file.
+
+        :param str path: A mirror path or a work area path.
+
+        :returns: The work area path of a mirror, any other path unchanged.
+        """
+
+        if not path or not self.is_mirror(path):
+            return path
+
+        key = _key(path)
+        target_path = self._targets.get(key)
+        if target_path is None:
+            target = _read_target(path)
+            if target is None:
+                return path
+            target_path = self._targets[key] = target["path"]
+        return target_path
+
+    def prepare(self, path):
+        """
+        Create the mirror of a work file for SketchBook to save to.
+
+        :param str path: The work area path.
+
+        :returns: The mirror path.
+        """
+
+        mirror_path = self.mirror_path(path)
+        sgtk.util.filesystem.ensure_folder_exists(os.path.dirname(mirror_path))
+
+        target = _read_target(mirror_path)
+        if target is None or target["path"] != path:
+            _write_target(mirror_path, {"path": path, "flushed": None})
+        self._targets[_key(mirror_path)] = path
+        return mirror_path
+
+    def schedule(self, path):
+        """
+        Queue the flush of a saved mirror to its work area path.
+
+        :param str path: The mirror path or the work area path.
+        """
+
+        path = self.canonical_path(path)
+        with self._condition:
+            self._errors.pop(path, None)
+            if path not in self._queue:
+                self._queue.append(path)
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="SketchBookWriteBehind"
+                )
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify_all()
+
+    def recover(self):
+        """
+        Queue the flush of mirrors saved since their last flush, e.g. when
+        SketchBook exited before the flush completed.
+
+        :returns: The number of flushes queued.
+        """
+
+        if not os.path.isdir(self._mirror_root):
+            return 0
+
+        count = 0
+        for folder_key in os.listdir(self._mirror_root):
+            folder = os.path.join(self._mirror_root, folder_key)
+            if not os.path.isdir(folder):
+                continue
+
+            for name in os.listdir(folder):
+                if not name.endswith(TARGET_SUFFIX):
+                    continue
+
+                mirror_path = os.path.join(folder, name[: -len(TARGET_SUFFIX)])
+                target = _read_target(mirror_path)
+                if target is None or not os.path.isfile(mirror_path):
+                    continue
+
+                self._targets[_key(mirror_path)] = target["path"]
+                if target["flushed"] != list(file_signature(mirror_path)):
+                    logger.info(
+                        "Writing the unsaved %s to the work area", target["path"]
+                    )
+                    self.schedule(mirror_path)
+                    count += 1
+
+        return count
+
+    def wait(self, path=None, timeout=None):
+        """
+        Wait for the flushes of a file, or of all the files, to complete.
+
+        :param str path: The mirror path or the work area path. All the queued
+            flushes are waited for if not supplied.
+        :param float timeout: The maximum time to wait, in seconds.
+
+        :returns: An error message if a flush failed or didn't complete in
+            time, else None.
+        """
+
+        path = self.canonical_path(path)
+        end_time = time.time() + timeout if timeout is not None else None
+
+        with self._condition:
+            while self._is_pending(path):
+                remaining = None if end_time is None else end_time - time.time()
+                if remaining is not None and remaining <= 0:
+                    return "Timed out writing %s to the work area." % (
+                        path or "the saved files",
+                    )
+                self._condition.wait(remaining)
+
+            if path is not None:
+                return self._errors.get(path)
+            if self._errors:
+                return "\n".join(sorted(self._errors.values()))
+            return None
+
+    def is_pending(self, path=None):
+        """
+        Return True if a flush of a file, or any flush, is queued or in
+        progress, i.e. the work area doesn't hold the last save yet.
+
+        :param str path: The mirror path or the work area path. Any flush is
+            considered if not supplied.
+        """
+
+        path = self.canonical_path(path)
+        with self._condition:
+            return self._is_pending(path)
+
+    def _is_pending(self, path):
+        """
+        Return True if a flush of the path, or any flush, is queued or in
+        progress. Must be called with the condition held.
+        """
+
+        if path is None:
+            return bool(self._queue) or self._flushing is not None
+        return path in self._queue or self._flushing == path
+
+    def _run(self):
+        """
+        Flush the queued files, forever.
+        """
+
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                path = self._flushing = self._queue.pop(0)
+
+            error = None
+            try:
+                self._flush(path)
+            except Exception as e:
+                error = "Unable to write %s to the work area: %s" % (path, e)
+                logger.warning(error)
+
+            with self._condition:
+                self._flushing = None
+                if error:
+                    self._errors[path] = error
+                self._condition.notify_all()
+
+            if error is None and self._on_flushed:
+                try:
+                    self._on_flushed(path)
+                except Exception:
+                    logger.debug("Flush callback failed for %s", path, exc_info=True)
+
+    def _flush(self, path):
+        """
+        Copy the mirror of a file to its work area path.
+        """
+
+        mirror_path = self.mirror_path(path)
+        signature = file_signature(mirror_path)
+        target = _read_target(mirror_path)
+        if target is not None and target["flushed"] == list(signature):
+            # already written, e.g. scheduled again when the context was
+            # refreshed after the save
+            return
+
+        start_time = time.time()
+
+        folder, name = os.path.split(path)
+        sgtk.util.filesystem.ensure_folder_exists(folder)
+        temp_path = os.path.join(folder, ".%s.%s.sbtmp" % (name, os.getpid()))
+
+        try:
+            result = copy_file(mirror_path, temp_path, methods=("stream",))
+            if file_signature(mirror_path) != signature:
+                # saved again during the copy, the queued flush will write it
+                return
+
+            if checksum_file(temp_path) != result["checksum"]:
+                raise IOError("The written file doesn't match the saved file.")
+
+            if hasattr(os, "replace"):
+                os.replace(temp_path, path)
+            else:
+                # python 2
+                if os.path.exists(path):
+                    os.remove(path)
+                os.rename(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        _write_target(mirror_path, {"path": path, "flushed": list(signature)})
+        logger.debug(
+            "Wrote %s to the work area in %.2fs", path, time.time() - start_time
+        )
+
+
+def _read_target(mirror_path):
+    """
+    Return the record of the work area path of a mirror, or None.
+    """
+
+    try:
+        with open(mirror_path + TARGET_SUFFIX, "r") as target_file:
+            return json.load(target_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _write_target(mirror_path, target):
+    """
+    Write the record of the work area path of a mirror.
+    """
+
+    with open(mirror_path + TARGET_SUFFIX, "w") as target_file:
+        json.dump(target, target_file)
+
+
+def _key(path):
+    """
+    Return the key of a mirror path.
+    """
+
+    return os.path.normcase(os.path.abspath(path))
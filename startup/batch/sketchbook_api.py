@@ -0,0 +1,124 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+Stand-in for the ``sketchbook_api`` module that SketchBook provides to the
+engine, used to run the engine and its hooks outside of SketchBook. See
+batch_publish.py.
+
+The "open" document is a file on disk. It never has unsaved changes, so saving
+it is a no-op and saving it as another file copies it.
+"""
+
+import os
+import shutil
+
+# The path of the open document, None if no document is open.
+_current_path = None
+
+# If False, saving the document to another path is recorded but no file is
+# written, e.g. to publish files without versioning them up.
+save_as_enabled = True
+
+# The paths the document was requested to be saved as, in order.
+saved_as_paths = []
+
+
+def open_file(path):
+    """
+    Make the given file the open document.
+    """
+
+    global _current_path
+    _current_path = os.path.abspath(path)
+
+
+def reset():
+    """
+    Close the open document.
+    """
+
+    global _current_path
+    _current_path = None
+    del saved_as_paths[:]
+
+
+def get_current_path():
+    """
+    Return the path of the open document, or None if no document is open.
+    """
+
+    return _current_path
+
+
+def current_file_path():
+    """
+    Return the path of the open document, or None if no document is open.
+    """
+
+    return _current_path
+
+
+def is_current_document_dirty():
+    """
+    The document is read from disk and can't be modified, so it never has
+    unsaved changes.
+    """
+
+    return False
+
+
+def save_file():
+    """
+    The document never has unsaved changes, so there is nothing to save.
+    """
+
+
+def save_file_as(path):
+    """
+    Save the open document to the given path, and make it the open document.
+    """
+
+    global _current_path
+
+    saved_as_paths.append(path)
+    if not save_as_enabled:
+        return
+
+    if os.path.abspath(path) != _current_path:
+        shutil.copyfile(_current_path, path)
+    _current_path = os.path.abspath(path)
+
+
+def add_image(path):
+    """
+    There is no canvas to add images to outside of SketchBook.
+
+    :raises RuntimeError: Always.
+    """
+
+    raise RuntimeError(
+        "Unable to add '%s' to the document: there is no canvas in batch mode, "
+        "documents can only be opened and published." % (path,)
+    )
+
+
+def refresh_menu(menu):
+    """
+    There is no menu outside of SketchBook.
+    """
+
+
+def host_info():
+    """
+    Return information about the host application.
+    """
+
+    return {"name": "SketchBook (batch)", "version": "unknown"}
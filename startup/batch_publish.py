@@ -0,0 +1,377 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+Publish SketchBook files without SketchBook, e.g. to ingest an archive of
+sketches::
+
+    python batch_publish.py --journal ingest.jsonl /path/to/sketches
+
+Each file is opened in a stand-in of the SketchBook API (see
+batch/sketchbook_api.py) and published with the tk-sketchbook engine's
+configured collector and publish plugins, in a pool of worker processes that
+each run a headless engine.
+
+Every result is appended to the journal as it comes in. Running the same
+command again skips the files the journal records as published, so an
+interrupted ingest resumes where it stopped. Once all files are processed, a
+throughput and failure report is written next to the journal.
+
+Toolkit must be importable, e.g. by running from a ``tank`` shell. The engine
+is started in the context serialized in ``SGTK_CONTEXT`` if set, otherwise in
+the context of the first file each worker publishes.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+# the stand-in sketchbook_api must be found before any engine module imports it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "batch"))
+
+DEFAULT_EXTENSIONS = ".tif,.tiff"
+
+# Journal statuses.
+PUBLISHED = "published"
+FAILED = "failed"
+
+# Options of the current worker process, see _init_worker.
+_worker_options = {}
+
+
+def main(argv=None):
+    """
+    Run the batch publish from the command line.
+
+    :returns: The process exit code, 1 if any file failed to publish.
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Publish SketchBook files with the tk-sketchbook engine."
+    )
+    parser.add_argument("paths", nargs="+", help="Files or directories to publish.")
+    parser.add_argument(
+        "--journal",
+        default="batch_publish.jsonl",
+        help="Journal of the results, used to resume an interrupted run.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=max(1, min(4, multiprocessing.cpu_count())),
+        help="Number of files published in parallel.",
+    )
+    parser.add_argument(
+        "--extensions",
+        default=DEFAULT_EXTENSIONS,
+        help="Comma separated file extensions to publish from directories.",
+    )
+    parser.add_argument(
+        "--no-version-up",
+        action="store_true",
+        help="Don't save published files to their next version.",
+    )
+    args = parser.parse_args(argv)
+
+    extensions = tuple(
+        extension.strip().lower() for extension in args.extensions.split(",")
+    )
+    paths = find_files(args.paths, extensions)
+    done = read_journal(args.journal)
+    # files versioned up by a previous run are not part of the ingest
+    saved_as = set(
+        os.path.abspath(path) for result in done.values() for path in result["saved_as"]
+    )
+    pending = [
+        path
+        for path in paths
+        if done.get(path, {}).get("status") != PUBLISHED and path not in saved_as
+    ]
+
+    print(
+        "%d files to publish, %d already published or versioned up."
+        % (len(pending), len(paths) - len(pending))
+    )
+
+    start_time = time.time()
+    results = []
+    pool = multiprocessing.Pool(
+        args.workers,
+        initializer=_init_worker,
+        initargs=(os.environ.get("SGTK_CONTEXT"), not args.no_version_up),
+    )
+    try:
+        with open(args.journal, "a") as journal_file:
+            # end a line cut short by an interruption
+            if journal_file.tell() and not _ends_with_newline(args.journal):
+                journal_file.write("\n")
+            for result in pool.imap_unordered(_publish_file, pending):
+                journal_file.write(json.dumps(result) + "\n")
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+
+                results.append(result)
+                print(
+                    "[%d/%d] %s %s (%.1fs)"
+                    % (
+                        len(results),
+                        len(pending),
+                        result["status"],
+                        result["path"],
+                        result["seconds"],
+                    )
+                )
+    except KeyboardInterrupt:
+        print("Interrupted, run the same command again to resume.")
+        raise
+    finally:
+        # all results have been received, or the run is abandoned
+        pool.terminate()
+        pool.join()
+
+    report = build_report(results, time.time() - start_time)
+    report_path = os.path.splitext(args.journal)[0] + ".report.json"
+    with open(report_path, "w") as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True)
+
+    print(format_report(report))
+    print("Report written to %s" % (report_path,))
+    return 1 if report["failed"] else 0
+
+
+def find_files(paths, extensions):
+    """
+    Return the files to publish, in a stable order.
+
+    :param paths: Files, and directories to search recursively.
+    :param extensions: The lower case file extensions to publish from
+        directories.
+    """
+
+    files = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for folder, folder_names, file_names in os.walk(path):
+            folder_names.sort()
+            for file_name in sorted(file_names):
+                if file_name.lower().endswith(extensions):
+                    files.append(os.path.join(folder, file_name))
+    return files
+
+
+def read_journal(journal_path):
+    """
+    Read the journal of a previous run.
+
+    :returns: A dictionary of the last result recorded for each path.
+    """
+
+    results = {}
+    if not os.path.exists(journal_path):
+        return results
+
+    with open(journal_path, "r") as journal_file:
+        for line in journal_file:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # a line cut short by an interruption
+                continue
+            results[result["path"]] = result
+    return results
+
+
+def build_report(results, seconds):
+    """
+    Summarize the results of a run.
+
+    :param results: The result dictionaries of the files processed.
+    :param float seconds: The duration of the run.
+    """
+
+    published = [result for result in results if result["status"] == PUBLISHED]
+    published_bytes = sum(result["bytes"] for result in published)
+    return {
+        "files": len(results),
+        "published": len(published),
+        "failed": len(results) - len(published),
+        "publishes": sum(len(result["publishes"]) for result in published),
+        "bytes": published_bytes,
+        "seconds": seconds,
+        "files_per_minute": len(published) * 60.0 / seconds if seconds else None,
+        "mb_per_second": (
+            published_bytes / (1024.0 * 1024.0) / seconds if seconds else None
+        ),
+        "mean_file_seconds": (
+            sum(result["seconds"] for result in published) / len(published)
+            if published
+            else None
+        ),
+        "failures": [
+            {"path": result["path"], "phase": result["phase"], "error": result["error"]}
+            for result in results
+            if result["status"] != PUBLISHED
+        ],
+    }
+
+
+def format_report(report):
+    """
+    Return a plain text version of a report.
+    """
+
+    lines = [
+        "%d of %d files published (%d publishes) in %.1fs."
+        % (report["published"], report["files"], report["publishes"], report["seconds"])
+    ]
+    if report["published"]:
+        lines.append(
+            "%.1f files/minute, %.1f MB/s, %.1fs per file."
+            % (
+                report["files_per_minute"],
+                report["mb_per_second"],
+                report["mean_file_seconds"],
+            )
+        )
+    for failure in report["failures"]:
+        lines.append(
+            "FAILED %s during %s: %s"
+            % (failure["path"], failure["phase"], failure["error"].splitlines()[-1])
+        )
+    return "\n".join(lines)
+
+
+def _ends_with_newline(path):
+    """
+    Return True if the file ends with a newline.
+    """
+
+    with open(path, "rb") as file_handle:
+        file_handle.seek(-1, os.SEEK_END)
+        return file_handle.read(1) == b"\n"
+
+
+def _init_worker(serialized_context, save_as_enabled):
+    """
+    Set up a worker process. The engine is started with the first file.
+    """
+
+    os.environ["SGTK_SKETCHBOOK_HEADLESS"] = "1"
+
+    import sketchbook_api
+
+    sketchbook_api.save_as_enabled = save_as_enabled
+    _worker_options["context"] = serialized_context
+
+
+def _get_engine(path):
+    """
+    Return the worker's engine, starting it if needed.
+    """
+
+    import sgtk
+    from sgtk.authentication import ShotgunAuthenticator
+
+    engine = sgtk.platform.current_engine()
+    if engine:
+        return engine
+
+    sgtk.LogManager().initialize_base_file_handler("tk-sketchbook-batch")
+    if not sgtk.get_authenticated_user():
+        sgtk.set_authenticated_user(ShotgunAuthenticator().get_default_user())
+
+    if _worker_options.get("context"):
+        context = sgtk.context.deserialize(_worker_options["context"])
+    else:
+        tk = sgtk.sgtk_from_path(path)
+        context = tk.context_from_path(path)
+
+    return sgtk.platform.start_engine("tk-sketchbook", context.sgtk, context)
+
+
+def _publish_file(path):
+    """
+    Publish a single file with the engine's publisher.
+
+    :returns: The result dictionary written to the journal.
+    """
+
+    import sketchbook_api
+
+    start_time = time.time()
+    result = {
+        "path": path,
+        "status": FAILED,
+        "phase": "start",
+        "error": None,
+        "bytes": 0,
+        "publishes": [],
+        "saved_as": [],
+        "worker": os.getpid(),
+    }
+
+    try:
+        result["bytes"] = os.path.getsize(path)
+
+        sketchbook_api.reset()
+        sketchbook_api.open_file(path)
+
+        engine = _get_engine(path)
+        engine.refresh_context()
+
+        publish_app = engine.apps.get("tk-multi-publish2")
+        if not publish_app:
+            raise RuntimeError(
+                "The publisher is not configured in context %s." % (engine.context,)
+            )
+
+        manager = publish_app.create_publish_manager()
+
+        result["phase"] = "collect"
+        manager.collect_session()
+
+        result["phase"] = "validate"
+        failures = manager.validate()
+        if failures:
+            raise RuntimeError(
+                "\n".join("%s: %s" % (task.name, error) for (task, error) in failures)
+            )
+
+        result["phase"] = "publish"
+        manager.publish()
+
+        result["phase"] = "finalize"
+        manager.finalize()
+
+        result["publishes"] = [
+            item.properties["sg_publish_data"]["id"]
+            for item in manager.tree
+            if item.properties.get("sg_publish_data")
+        ]
+        result["saved_as"] = list(sketchbook_api.saved_as_paths)
+        result["status"] = PUBLISHED
+        result["phase"] = None
+    except Exception:
+        result["error"] = traceback.format_exc()
+    finally:
+        result["seconds"] = time.time() - start_time
+
+    return result
+
+
+if __name__ == "__main__":
+    sys.exit(main())
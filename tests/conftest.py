@@ -0,0 +1,27 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+"""
+Makes the engine's modules importable by the tests. The tests need tk-core on
+the Python path, and use the batch mode stand-in of the SketchBook API, see
+startup/batch/sketchbook_api.py.
+"""
+
+import os
+import sys
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (
+    os.path.join(repo_root, "python"),
+    os.path.join(repo_root, "startup"),
+    os.path.join(repo_root, "startup", "batch"),
+):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,58 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import logging
+
+try:
+    import queue
+except ImportError:
+    # python 2
+    import Queue as queue
+
+import pytest
+
+from tk_sketchbook import async_logging
+
+
+@pytest.fixture
+def queued_logger():
+    record_queue = queue.Queue()
+    logger = logging.getLogger("test_async_logging")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    handler = async_logging._LazyQueueHandler(record_queue)
+    logger.addHandler(handler)
+    yield logger, record_queue
+    logger.removeHandler(handler)
+
+
+def test_message_is_merged_when_logged(queued_logger):
+    logger, record_queue = queued_logger
+    data = {"code": "sketch"}
+
+    logger.debug("Publishing %s", data)
+    data["code"] = "changed"
+
+    record = record_queue.get_nowait()
+    assert record.getMessage() == "Publishing {'code': 'sketch'}"
+    assert record.args is None
+
+
+def test_traceback_is_rendered_when_logged(queued_logger):
+    logger, record_queue = queued_logger
+
+    try:
+        raise ValueError("bad value")
+    except ValueError:
+        logger.exception("Failed")
+
+    record = record_queue.get_nowait()
+    assert record.exc_info is None
+    assert "ValueError: bad value" in record.exc_text
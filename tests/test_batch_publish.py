@@ -0,0 +1,114 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import json
+import os
+
+import pytest
+
+import batch_publish
+import sketchbook_api
+
+
+def make_result(path, status=batch_publish.PUBLISHED, **values):
+    result = {
+        "path": path,
+        "status": status,
+        "phase": None if status == batch_publish.PUBLISHED else "validate",
+        "error": None if status == batch_publish.PUBLISHED else "Traceback\nError: x",
+        "bytes": 1024 * 1024,
+        "publishes": [1, 2],
+        "saved_as": [],
+        "seconds": 2.0,
+    }
+    result.update(values)
+    return result
+
+
+def test_find_files(tmp_path):
+    (tmp_path / "b").mkdir()
+    (tmp_path / "a").mkdir()
+    for name in ("b/2.tif", "b/1.TIFF", "a/3.tif", "a/notes.txt"):
+        (tmp_path / name).write_text("")
+    single_file = tmp_path / "sketch.png"
+    single_file.write_text("")
+
+    files = batch_publish.find_files(
+        [str(tmp_path / "b"), str(tmp_path / "a"), str(single_file)],
+        (".tif", ".tiff"),
+    )
+
+    assert files == [
+        str(tmp_path / "b" / "1.TIFF"),
+        str(tmp_path / "b" / "2.tif"),
+        str(tmp_path / "a" / "3.tif"),
+        # files given explicitly are published whatever their extension
+        str(single_file),
+    ]
+
+
+def test_read_missing_journal(tmp_path):
+    assert batch_publish.read_journal(str(tmp_path / "journal.jsonl")) == {}
+
+
+def test_read_journal_keeps_last_result(tmp_path):
+    journal_path = tmp_path / "journal.jsonl"
+    lines = [
+        json.dumps(make_result("/a.tif", batch_publish.FAILED)),
+        json.dumps(make_result("/b.tif")),
+        json.dumps(make_result("/a.tif")),
+        # cut short by an interruption
+        json.dumps(make_result("/c.tif"))[:20],
+    ]
+    journal_path.write_text("\n".join(lines))
+
+    results = batch_publish.read_journal(str(journal_path))
+
+    assert sorted(results) == ["/a.tif", "/b.tif"]
+    assert results["/a.tif"]["status"] == batch_publish.PUBLISHED
+
+
+def test_build_report():
+    results = [
+        make_result("/a.tif", seconds=1.0),
+        make_result("/b.tif", seconds=3.0),
+        make_result("/c.tif", batch_publish.FAILED),
+    ]
+
+    report = batch_publish.build_report(results, 60.0)
+
+    assert report["files"] == 3
+    assert report["published"] == 2
+    assert report["failed"] == 1
+    assert report["publishes"] == 4
+    assert report["bytes"] == 2 * 1024 * 1024
+    assert report["files_per_minute"] == pytest.approx(2.0)
+    assert report["mb_per_second"] == pytest.approx(2.0 / 60.0)
+    assert report["mean_file_seconds"] == pytest.approx(2.0)
+    assert report["failures"] == [
+        {"path": "/c.tif", "phase": "validate", "error": "Traceback\nError: x"}
+    ]
+    assert "FAILED /c.tif during validate: Error: x" in batch_publish.format_report(
+        report
+    )
+
+
+def test_build_report_without_results():
+    report = batch_publish.build_report([], 0)
+
+    assert report["files"] == 0
+    assert report["files_per_minute"] is None
+    assert report["mean_file_seconds"] is None
+    assert batch_publish.format_report(report).startswith("0 of 0 files published")
+
+
+def test_add_image_is_rejected():
+    with pytest.raises(RuntimeError, match="no canvas in batch mode"):
+        sketchbook_api.add_image(os.path.join("images", "reference.png"))
@@ -0,0 +1,118 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import os
+
+import pytest
+
+from tk_sketchbook import file_copy
+from tk_sketchbook.file_copy import checksum_file, copy_file
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "sketch.tif"
+    path.write_bytes(os.urandom(3 * 1024 * 1024 + 17))
+    return str(path)
+
+
+@pytest.fixture
+def destination(tmp_path):
+    return str(tmp_path / "publish" / "sketch.v001.tif")
+
+
+def read(path):
+    with open(path, "rb") as document_file:
+        return document_file.read()
+
+
+@pytest.fixture(autouse=True)
+def publish_folder(destination):
+    os.makedirs(os.path.dirname(destination))
+
+
+def test_stream_copy(source, destination):
+    result = copy_file(source, destination, methods=("stream",))
+
+    assert read(destination) == read(source)
+    assert result["method"] == "stream"
+    assert result["bytes"] == os.path.getsize(source)
+    assert result["checksum"] == checksum_file(source)
+
+
+def test_existing_destination_is_replaced(source, destination):
+    with open(destination, "wb") as destination_file:
+        destination_file.write(b"previous publish" * 1024 * 1024)
+
+    copy_file(source, destination)
+
+    assert read(destination) == read(source)
+
+
+def test_unsupported_method_falls_back(source, destination, monkeypatch):
+    def unsupported(source, destination):
+        raise NotImplementedError("not on this file system")
+
+    monkeypatch.setattr(file_copy, "_reflink", unsupported)
+    monkeypatch.setattr(file_copy, "_copy_file_range", unsupported)
+
+    result = copy_file(source, destination)
+
+    assert result["method"] == "stream"
+    assert read(destination) == read(source)
+
+
+def test_short_copy_file_range_falls_back(source, destination, monkeypatch):
+    if not hasattr(os, "copy_file_range"):
+        pytest.skip("copy_file_range is not available")
+
+    def stopping_copy_file_range(source_fd, destination_fd, count, *args):
+        # copy the first megabyte, then report nothing left to copy
+        if os.fstat(destination_fd).st_size:
+            return 0
+        data = os.read(source_fd, 1024 * 1024)
+        return os.write(destination_fd, data)
+
+    monkeypatch.setattr(os, "copy_file_range", stopping_copy_file_range)
+
+    with pytest.raises(IOError):
+        file_copy._copy_file_range(source, destination)
+
+    result = copy_file(source, destination, methods=("copy_file_range", "stream"))
+
+    assert result["method"] == "stream"
+    assert read(destination) == read(source)
+
+
+def test_short_copy_falls_back(source, destination, monkeypatch):
+    def truncating_copy(source, destination):
+        with open(source, "rb") as source_file:
+            with open(destination, "wb") as destination_file:
+                destination_file.write(source_file.read(1024))
+
+    monkeypatch.setattr(file_copy, "_reflink", truncating_copy)
+
+    result = copy_file(source, destination, methods=("reflink", "stream"))
+
+    assert result["method"] == "stream"
+    assert read(destination) == read(source)
+
+
+def test_failed_copy_raises(source, destination, monkeypatch):
+    def failing_copy(source, destination):
+        with open(destination, "wb") as destination_file:
+            destination_file.write(b"partial")
+        raise IOError("disk full")
+
+    monkeypatch.setattr(file_copy, "_stream_copy", failing_copy)
+
+    with pytest.raises(IOError, match="disk full"):
+        copy_file(source, destination, methods=("stream",))
+    assert not os.path.exists(destination)
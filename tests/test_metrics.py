@@ -0,0 +1,146 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import os
+import types
+
+import pytest
+
+from tk_sketchbook import metrics
+from tk_sketchbook.metrics import MetricsExporter, MetricsRegistry
+
+DEFINITIONS = {
+    "test_duration_seconds": ("histogram", "Time to test.", (0.1, 1.0)),
+    "test_calls": ("counter", "Calls to test.", None),
+}
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry(DEFINITIONS)
+
+
+@pytest.fixture(autouse=True)
+def disable_metrics():
+    yield
+    metrics.disable()
+
+
+def test_empty_registry(registry):
+    assert registry.render() == (
+        "# TYPE test_calls counter\n"
+        "# HELP test_calls Calls to test.\n"
+        "# TYPE test_duration_seconds histogram\n"
+        "# HELP test_duration_seconds Time to test.\n"
+        "# EOF\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    for value in (0.05, 0.5, 0.5, 5.0):
+        registry.observe("test_duration_seconds", value, {"command": "Publish..."})
+
+    lines = registry.render().splitlines()
+
+    labels = 'command="Publish..."'
+    assert lines[4:10] == [
+        'test_duration_seconds_bucket{%s,le="0.1"} 1' % (labels,),
+        'test_duration_seconds_bucket{%s,le="1.0"} 3' % (labels,),
+        'test_duration_seconds_bucket{%s,le="+Inf"} 4' % (labels,),
+        "test_duration_seconds_count{%s} 4" % (labels,),
+        "test_duration_seconds_sum{%s} 6.05" % (labels,),
+        "# EOF",
+    ]
+
+
+def test_counters_by_label_values(registry):
+    registry.inc("test_calls", 1, {"function": "save_file"})
+    registry.inc("test_calls", 2, {"function": "save_file"})
+    registry.inc("test_calls", 1, {"function": "current_file_path"})
+
+    lines = registry.render().splitlines()
+
+    assert lines[2:4] == [
+        'test_calls_total{function="current_file_path"} 1',
+        'test_calls_total{function="save_file"} 3',
+    ]
+
+
+def test_label_values_are_escaped(registry):
+    registry.inc("test_calls", 1, {"path": 'C:\\work\\"sketch"\n'})
+
+    assert 'test_calls_total{path="C:\\\\work\\\\\\"sketch\\"\\n"} 1' in (
+        registry.render()
+    )
+
+
+def test_disabled_metrics_are_not_recorded():
+    metrics.observe("sketchbook_refresh_context_duration_seconds", 1.0)
+    with metrics.timer("sketchbook_refresh_context_duration_seconds"):
+        pass
+
+    registry = metrics.enable()
+
+    assert "sketchbook_refresh_context_duration_seconds_count" not in (
+        registry.render()
+    )
+
+
+def test_timer_observes_its_block():
+    registry = metrics.enable()
+
+    with metrics.timer("sketchbook_command_duration_seconds", command="Publish..."):
+        pass
+
+    assert (
+        'sketchbook_command_duration_seconds_count{command="Publish..."} 1'
+        in registry.render()
+    )
+
+
+def test_count_calls_until_disabled():
+    def save_file():
+        return "saved"
+
+    module = types.ModuleType("fake_sketchbook_api")
+    module.save_file = save_file
+    module._private = save_file
+    registry = metrics.enable()
+
+    metrics.count_calls(module, "sketchbook_host_api_calls")
+    metrics.count_calls(module, "sketchbook_host_api_calls")
+    assert module.save_file() == "saved"
+    module._private()
+
+    assert (
+        'sketchbook_host_api_calls_total{function="save_file"} 1' in registry.render()
+    )
+    assert module._private is save_file
+
+    metrics.disable()
+
+    assert module.save_file is save_file
+
+
+def test_exporter_writes_the_file(registry, tmp_path):
+    path = str(tmp_path / "textfile" / "sketchbook.prom")
+    registry.inc("test_calls", 1, {})
+    exporter = MetricsExporter(registry, path=path, interval=60)
+
+    exporter.start()
+    registry.inc("test_calls", 1, {})
+    exporter.stop()
+
+    with open(path) as metrics_file:
+        data = metrics_file.read()
+    # written a last time when stopped
+    assert "test_calls_total 2\n" in data
+    assert data.endswith("# EOF\n")
+    assert os.listdir(os.path.dirname(path)) == ["sketchbook.prom"]
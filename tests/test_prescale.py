@@ -0,0 +1,35 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import os
+import time
+
+from tk_sketchbook.prescale import PrescaleCache
+
+
+def write(folder, name, size, seconds_ago):
+    path = folder / name
+    path.write_bytes(b"x" * size)
+    used_time = time.time() - seconds_ago
+    os.utime(str(path), (used_time, used_time))
+    return path
+
+
+def test_evict_skips_copies_being_written(tmp_path):
+    cache = PrescaleCache(str(tmp_path), 150)
+    temp_path = write(tmp_path, "abc-1024.png.1.2.tmp.png", 100, 30)
+    old_path = write(tmp_path, "def-1024.png", 100, 20)
+    new_path = write(tmp_path, "ghi-1024.png", 100, 10)
+
+    cache._evict()
+
+    assert temp_path.exists()
+    assert not old_path.exists()
+    assert new_path.exists()
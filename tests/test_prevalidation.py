@@ -0,0 +1,137 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import os
+import threading
+import time
+
+import pytest
+
+from tk_sketchbook.prevalidation import ValidationCache
+
+
+@pytest.fixture
+def document(tmp_path):
+    path = tmp_path / "sketch.v001.tif"
+    path.write_bytes(b"saved")
+    return str(path)
+
+
+def save(path, data, offset):
+    """
+    Save the document again, with a modification time the given number of
+    seconds later.
+    """
+
+    with open(path, "wb") as document_file:
+        document_file.write(data)
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime + offset, stat.st_mtime + offset))
+
+
+def wait_for_checks(cache, path):
+    # the checks of the current version are waited for by the look up
+    cache.lookup("size", path, timeout=10)
+
+
+@pytest.fixture
+def cache():
+    cache = ValidationCache()
+    cache.register("size", os.path.getsize)
+    return cache
+
+
+def test_check_result_is_cached(cache, document):
+    cache.schedule(document)
+
+    assert cache.lookup("size", document, timeout=10) == (True, len(b"saved"))
+
+
+def test_unknown_check_is_not_found(cache, document):
+    cache.schedule(document)
+    wait_for_checks(cache, document)
+
+    assert cache.lookup("next_version", document) == (False, None)
+
+
+def test_unscheduled_document_is_not_found(cache, document):
+    assert cache.lookup("size", document) == (False, None)
+    assert cache.lookup("size", document + ".missing") == (False, None)
+
+
+def test_stale_result_is_not_returned(cache, document):
+    cache.schedule(document)
+    wait_for_checks(cache, document)
+
+    # saved again without the checks being scheduled
+    save(document, b"saved again", 10)
+
+    assert cache.lookup("size", document) == (False, None)
+
+
+def test_touched_document_is_checked_again(cache, document):
+    cache.schedule(document)
+    wait_for_checks(cache, document)
+
+    # same size, newer modification time
+    save(document, b"SAVED", 10)
+    cache.schedule(document)
+
+    assert cache.lookup("size", document, timeout=10) == (True, len(b"SAVED"))
+
+
+def test_lookup_waits_for_running_checks(document):
+    started = threading.Event()
+    resume = threading.Event()
+
+    def slow_check(path):
+        started.set()
+        resume.wait(10)
+        return "checked"
+
+    cache = ValidationCache()
+    cache.register("slow", slow_check)
+    cache.schedule(document)
+    assert started.wait(10)
+
+    # not found once the wait times out
+    start_time = time.time()
+    assert cache.lookup("slow", document, timeout=0.2) == (False, None)
+    assert 0.2 <= time.time() - start_time < 5
+
+    threading.Timer(0.1, resume.set).start()
+    assert cache.lookup("slow", document) == (True, "checked")
+
+
+def test_failed_check_is_not_found(cache, document):
+    def failing_check(path):
+        raise RuntimeError("The publisher is not configured.")
+
+    cache.register("failing", failing_check)
+    cache.schedule(document)
+    wait_for_checks(cache, document)
+
+    assert cache.lookup("failing", document) == (False, None)
+    # the other checks still ran
+    assert cache.lookup("size", document) == (True, len(b"saved"))
+
+
+def test_checks_run_once_per_version(document):
+    calls = []
+    cache = ValidationCache()
+    cache.register("calls", calls.append)
+
+    cache.schedule(document)
+    wait_for_checks(cache, document)
+    cache.lookup("calls", document, timeout=10)
+    cache.schedule(document)
+    cache.lookup("calls", document, timeout=10)
+
+    assert calls == [document]
@@ -0,0 +1,70 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import os
+
+from tk_sketchbook.publish_profile import PublishProfile
+
+
+class FakeConnection(object):
+    def _call_rpc(self, method, params):
+        return method
+
+
+def measure_calls(profile, connection):
+    with profile.measure("Plugin", "publish", connection):
+        connection._call_rpc("create", None)
+        connection._call_rpc("update", None)
+        other_connection = FakeConnection()
+        other_connection._call_rpc("find", None)
+        os.stat(os.getcwd())
+    return profile.records()[0]
+
+
+def test_calls_are_not_counted_by_default():
+    stat = os.stat
+    connection = FakeConnection()
+
+    record = measure_calls(PublishProfile(), connection)
+
+    assert record["runs"] == 1
+    assert record["round_trips"] == 0
+    assert record["stat_calls"] == 0
+    assert "_call_rpc" not in vars(connection)
+    assert os.stat is stat
+
+
+def test_round_trips_are_counted_on_the_connection():
+    stat = os.stat
+    connection = FakeConnection()
+
+    record = measure_calls(PublishProfile(count_calls=True), connection)
+
+    assert record["round_trips"] == 2
+    assert record["stat_calls"] >= 1
+    # the counters are removed once the phase is measured
+    assert "_call_rpc" not in vars(connection)
+    assert os.stat is stat
+
+
+def test_measurements_add_up():
+    profile = PublishProfile()
+    for _ in range(3):
+        with profile.measure("Plugin", "validate"):
+            pass
+    with profile.measure("Plugin", "accept"):
+        pass
+
+    records = profile.records("Plugin")
+
+    assert [(record["phase"], record["runs"]) for record in records] == [
+        ("accept", 1),
+        ("validate", 3),
+    ]
@@ -0,0 +1,201 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import os
+import random
+
+import pytest
+
+from tk_sketchbook import publish_storage
+
+BLOCK_SIZE = publish_storage.BLOCK_SIZE
+
+
+def write_document(path, data):
+    with open(path, "wb") as document_file:
+        document_file.write(data)
+    return str(path)
+
+
+def read(path):
+    with open(path, "rb") as document_file:
+        return document_file.read()
+
+
+@pytest.fixture
+def document_data():
+    generator = random.Random(1)
+    # not a whole number of blocks, so the last block is short
+    return bytes(
+        bytearray(generator.getrandbits(8) for _ in range(10 * BLOCK_SIZE + 123))
+    )
+
+
+@pytest.fixture
+def folders(tmp_path):
+    publish_folder = tmp_path / "publish"
+    publish_folder.mkdir()
+    return (tmp_path, str(publish_folder), str(tmp_path / "cache"))
+
+
+def test_plain_file_is_materialized_in_place(folders, document_data):
+    work_folder, _, cache_dir = folders
+    path = write_document(work_folder / "doc.tif", document_data)
+
+    assert not publish_storage.is_stored(path)
+    assert publish_storage.materialize(path, cache_dir) == path
+
+
+def test_first_publish_is_stored_as_base(folders, document_data):
+    work_folder, publish_folder, cache_dir = folders
+    source = write_document(work_folder / "doc.tif", document_data)
+    destination = os.path.join(publish_folder, "doc.v001.tif")
+
+    result = publish_storage.store_delta(source, destination, "doc")
+
+    assert result["mode"] == "base"
+    assert result["base"] is None
+    assert not publish_storage.is_stored(destination)
+    assert read(destination) == document_data
+
+
+def test_delta_round_trip(folders, document_data):
+    work_folder, publish_folder, cache_dir = folders
+    source = write_document(work_folder / "doc.tif", document_data)
+    base = os.path.join(publish_folder, "doc.v001.tif")
+    publish_storage.store_delta(source, base, "doc")
+
+    # change one block and grow the document
+    changed = bytearray(document_data)
+    changed[3 * BLOCK_SIZE : 3 * BLOCK_SIZE + 10] = b"0123456789"
+    changed = bytes(changed) + b"appended"
+    write_document(work_folder / "doc.tif", changed)
+    destination = os.path.join(publish_folder, "doc.v002.tif")
+
+    result = publish_storage.store_delta(source, destination, "doc")
+
+    assert result["mode"] == "delta"
+    assert result["base"] == base
+    assert result["bytes"] < len(changed)
+    assert publish_storage.is_stored(destination)
+    assert read(publish_storage.materialize(destination, cache_dir)) == changed
+
+
+def test_changed_document_becomes_new_base(folders, document_data):
+    work_folder, publish_folder, _ = folders
+    source = write_document(work_folder / "doc.tif", document_data)
+    publish_storage.store_delta(source, os.path.join(publish_folder, "a.tif"), "doc")
+
+    write_document(work_folder / "doc.tif", document_data[::-1])
+    destination = os.path.join(publish_folder, "b.tif")
+    result = publish_storage.store_delta(source, destination, "doc")
+
+    assert result["mode"] == "base"
+    assert read(destination) == document_data[::-1]
+
+
+def test_delta_without_base_is_not_materialized(folders, document_data):
+    work_folder, publish_folder, cache_dir = folders
+    source = write_document(work_folder / "doc.tif", document_data)
+    base = os.path.join(publish_folder, "doc.v001.tif")
+    publish_storage.store_delta(source, base, "doc")
+    destination = os.path.join(publish_folder, "doc.v002.tif")
+    publish_storage.store_delta(source, destination, "doc")
+
+    os.remove(base)
+
+    with pytest.raises(IOError, match="has been deleted"):
+        publish_storage.materialize(destination, cache_dir)
+
+
+def test_compressed_round_trip(monkeypatch, folders, document_data):
+    # several chunks, compressed in more than one batch
+    monkeypatch.setattr(publish_storage, "CHUNK_SIZE", BLOCK_SIZE)
+    work_folder, publish_folder, cache_dir = folders
+    data = document_data + b"\0" * (8 * BLOCK_SIZE)
+    source = write_document(work_folder / "doc.tif", data)
+    destination = os.path.join(publish_folder, "doc.v001.tif")
+
+    result = publish_storage.store_compressed(source, destination)
+
+    assert result["mode"] == "compressed"
+    assert result["bytes"] < len(data)
+    assert publish_storage.is_stored(destination)
+    assert read(publish_storage.materialize(destination, cache_dir)) == data
+
+
+def test_materialized_file_is_reused(folders, document_data):
+    work_folder, publish_folder, cache_dir = folders
+    source = write_document(work_folder / "doc.tif", document_data)
+    destination = os.path.join(publish_folder, "doc.v001.tif")
+    publish_storage.store_compressed(source, destination)
+
+    first = publish_storage.materialize(destination, cache_dir)
+    second = publish_storage.materialize(destination, cache_dir)
+
+    assert first == second
+    assert os.listdir(cache_dir) == [os.path.basename(first)]
+
+
+def test_republished_base_is_stored_in_full(folders, document_data):
+    work_folder, publish_folder, cache_dir = folders
+    source = write_document(work_folder / "doc.tif", document_data)
+    base = os.path.join(publish_folder, "doc.v001.tif")
+    publish_storage.store_delta(source, base, "doc")
+
+    # the same version is published again, e.g. after a failed registration
+    changed = document_data[:-10] + b"0123456789"
+    write_document(work_folder / "doc.tif", changed)
+    result = publish_storage.store_delta(source, base, "doc")
+
+    assert result["mode"] == "base"
+    assert not publish_storage.is_stored(base)
+    assert read(base) == changed
+
+    destination = os.path.join(publish_folder, "doc.v002.tif")
+    result = publish_storage.store_delta(source, destination, "doc")
+    assert result["mode"] == "delta"
+    assert read(publish_storage.materialize(destination, cache_dir)) == changed
+
+
+def test_delta_of_replaced_base_is_not_materialized(folders, document_data):
+    work_folder, publish_folder, cache_dir = folders
+    source = write_document(work_folder / "doc.tif", document_data)
+    base = os.path.join(publish_folder, "doc.v001.tif")
+    publish_storage.store_delta(source, base, "doc")
+    destination = os.path.join(publish_folder, "doc.v002.tif")
+    publish_storage.store_delta(source, destination, "doc")
+
+    write_document(base, document_data[::-1])
+
+    with pytest.raises(ValueError, match="doesn't match"):
+        publish_storage.materialize(destination, cache_dir)
+    assert not os.path.exists(cache_dir) or os.listdir(cache_dir) == []
+
+
+def test_least_recently_materialized_files_are_evicted(folders, document_data):
+    work_folder, publish_folder, cache_dir = folders
+    paths = []
+    for index, data in enumerate((document_data, document_data[::-1])):
+        source = write_document(work_folder / ("doc%d.tif" % (index,)), data)
+        destination = os.path.join(publish_folder, "doc%d.v001.tif" % (index,))
+        publish_storage.store_compressed(source, destination)
+        paths.append(destination)
+
+    first = publish_storage.materialize(paths[0], cache_dir, len(document_data))
+    old_time = os.path.getmtime(first) - 10
+    os.utime(first, (old_time, old_time))
+    second = publish_storage.materialize(paths[1], cache_dir, len(document_data))
+
+    assert os.listdir(cache_dir) == [os.path.basename(second)]
+
+    # a file larger than the cache is still returned
+    third = publish_storage.materialize(paths[0], cache_dir, 1)
+    assert read(third) == document_data
@@ -0,0 +1,81 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import threading
+
+from tk_sketchbook.published_files import PublishedFileCache
+
+
+class Context(object):
+    project = {"type": "Project", "id": 1}
+    entity = {"type": "Asset", "id": 2}
+
+
+class Shotgun(object):
+    def __init__(self, publishes=None, error=None):
+        self.release = threading.Event()
+        self.finds = []
+        self._publishes = publishes or []
+        self._error = error
+
+    def find(self, entity_type, filters, fields):
+        self.finds.append((entity_type, filters))
+        self.release.wait(5)
+        if self._error:
+            raise self._error
+        return self._publishes
+
+
+def _wait_for_prefetch():
+    for thread in threading.enumerate():
+        if thread.name == "SketchBookPrefetchPublishes":
+            thread.join(5)
+
+
+def test_lookups_wait_for_the_background_prefetch():
+    shotgun = Shotgun()
+    context = Context()
+
+    cache = PublishedFileCache.prefetch_in_background(lambda: shotgun, context)
+
+    # still being fetched, the lookup goes to Shotgun
+    assert cache.find_conflicting(None, context, "/work/a.tif", "a") is None
+
+    shotgun.release.set()
+    _wait_for_prefetch()
+
+    assert shotgun.finds == [
+        (
+            "PublishedFile",
+            [["project", "is", context.project], ["entity", "is", context.entity]],
+        )
+    ]
+    assert cache._publishes == []
+
+
+def test_failed_prefetch_leaves_lookups_to_shotgun():
+    shotgun = Shotgun(error=RuntimeError("offline"))
+    shotgun.release.set()
+    context = Context()
+
+    cache = PublishedFileCache.prefetch_in_background(lambda: shotgun, context)
+    _wait_for_prefetch()
+
+    assert cache.find_conflicting(None, context, "/work/a.tif", "a") is None
+
+
+def test_other_contexts_are_not_answered():
+    context = Context()
+    other_context = Context()
+    other_context.entity = {"type": "Asset", "id": 3}
+
+    cache = PublishedFileCache(context, [])
+
+    assert cache.find_conflicting(None, other_context, "/work/a.tif", "a") is None
@@ -0,0 +1,109 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import pytest
+
+import sgtk
+import sketchbook_api
+from tk_sketchbook.save_ledger import SaveLedger, get_save_ledger
+
+
+class FakeDocument(object):
+    """
+    Records the writes of the document made through a ledger.
+    """
+
+    def __init__(self):
+        self.dirty = True
+        self.writes = []
+
+    def save_file(self):
+        self.writes.append(("save", None))
+        self.dirty = False
+
+    def save_file_as(self, path):
+        self.writes.append(("save as", path))
+        self.dirty = False
+
+
+@pytest.fixture
+def document(monkeypatch):
+    document = FakeDocument()
+    monkeypatch.setattr(
+        sketchbook_api, "is_current_document_dirty", lambda: document.dirty
+    )
+    return document
+
+
+@pytest.fixture
+def ledger(document):
+    return SaveLedger(document.save_file, document.save_file_as)
+
+
+def test_save_writes_dirty_document(document, ledger):
+    ledger.save()
+
+    assert document.writes == [("save", None)]
+    assert ledger.write_count == 1
+
+
+def test_save_skips_clean_document(document, ledger):
+    document.dirty = False
+
+    ledger.save()
+
+    assert document.writes == []
+    assert ledger.write_count == 0
+    assert "skipped" in ledger.summary()
+
+
+def test_deferred_save_is_merged_into_save_as(document, ledger):
+    ledger.save(defer=True)
+    ledger.save_as("/work/doc.v002.tif")
+    ledger.flush()
+
+    assert document.writes == [("save as", "/work/doc.v002.tif")]
+    assert ledger.write_count == 1
+    assert "merged into save as" in ledger.summary()
+
+
+def test_flush_writes_unmerged_deferred_save(document, ledger):
+    ledger.save(defer=True)
+    assert document.writes == []
+
+    ledger.flush()
+
+    assert document.writes == [("save", None)]
+
+
+def test_summary_counts_written_saves(document, ledger):
+    ledger.save()
+    ledger.save()
+    ledger.save_as("/work/doc.v002.tif")
+
+    assert ledger.summary().endswith("2 of 3 requested saves written")
+
+
+def test_get_save_ledger_is_shared_by_item(monkeypatch, document):
+    class Engine(object):
+        save_file = document.save_file
+        save_file_as = document.save_file_as
+
+    class Item(object):
+        properties = {}
+
+    monkeypatch.setattr(sgtk.platform, "current_engine", lambda: Engine())
+    item = Item()
+
+    ledger = get_save_ledger(item)
+    ledger.save()
+
+    assert get_save_ledger(item) is ledger
+    assert document.writes == [("save", None)]
@@ -0,0 +1,153 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import struct
+import time
+
+import pytest
+
+from tk_sketchbook import sidecar
+from tk_sketchbook.publish_index import PublishIndex
+
+
+def write_tiff(path, width, height, pages):
+    """
+    Write a classic little endian TIFF file with empty pages, the first one
+    having the given dimensions.
+    """
+
+    data = b"II" + struct.pack("<HI", 42, 8)
+    for page in range(pages):
+        offset = len(data)
+        entries = []
+        if page == 0:
+            # width as a LONG, height as a SHORT
+            entries.append(struct.pack("<HHI4s", 256, 4, 1, struct.pack("<I", width)))
+            entries.append(
+                struct.pack("<HHI4s", 257, 3, 1, struct.pack("<H", height) + b"\0\0")
+            )
+        next_offset = 0
+        if page < pages - 1:
+            next_offset = offset + 2 + 12 * len(entries) + 4
+        data += struct.pack("<H", len(entries)) + b"".join(entries)
+        data += struct.pack("<I", next_offset)
+
+    with open(path, "wb") as tiff_file:
+        tiff_file.write(data)
+    return str(path)
+
+
+@pytest.fixture
+def publish_index(tmp_path):
+    return PublishIndex(str(tmp_path / "index" / "publish_index.db"))
+
+
+def test_read_tiff_info(tmp_path):
+    path = write_tiff(tmp_path / "doc.tif", 4096, 3072, 3)
+
+    assert sidecar.read_tiff_info(path) == (4096, 3072, 3)
+
+
+def test_read_tiff_info_of_other_file(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text("not an image")
+
+    assert sidecar.read_tiff_info(str(path)) is None
+
+
+def test_sidecar_round_trip(tmp_path):
+    path = write_tiff(tmp_path / "doc.tif", 640, 480, 2)
+
+    metadata = sidecar.read_metadata(path, "/thumbnails/doc.jpg")
+    sidecar_path = sidecar.write_sidecar(path, metadata)
+
+    assert sidecar_path == path + sidecar.SIDECAR_EXTENSION
+    assert sidecar.read_sidecar(path) == metadata
+    assert metadata["width"] == 640
+    assert metadata["height"] == 480
+    assert metadata["layers"] == 2
+    assert metadata["thumbnail"] == "/thumbnails/doc.jpg"
+
+
+def test_read_missing_sidecar(tmp_path):
+    assert sidecar.read_sidecar(str(tmp_path / "doc.tif")) is None
+
+
+def test_find_metadata_records_sidecar_in_index(tmp_path, publish_index):
+    path = write_tiff(tmp_path / "doc.tif", 640, 480, 1)
+    metadata = sidecar.read_metadata(path)
+    sidecar.write_sidecar(path, metadata)
+
+    assert sidecar.find_metadata(publish_index, 12, path) == metadata
+    assert publish_index.find_metadata(12) == metadata
+
+    # later look ups are answered by the index
+    (tmp_path / ("doc.tif" + sidecar.SIDECAR_EXTENSION)).unlink()
+    assert sidecar.find_metadata(publish_index, 12, path) == metadata
+
+
+def test_find_metadata_without_sidecar(tmp_path, publish_index):
+    path = write_tiff(tmp_path / "doc.tif", 640, 480, 1)
+
+    assert sidecar.find_metadata(publish_index, 12, path) is None
+    assert publish_index.find_metadata(12) is None
+
+
+def test_format_metadata():
+    metadata = {"width": 4096, "height": 3072, "layers": 1, "bytes": 3 * 1024 * 1024}
+
+    assert sidecar.format_metadata(metadata) == "4096 x 3072 px, 1 layer, 3.0 MB"
+
+
+def wait_for_description(details, published_file_id, get_path):
+    end_time = time.time() + 5
+    while time.time() < end_time:
+        description = details.describe(published_file_id, get_path)
+        if description is not None:
+            return description
+        time.sleep(0.01)
+    raise AssertionError("The publish was not described in time.")
+
+
+def test_publish_details_are_looked_up_in_background(tmp_path, publish_index):
+    path = write_tiff(tmp_path / "doc.tif", 640, 480, 2)
+    sidecar.write_sidecar(path, sidecar.read_metadata(path))
+    details = sidecar.PublishDetails(publish_index)
+    get_path_calls = []
+
+    def get_path():
+        get_path_calls.append(path)
+        return path
+
+    description = wait_for_description(details, 12, get_path)
+
+    assert description.startswith("640 x 480 px, 2 layers")
+    assert get_path_calls == [path]
+
+
+def test_publish_without_metadata_has_empty_description(tmp_path, publish_index):
+    path = write_tiff(tmp_path / "doc.tif", 640, 480, 1)
+    details = sidecar.PublishDetails(publish_index)
+
+    assert wait_for_description(details, 12, lambda: path) == ""
+
+
+def test_failed_publish_details_look_up_is_retried(tmp_path, publish_index):
+    path = write_tiff(tmp_path / "doc.tif", 640, 480, 1)
+    sidecar.write_sidecar(path, sidecar.read_metadata(path))
+    details = sidecar.PublishDetails(publish_index)
+
+    def get_path():
+        raise RuntimeError("No local storage")
+
+    assert details.describe(12, get_path) is None
+    assert wait_for_description(details, 12, lambda: path) == sidecar.format_metadata(
+        sidecar.read_sidecar(path)
+    )
@@ -0,0 +1,197 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import os
+import threading
+import time
+
+import pytest
+
+from tk_sketchbook import staging
+from tk_sketchbook.staging import StagingCache
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "staging")
+
+
+@pytest.fixture
+def publish_folder(tmp_path):
+    folder = tmp_path / "publish"
+    folder.mkdir()
+    return folder
+
+
+def publish(folder, name, data):
+    path = folder / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def read(path):
+    with open(path, "rb") as document_file:
+        return document_file.read()
+
+
+def age(path, seconds):
+    """
+    Make a staged copy look used the given number of seconds ago.
+    """
+
+    used_time = time.time() - seconds
+    os.utime(os.path.dirname(path), (used_time, used_time))
+
+
+def test_stage_copies_the_file(cache_dir, publish_folder):
+    cache = StagingCache(cache_dir, 1024)
+    path = publish(publish_folder, "sketch.tif", b"published")
+
+    staged_path = cache.stage(1, path)
+
+    assert staged_path.startswith(cache_dir)
+    assert os.path.basename(staged_path) == "sketch.tif"
+    assert read(staged_path) == b"published"
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_stage_again_is_a_hit(cache_dir, publish_folder):
+    cache = StagingCache(cache_dir, 1024)
+    path = publish(publish_folder, "sketch.tif", b"published")
+
+    staged_path = cache.stage(1, path)
+
+    assert cache.stage(1, path) == staged_path
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.bytes_saved == len(b"published")
+
+
+def test_changed_publish_is_copied_again(cache_dir, publish_folder):
+    cache = StagingCache(cache_dir, 1024)
+    path = publish(publish_folder, "sketch.tif", b"published")
+    staged_path = cache.stage(1, path)
+
+    publish(publish_folder, "sketch.tif", b"published again")
+
+    new_staged_path = cache.stage(1, path)
+    assert new_staged_path != staged_path
+    assert read(new_staged_path) == b"published again"
+    assert cache.misses == 2
+
+
+def test_least_recently_used_copies_are_evicted(cache_dir, publish_folder):
+    cache = StagingCache(cache_dir, 350)
+    paths = [
+        publish(publish_folder, "sketch%d.tif" % (index,), b"x" * 100)
+        for index in range(3)
+    ]
+    staged_paths = [cache.stage(index, path) for index, path in enumerate(paths)]
+    age(staged_paths[0], 30)
+    age(staged_paths[1], 20)
+    age(staged_paths[2], 10)
+    # the first copy is used again, the second is now the least recently used
+    cache.stage(0, paths[0])
+
+    cache.stage(3, publish(publish_folder, "sketch3.tif", b"x" * 100))
+
+    assert os.path.exists(staged_paths[0])
+    assert not os.path.exists(staged_paths[1])
+    assert os.path.exists(staged_paths[2])
+
+
+def test_staged_copy_is_never_evicted(cache_dir, publish_folder):
+    cache = StagingCache(cache_dir, 150)
+    first_path = cache.stage(1, publish(publish_folder, "a.tif", b"x" * 100))
+    age(first_path, 10)
+
+    staged_path = cache.stage(2, publish(publish_folder, "b.tif", b"x" * 100))
+
+    assert read(staged_path) == b"x" * 100
+    assert not os.path.exists(first_path)
+
+
+def test_held_copies_are_not_evicted(cache_dir, publish_folder):
+    cache = StagingCache(cache_dir, 150)
+
+    with cache.hold():
+        staged_paths = [
+            cache.stage(index, publish(publish_folder, name, b"x" * 100))
+            for index, name in enumerate(("a.tif", "b.tif", "c.tif"))
+        ]
+        assert all(os.path.exists(path) for path in staged_paths)
+
+    cache.stage(3, publish(publish_folder, "d.tif", b"x" * 100))
+    assert not any(os.path.exists(path) for path in staged_paths)
+
+
+def test_files_larger_than_the_cache_are_not_staged(cache_dir, publish_folder):
+    cache = StagingCache(cache_dir, 50)
+    path = publish(publish_folder, "sketch.tif", b"x" * 100)
+
+    assert cache.stage(1, path) == path
+    assert not os.path.exists(cache_dir)
+
+
+def test_copy_with_another_mtime_is_copied_again(cache_dir, publish_folder):
+    cache = StagingCache(cache_dir, 1024)
+    path = publish(publish_folder, "sketch.tif", b"published")
+    staged_path = cache.stage(1, path)
+    # e.g. the copy was written to after it was staged
+    with open(staged_path, "wb") as staged_file:
+        staged_file.write(b"corrupted")
+    os.utime(staged_path, (0, 0))
+
+    assert cache.stage(1, path) == staged_path
+    assert read(staged_path) == b"published"
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_corrupt_copy_is_not_used(cache_dir, publish_folder, monkeypatch):
+    cache = StagingCache(cache_dir, 1024)
+    path = publish(publish_folder, "sketch.tif", b"published")
+    monkeypatch.setattr(staging, "checksum_file", lambda path: "corrupt")
+
+    with pytest.raises(IOError):
+        cache.stage(1, path)
+
+    monkeypatch.undo()
+    assert read(cache.stage(1, path)) == b"published"
+
+
+def test_concurrent_stages_copy_once(cache_dir, publish_folder, monkeypatch):
+    cache = StagingCache(cache_dir, 1024)
+    path = publish(publish_folder, "sketch.tif", b"published")
+
+    copies = []
+    copying = threading.Event()
+    resume = threading.Event()
+    copy_file = staging.copy_file
+
+    def blocking_copy_file(source, destination, **kwargs):
+        copies.append(source)
+        copying.set()
+        resume.wait(10)
+        return copy_file(source, destination, **kwargs)
+
+    monkeypatch.setattr(staging, "copy_file", blocking_copy_file)
+    results = []
+    reader = threading.Thread(target=lambda: results.append(cache.stage(1, path)))
+    reader.start()
+    assert copying.wait(10)
+
+    waiter = threading.Thread(target=lambda: results.append(cache.stage(1, path)))
+    waiter.start()
+    resume.set()
+    reader.join(10)
+    waiter.join(10)
+
+    assert len(copies) == 1
+    assert len(results) == 2 and results[0] == results[1]
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,128 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import json
+import threading
+
+import pytest
+
+from tk_sketchbook import tracing
+
+
+@pytest.fixture
+def trace_path(tmp_path):
+    path = str(tmp_path / "logs" / "trace.json")
+    tracing.enable(path)
+    yield path
+    tracing.disable()
+    tracing.track_activities(False)
+
+
+def read_events(path):
+    """
+    Read a trace file the way the trace viewers do, without its closing
+    bracket.
+    """
+
+    with open(path) as trace_file:
+        data = trace_file.read()
+    assert data.startswith("[\n")
+    return json.loads(data.rstrip().rstrip(",") + "]")
+
+
+def spans(events):
+    return [event for event in events if event["ph"] == "X"]
+
+
+def test_disabled_span_does_nothing():
+    assert not tracing.is_enabled()
+    with tracing.span("engine.refresh_context") as span:
+        span.set(path="sketch.tif")
+    assert span is tracing._NO_SPAN
+
+
+def test_spans_are_written_when_disabled(trace_path):
+    with tracing.span("engine.refresh_context", path="sketch.tif") as span:
+        span.set(context="Shot 010")
+    tracing.add_span("ui.stall", 10.0, 10.5, samples=5)
+
+    tracing.disable()
+
+    events = read_events(trace_path)
+    assert [event["name"] for event in spans(events)] == [
+        "engine.refresh_context",
+        "ui.stall",
+    ]
+    refresh_event, stall_event = spans(events)
+    assert refresh_event["args"] == {"path": "sketch.tif", "context": "Shot 010"}
+    assert stall_event["ts"] == 10000000
+    assert stall_event["dur"] == 500000
+    # the thread is named once
+    assert [event["args"]["name"] for event in events if event["ph"] == "M"] == [
+        threading.current_thread().name
+    ]
+
+
+def test_error_is_recorded(trace_path):
+    with pytest.raises(ValueError):
+        with tracing.span("menu.do_command"):
+            raise ValueError("bad command")
+
+    tracing.disable()
+
+    (event,) = spans(read_events(trace_path))
+    assert event["args"]["error"] == "ValueError: bad command"
+
+
+def test_spans_are_flushed_when_the_buffer_is_full(trace_path, monkeypatch):
+    monkeypatch.setattr(tracing, "FLUSH_SIZE", 3)
+
+    for index in range(4):
+        tracing.add_span("span%d" % (index,), 0.0, 1.0)
+
+    # the thread name and the first two spans were appended to the file
+    assert [event["name"] for event in spans(read_events(trace_path))] == [
+        "span0",
+        "span1",
+    ]
+
+
+def test_attributes_are_written_as_strings(trace_path):
+    tracing.add_span("publish", 0.0, 1.0, item=object())
+
+    tracing.disable()
+
+    (event,) = spans(read_events(trace_path))
+    assert event["args"]["item"].startswith("<object object")
+
+
+def test_enable_replaces_the_trace(trace_path):
+    tracing.add_span("first session", 0.0, 1.0)
+    tracing.enable(trace_path)
+    tracing.add_span("second session", 0.0, 1.0)
+
+    tracing.disable()
+
+    assert [event["name"] for event in spans(read_events(trace_path))] == [
+        "second session"
+    ]
+
+
+def test_activities_are_tracked():
+    tracing.track_activities(True)
+    try:
+        thread_ident = threading.current_thread().ident
+        with tracing.span("menu.do_command"):
+            with tracing.span("publish2.publish"):
+                activity = tracing.get_activity(thread_ident)
+        assert activity == "menu.do_command > publish2.publish"
+        assert tracing.get_activity(thread_ident) is None
+    finally:
+        tracing.track_activities(False)
@@ -0,0 +1,170 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import os
+
+import pytest
+
+from tk_sketchbook import work_manifest
+from tk_sketchbook.work_manifest import WorkManifest
+
+
+@pytest.fixture
+def work_folder(tmp_path):
+    folder = tmp_path / "work"
+    folder.mkdir()
+    for name in ("a.tif", "b.tif", "notes.txt"):
+        (folder / name).write_bytes(name.encode("utf-8"))
+    return folder
+
+
+@pytest.fixture
+def manifest_path(tmp_path):
+    return str(tmp_path / "cache" / "work_manifest.json")
+
+
+@pytest.fixture
+def hashed_paths(monkeypatch):
+    """
+    The paths hashed by the manifest, in order.
+    """
+
+    paths = []
+    hash_file = work_manifest.hash_file
+
+    def recording_hash_file(path):
+        paths.append(os.path.basename(path))
+        return hash_file(path)
+
+    monkeypatch.setattr(work_manifest, "hash_file", recording_hash_file)
+    return paths
+
+
+def touch(path, offset):
+    """
+    Change the modification time of a file without changing its content.
+    """
+
+    stat = os.stat(str(path))
+    os.utime(str(path), (stat.st_atime + offset, stat.st_mtime + offset))
+
+
+def changed_names(changed_files):
+    return [os.path.basename(path) for path, _ in changed_files]
+
+
+def test_new_files_are_changed(work_folder, manifest_path, hashed_paths):
+    manifest = WorkManifest(manifest_path)
+
+    changed = manifest.find_changed_files(str(work_folder), [".tif"])
+
+    assert changed_names(changed) == ["a.tif", "b.tif"]
+    # new files are not read
+    assert [content_hash for _, content_hash in changed] == [None, None]
+    assert hashed_paths == []
+
+
+def test_recorded_files_are_unchanged(work_folder, manifest_path, hashed_paths):
+    manifest = WorkManifest(manifest_path)
+    for path, content_hash in manifest.find_changed_files(str(work_folder), [".tif"]):
+        manifest.record(path, content_hash)
+    del hashed_paths[:]
+
+    assert manifest.find_changed_files(str(work_folder), [".tif"]) == []
+    assert hashed_paths == []
+
+
+def test_modified_file_is_changed(work_folder, manifest_path):
+    manifest = WorkManifest(manifest_path)
+    manifest.record(str(work_folder / "a.tif"))
+    manifest.record(str(work_folder / "b.tif"))
+
+    (work_folder / "a.tif").write_bytes(b"modified")
+    touch(work_folder / "a.tif", 10)
+
+    changed = manifest.find_changed_files(str(work_folder), [".tif"])
+
+    assert changed_names(changed) == ["a.tif"]
+
+
+def test_touched_file_is_unchanged(work_folder, manifest_path, hashed_paths):
+    manifest = WorkManifest(manifest_path)
+    manifest.record(str(work_folder / "a.tif"))
+    manifest.record(str(work_folder / "b.tif"))
+    touch(work_folder / "a.tif", 10)
+    del hashed_paths[:]
+
+    assert manifest.find_changed_files(str(work_folder), [".tif"]) == []
+    assert manifest.find_changed_files(str(work_folder), [".tif"]) == []
+    # the new signature of the touched file was remembered
+    assert hashed_paths == ["a.tif"]
+
+
+def test_changed_files_are_hashed_once(work_folder, manifest_path, hashed_paths):
+    manifest = WorkManifest(manifest_path)
+    manifest.record(str(work_folder / "a.tif"))
+    (work_folder / "a.tif").write_bytes(b"modified")
+    touch(work_folder / "a.tif", 10)
+    ((path, content_hash),) = manifest.find_changed_files(str(work_folder), ["a.tif"])
+    assert content_hash
+    del hashed_paths[:]
+
+    # a new session reads the hash from the manifest file
+    changed = WorkManifest(manifest_path).find_changed_files(
+        str(work_folder), ["a.tif"]
+    )
+
+    assert changed == [(path, content_hash)]
+    assert hashed_paths == []
+
+
+def test_record_uses_known_hash(work_folder, manifest_path, hashed_paths):
+    manifest = WorkManifest(manifest_path)
+    manifest.record(str(work_folder / "a.tif"))
+    (work_folder / "a.tif").write_bytes(b"modified")
+    touch(work_folder / "a.tif", 10)
+    manifest.find_changed_files(str(work_folder), [".tif"])
+    del hashed_paths[:]
+
+    manifest.record(str(work_folder / "a.tif"))
+
+    assert hashed_paths == []
+    assert changed_names(manifest.find_changed_files(str(work_folder), [".tif"])) == [
+        "b.tif"
+    ]
+
+
+def test_record_hashes_new_files(work_folder, manifest_path, hashed_paths):
+    manifest = WorkManifest(manifest_path)
+    manifest.find_changed_files(str(work_folder), [".tif"])
+
+    manifest.record(str(work_folder / "a.tif"))
+
+    assert hashed_paths == ["a.tif"]
+
+
+def test_manifest_is_persisted(work_folder, manifest_path):
+    manifest = WorkManifest(manifest_path)
+    for path, content_hash in manifest.find_changed_files(str(work_folder), [".tif"]):
+        manifest.record(path, content_hash)
+
+    assert (
+        WorkManifest(manifest_path).find_changed_files(str(work_folder), [".tif"]) == []
+    )
+
+
+def test_corrupt_manifest_is_ignored(work_folder, manifest_path):
+    os.makedirs(os.path.dirname(manifest_path))
+    with open(manifest_path, "w") as manifest_file:
+        manifest_file.write("{not json")
+
+    changed = WorkManifest(manifest_path).find_changed_files(str(work_folder), [".tif"])
+
+    assert changed_names(changed) == ["a.tif", "b.tif"]
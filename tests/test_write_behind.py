@@ -0,0 +1,159 @@
+# Copyright (c) 2020 Autodesk, Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Autodesk, Inc.
+
+import os
+import threading
+
+import pytest
+
+from tk_sketchbook import write_behind
+from tk_sketchbook.write_behind import WriteBehindCache
+
+
+@pytest.fixture
+def mirror_root(tmp_path):
+    return str(tmp_path / "mirrors")
+
+
+@pytest.fixture
+def work_path(tmp_path):
+    folder = tmp_path / "work"
+    folder.mkdir()
+    return str(folder / "sketch.v001.tif")
+
+
+def save(path, data):
+    with open(path, "wb") as document_file:
+        document_file.write(data)
+
+
+def read(path):
+    with open(path, "rb") as document_file:
+        return document_file.read()
+
+
+def test_mirror_keeps_the_file_name(mirror_root, work_path):
+    cache = WriteBehindCache(mirror_root)
+
+    mirror_path = cache.prepare(work_path)
+
+    assert os.path.basename(mirror_path) == os.path.basename(work_path)
+    assert cache.is_mirror(mirror_path)
+    assert not cache.is_mirror(work_path)
+    assert cache.canonical_path(mirror_path) == work_path
+    assert cache.canonical_path(work_path) == work_path
+
+
+def test_canonical_path_of_another_session(mirror_root, work_path):
+    mirror_path = WriteBehindCache(mirror_root).prepare(work_path)
+
+    assert WriteBehindCache(mirror_root).canonical_path(mirror_path) == work_path
+
+
+def test_save_is_written_to_the_work_area(mirror_root, work_path):
+    flushed = []
+    cache = WriteBehindCache(mirror_root, on_flushed=flushed.append)
+    mirror_path = cache.prepare(work_path)
+    save(mirror_path, b"first save")
+
+    cache.schedule(mirror_path)
+
+    assert cache.wait(work_path, timeout=10) is None
+    assert read(work_path) == b"first save"
+    assert not cache.is_pending(work_path)
+    assert flushed == [work_path]
+    # the temporary copy was renamed over the work file
+    assert os.listdir(os.path.dirname(work_path)) == [os.path.basename(work_path)]
+
+
+def test_unchanged_save_is_not_written_again(mirror_root, work_path, monkeypatch):
+    cache = WriteBehindCache(mirror_root)
+    mirror_path = cache.prepare(work_path)
+    save(mirror_path, b"saved")
+    cache.schedule(mirror_path)
+    assert cache.wait(timeout=10) is None
+
+    copies = []
+    copy_file = write_behind.copy_file
+
+    def recording_copy_file(source, destination, **kwargs):
+        copies.append(source)
+        return copy_file(source, destination, **kwargs)
+
+    monkeypatch.setattr(write_behind, "copy_file", recording_copy_file)
+    cache.schedule(mirror_path)
+
+    assert cache.wait(timeout=10) is None
+    assert copies == []
+
+
+def test_pending_until_written(mirror_root, work_path, monkeypatch):
+    cache = WriteBehindCache(mirror_root)
+    mirror_path = cache.prepare(work_path)
+    save(mirror_path, b"saved")
+
+    copying = threading.Event()
+    resume = threading.Event()
+    copy_file = write_behind.copy_file
+
+    def blocking_copy_file(source, destination, **kwargs):
+        copying.set()
+        resume.wait(10)
+        return copy_file(source, destination, **kwargs)
+
+    monkeypatch.setattr(write_behind, "copy_file", blocking_copy_file)
+    cache.schedule(work_path)
+    assert copying.wait(10)
+
+    assert cache.is_pending(work_path)
+    assert cache.is_pending()
+    assert cache.wait(work_path, timeout=0.05).startswith("Timed out")
+
+    resume.set()
+    assert cache.wait(work_path, timeout=10) is None
+    assert not cache.is_pending()
+
+
+def test_failed_write_is_reported(mirror_root, work_path, monkeypatch):
+    cache = WriteBehindCache(mirror_root)
+    mirror_path = cache.prepare(work_path)
+    save(mirror_path, b"saved")
+
+    def failing_copy_file(source, destination, **kwargs):
+        raise IOError("disk full")
+
+    monkeypatch.setattr(write_behind, "copy_file", failing_copy_file)
+    cache.schedule(mirror_path)
+
+    error = cache.wait(work_path, timeout=10)
+    assert "disk full" in error
+    assert cache.wait(timeout=10) == error
+    assert not os.path.exists(work_path)
+
+
+def test_recover_unwritten_saves(mirror_root, tmp_path):
+    paths = []
+    for name in ("written.tif", "unwritten.tif"):
+        paths.append(str(tmp_path / name))
+
+    cache = WriteBehindCache(mirror_root)
+    for path in paths:
+        save(cache.prepare(path), b"first save")
+        cache.schedule(path)
+    assert cache.wait(timeout=10) is None
+    # saved again, but SketchBook exited before it was written
+    save(cache.mirror_path(paths[1]), b"second save")
+
+    recovered = WriteBehindCache(mirror_root)
+
+    assert recovered.recover() == 1
+    assert recovered.wait(timeout=10) is None
+    assert read(paths[0]) == b"first save"
+    assert read(paths[1]) == b"second save"